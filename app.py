@@ -9,9 +9,16 @@ from flask_wtf.csrf import CSRFProtect
 from flasgger import Swagger
 import jinja2
 import config
-from common.db_manager import get_pool
+from common.db_manager import init_pools
 from services.socketio_service import register_socketio_events, init_case_database
-from routes import home_bp, kb_bp, kb_management_bp, case_bp, unified_bp, api_bp, auth_bp
+from services.stats_service import TicketStatsService
+from services.archive_service import TicketArchiveService
+from services.sla_service import start_sla_scheduler
+from services.mail_service import start_mail_sender
+from services.message_writer import start_message_writer
+from services.contact_service import start_contact_writer
+from common.socketio_bus import create_client_manager
+from routes import home_bp, kb_bp, kb_management_bp, case_bp, unified_bp, api_bp, auth_bp, health_bp
 import os
 from datetime import timedelta
 
@@ -139,6 +146,10 @@ swagger_template = {
         {
             "name": "Trilium",
             "description": "Trilium 笔记集成 API"
+        },
+        {
+            "name": "系统",
+            "description": "健康检查等系统 API"
         }
     ],
     "definitions": {
@@ -195,28 +206,48 @@ limiter = Limiter(
 limiter.init_app(app)
 
 # 初始化SocketIO
-try:
-    import eventlet
-    eventlet.monkey_patch()
-    async_mode = 'eventlet'
-except ImportError:
+# SOCKETIO_ASYNC_MODE 指定异步驱动（压测对比时使用），未指定时按 eventlet -> gevent -> threading 自动选择
+async_mode = config.SOCKETIO_ASYNC_MODE or None
+if async_mode in (None, 'eventlet'):
+    try:
+        import eventlet
+        eventlet.monkey_patch()
+        async_mode = 'eventlet'
+    except ImportError:
+        if async_mode == 'eventlet':
+            raise
+        async_mode = None
+if async_mode in (None, 'gevent'):
     try:
         import gevent
         import gevent.monkey
         gevent.monkey.patch_all()
         async_mode = 'gevent'
     except ImportError:
-        async_mode = 'threading'
+        if async_mode == 'gevent':
+            raise
+        async_mode = None
+if async_mode is None:
+    async_mode = 'threading'
+print(f"SocketIO 异步驱动: {async_mode}")
 
 # CORS 配置 - 限制允许的来源
 allowed_origins = config.ALLOWED_ORIGINS.split(',') if config.ALLOWED_ORIGINS else '*'
-socketio = SocketIO(app, cors_allowed_origins=allowed_origins, async_mode=async_mode)
+# 多 worker 部署时通过消息总线共享房间，未配置 SOCKETIO_MESSAGE_QUEUE 时为单进程模式
+# 长轮询响应压缩是 Engine.IO 的默认行为（http_compression 默认开启、阈值默认 1024 字节），这里只开放阈值配置；
+# WebSocket 帧是否压缩取决于所用 WebSocket 服务是否支持 permessage-deflate，与此配置无关
+socketio = SocketIO(app, cors_allowed_origins=allowed_origins, async_mode=async_mode,
+                    client_manager=create_client_manager(),
+                    compression_threshold=config.SOCKETIO_COMPRESSION_THRESHOLD)
 
-# 预热数据库连接池
-print("预热数据库连接池...")
-for db_name in ['home', 'kb', 'case']:
-    _ = get_pool(db_name)
-print("数据库连接池初始化完成")
+# 数据库连接池生命周期管理
+# 连接池懒加载、按 worker 进程初始化，预热和工单表初始化在后台执行，不阻塞启动
+print("启动数据库连接池后台预热...")
+init_pools(['home', 'kb', 'case'], on_ready={'home': [start_contact_writer],
+                                             'case': [init_case_database, start_message_writer,
+                                                      TicketStatsService.start_reconciler,
+                                                      TicketArchiveService.start_scheduler, start_sla_scheduler,
+                                                      start_mail_sender]})
 
 # 静态文件优化 - 添加缓存头
 @app.after_request
@@ -236,10 +267,6 @@ def add_cache_headers(response):
         response.headers['Expires'] = '0'
     return response
 
-# 初始化工单系统数据库
-print("初始化工单系统数据库...")
-init_case_database()
-
 # 注册蓝图
 print("注册路由系统...")
 app.register_blueprint(home_bp)
@@ -249,6 +276,13 @@ app.register_blueprint(case_bp)
 app.register_blueprint(unified_bp)
 app.register_blueprint(api_bp)
 app.register_blueprint(auth_bp)
+app.register_blueprint(health_bp)
+
+# 健康检查探针调用频繁，不参与速率限制
+limiter.exempt(health_bp)
+# 分片上传按分片计请求数，会很快耗尽默认配额；创建上传会话仍受限制
+limiter.exempt(app.view_functions['case.upload_chunk'])
+limiter.exempt(app.view_functions['case.get_chunked_upload'])
 
 # 排除登录端点的 CSRF 保护（这些是公开接口）
 if csrf:
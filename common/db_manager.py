@@ -1,9 +1,22 @@
 """
 统一数据库连接管理模块
 使用连接池管理所有数据库连接
+
+连接池生命周期：
+1. 懒加载 - 首次使用时才创建连接池，导入模块不会连接数据库
+2. 按进程初始化 - fork 出的 worker 进程会丢弃继承的连接池，在本进程内重新创建
+3. 后台预热 - 在后台线程中建立 mincached 个空闲连接，启动不阻塞
+4. 健康检查 - 后台线程定期 ping 空闲连接，替代每次检出连接时的 ping
+5. 就绪判定 - 连接池健康且就绪回调（建表等）全部执行成功后才视为就绪
+
+健康检查和连接池统计读取 PooledDB 的内部属性（_idle_cache、_lock、_connections 等），
+requirements.txt 中固定了 DBUtils 版本，升级时需要核对这些属性
 """
 import pymysql
 from dbutils.pooled_db import PooledDB
+from datetime import datetime
+import threading
+import time
 import sys
 import os
 
@@ -14,11 +27,118 @@ import config
 
 # 数据库连接池字典
 _db_pools = {}
+_pools_lock = threading.Lock()
+_pools_pid = os.getpid()
+
+# fork 前继承下来的连接池，子进程中只保留引用、不关闭
+# （关闭会向 MySQL 发送 COM_QUIT，断开父进程仍在使用的连接）
+_inherited_pools = []
+
+# 连接池健康状态 {db_name: {...}}
+_pool_health = {}
+
+# 生命周期配置，fork 后子进程据此重新初始化
+_lifecycle = {
+    'started': False,
+    'db_names': [],
+    'warmup': True,
+    'on_ready': {},
+    'pending_callbacks': {},
+    'restart_pending': False,
+    'health_thread': None,
+}
+
+
+def _get_db_name_map():
+    """系统名称到实际数据库名称的映射"""
+    return {
+        'home': config.DB_NAME_HOME,
+        'kb': config.DB_NAME_KB,
+        'case': config.DB_NAME_CASE
+    }
+
+
+def _reset_after_fork():
+    """fork 后在子进程中丢弃继承的连接池，下次使用时按进程重新创建"""
+    global _pools_lock, _pools_pid
+    _inherited_pools.extend(_db_pools.values())
+    _db_pools.clear()
+    _pool_health.clear()
+    _pools_lock = threading.Lock()
+    _pools_pid = os.getpid()
+    _lifecycle['health_thread'] = None
+    # fork 回调中不能启动线程，标记后在子进程首次使用连接池时再启动
+    _lifecycle['restart_pending'] = _lifecycle['started']
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def _ensure_current_process():
+    """检查连接池是否属于当前进程（兼容不支持 register_at_fork 的平台）"""
+    if _pools_pid != os.getpid():
+        _reset_after_fork()
+    if _lifecycle['restart_pending']:
+        # 父进程已启用生命周期管理，子进程首次使用时重新预热并启动健康检查
+        _lifecycle['restart_pending'] = False
+        threading.Thread(target=_run_lifecycle, name='db-pool-lifecycle', daemon=True).start()
+
+
+def _create_pool(key, db_name, creator, pool_options=None, **db_config):
+    """按 key 创建并缓存连接池（线程安全、按进程隔离）"""
+    _ensure_current_process()
+
+    # 如果连接池已存在，直接返回
+    pool = _db_pools.get(key)
+    if pool is not None:
+        return pool
+
+    # 根据数据库名称获取对应的数据库配置
+    db_name_map = _get_db_name_map()
+
+    if db_name not in db_name_map:
+        raise ValueError(f"不支持的数据库名称: {db_name}")
+
+    with _pools_lock:
+        pool = _db_pools.get(key)
+        if pool is not None:
+            return pool
+
+        # 使用统一的数据库配置
+        db_config.update({
+            'host': config.DB_HOST,
+            'port': config.DB_PORT,
+            'user': config.DB_USER,
+            'password': config.DB_PASSWORD,
+            'database': db_name_map[db_name],
+            'charset': 'utf8mb4',
+        })
+
+        # 创建连接池
+        # mincached=0：构造时不建立连接，避免慢数据库阻塞启动，空闲连接由 warm_up_pool 在后台建立
+        pool = PooledDB(
+            creator=creator,
+            maxconnections=config.DB_POOL_MAX_CONNECTIONS,
+            mincached=0,
+            maxcached=config.DB_POOL_MAX_CACHED,
+            maxshared=config.DB_POOL_MAX_SHARED,
+            blocking=True,
+            ping=config.DB_POOL_PING,
+            **(pool_options or {}),
+            **db_config
+        )
+
+        # 缓存连接池
+        _db_pools[key] = pool
+
+    print(f"数据库 {key} ({db_name_map[db_name]}) 连接池初始化成功 (pid={os.getpid()})")
+    return pool
 
 
 def get_pool(db_name):
     """
-    获取指定数据库的连接池
+    获取指定数据库的连接池（懒加载）
 
     Args:
         db_name: 数据库名称 ('home', 'kb', 'case')
@@ -26,49 +146,32 @@ def get_pool(db_name):
     Returns:
         PooledDB: 数据库连接池实例
     """
-    global _db_pools
+    return _create_pool(db_name, db_name, pymysql,
+                        cursorclass=pymysql.cursors.DictCursor)  # 使用字典游标
 
-    # 如果连接池已存在，直接返回
-    if db_name in _db_pools:
-        return _db_pools[db_name]
 
-    # 根据数据库名称获取对应的数据库配置
-    db_name_map = {
-        'home': config.DB_NAME_HOME,
-        'kb': config.DB_NAME_KB,
-        'case': config.DB_NAME_CASE
-    }
+def get_prepared_pool(db_name):
+    """
+    获取支持服务端预编译语句的连接池（mysql-connector-python，二进制协议）
 
-    if db_name not in db_name_map:
-        raise ValueError(f"不支持的数据库名称: {db_name}")
+    与 get_pool 返回的 PyMySQL 连接池相互独立，仅供 common.statement_cache 使用。
+    连接开启 autocommit，只读查询不会持有事务快照。
 
-    # 使用统一的数据库配置
-    db_config = {
-        'host': config.DB_HOST,
-        'port': config.DB_PORT,
-        'user': config.DB_USER,
-        'password': config.DB_PASSWORD,
-        'database': db_name_map[db_name],
-        'charset': 'utf8mb4',
-        'cursorclass': pymysql.cursors.DictCursor  # 使用字典游标
-    }
+    Args:
+        db_name: 数据库名称 ('home', 'kb', 'case')
 
-    # 创建连接池
-    pool = PooledDB(
-        creator=pymysql,
-        maxconnections=config.DB_POOL_MAX_CONNECTIONS,
-        mincached=config.DB_POOL_MIN_CACHED,
-        maxcached=config.DB_POOL_MAX_CACHED,
-        maxshared=config.DB_POOL_MAX_SHARED,
-        blocking=True,
-        ping=1,  # 自动检测连接是否有效
-        **db_config
-    )
+    Returns:
+        PooledDB: 数据库连接池实例
 
-    # 缓存连接池
-    _db_pools[db_name] = pool
-    print(f"数据库 {db_name} ({db_name_map[db_name]}) 连接池初始化成功")
-    return pool
+    Raises:
+        ImportError: 未安装 mysql-connector-python
+    """
+    import mysql.connector
+    # autocommit 下没有未结束的事务，归还连接时无需 rollback
+    return _create_pool(f'{db_name}:prepared', db_name, mysql.connector,
+                        pool_options={'reset': False}, autocommit=True,
+                        # 显式指定排序规则，MariaDB 不支持 connector 默认的 utf8mb4_0900_ai_ci
+                        collation='utf8mb4_unicode_ci')
 
 
 def get_connection(db_name):
@@ -86,12 +189,12 @@ def get_connection(db_name):
         return pool.connection()
     except Exception as e:
         print(f"获取 {db_name} 数据库连接失败: {e}")
+        _set_health(db_name, False, error=str(e))
         return None
 
 
 def close_all_pools():
     """关闭所有数据库连接池"""
-    global _db_pools
     for pool_name, pool in _db_pools.items():
         try:
             pool.close()
@@ -99,6 +202,7 @@ def close_all_pools():
         except Exception as e:
             print(f"关闭数据库 {pool_name} 连接池失败: {e}")
     _db_pools.clear()
+    _pool_health.clear()
 
 
 def get_pool_stats(db_name):
@@ -116,10 +220,226 @@ def get_pool_stats(db_name):
         return {
             'db_name': db_name,
             'maxconnections': pool._maxconnections,
-            'mincached': pool._mincached,
+            'mincached': config.DB_POOL_MIN_CACHED,
             'maxcached': pool._maxcached,
             'maxshared': pool._maxshared,
-            '_connections': len(pool._connections) if hasattr(pool, '_connections') else 0
+            'idle': len(pool._idle_cache),
+            '_connections': pool._connections
         }
     except Exception as e:
         return {'error': str(e)}
+
+
+# ============================================
+# 预热与健康检查
+# ============================================
+
+def _set_health(db_name, healthy, error=None, **extra):
+    """记录连接池健康状态"""
+    status = _pool_health.get(db_name, {}).copy()
+    status.update({
+        'healthy': healthy,
+        'error': error,
+        'checked_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+    })
+    status.update(extra)
+    _pool_health[db_name] = status
+
+
+def warm_up_pool(db_name):
+    """
+    预热连接池：建立 DB_POOL_MIN_CACHED 个连接并放回空闲缓存
+
+    Args:
+        db_name: 数据库名称
+
+    Returns:
+        bool: 是否预热成功
+    """
+    pool = get_pool(db_name)
+    target = min(config.DB_POOL_MIN_CACHED, config.DB_POOL_MAX_CACHED or config.DB_POOL_MIN_CACHED)
+    connections = []
+    start = time.time()
+    try:
+        for _ in range(target):
+            connections.append(pool.connection())
+        _set_health(db_name, True, warmed=True,
+                    latency_ms=round((time.time() - start) * 1000, 2))
+        return True
+    except Exception as e:
+        print(f"数据库 {db_name} 连接池预热失败: {e}")
+        _set_health(db_name, False, error=str(e), warmed=False)
+        return False
+    finally:
+        for conn in connections:
+            conn.close()
+
+
+def _ping(con):
+    """ping 连接（SteadyDBConnection.ping 转发给原始连接），失效时原地重连"""
+    con.ping(True)
+
+
+def check_pool_health(db_name):
+    """
+    检查连接池健康状态
+
+    逐个轮换空闲连接：每次只从空闲缓存队首取出一个连接 ping，再放回队尾
+    （失效连接自动重连，重连失败则丢弃）。ping 期间不持有连接池锁，
+    其余空闲连接仍可被业务线程检出，不会因为检查而额外新建连接。
+    如果没有空闲连接且连接池未满，则检出一个连接做探测。
+
+    Args:
+        db_name: 数据库名称
+
+    Returns:
+        dict: 健康状态
+    """
+    pool = _db_pools.get(db_name) or get_pool(db_name)
+    start = time.time()
+
+    with pool._lock:
+        total = len(pool._idle_cache)
+
+    alive = 0
+    checked = 0
+    errors = []
+    for _ in range(total):
+        with pool._lock:
+            if not pool._idle_cache:
+                break
+            con = pool._idle_cache.pop(0)
+        checked += 1
+        try:
+            _ping(con)
+        except Exception as e:
+            errors.append(str(e))
+            try:
+                # 池内连接 closeable=False，close() 只会重置，需要 _close() 真正关闭
+                con._close()
+            except Exception:
+                pass
+            continue
+        alive += 1
+        with pool._lock:
+            if not pool._maxcached or len(pool._idle_cache) < pool._maxcached:
+                pool._idle_cache.append(con)
+            else:
+                con._close()
+            pool._lock.notify()
+
+    if not checked and pool._connections < pool._maxconnections:
+        # 没有空闲连接可检查，检出一个连接做探测
+        try:
+            probe = pool.connection()
+            try:
+                _ping(probe)
+            finally:
+                probe.close()
+            checked = 1
+        except Exception as e:
+            errors.append(str(e))
+
+    healthy = not errors or alive > 0
+    _set_health(
+        db_name, healthy,
+        error=errors[-1] if errors else None,
+        checked=checked,
+        failed=len(errors),
+        idle=len(pool._idle_cache),
+        in_use=pool._connections,
+        latency_ms=round((time.time() - start) * 1000, 2)
+    )
+    return _pool_health[db_name]
+
+
+def _health_check_loop(interval):
+    """后台健康检查循环"""
+    pid = os.getpid()
+    while _pools_pid == pid:
+        time.sleep(interval)
+        for db_name in list(_db_pools):
+            try:
+                if check_pool_health(db_name).get('healthy'):
+                    _run_ready_callbacks(db_name)
+            except Exception as e:
+                _set_health(db_name, False, error=str(e))
+
+
+def _run_ready_callbacks(db_name):
+    """
+    执行连接池就绪回调（每个进程只成功执行一次）
+
+    回调按顺序执行（后面的回调可能依赖前面建的表），某个回调抛出异常时，
+    它和之后的回调保留到下一次健康检查时重试，在此之前该数据库不视为就绪
+    """
+    callbacks = _lifecycle['pending_callbacks'].get(db_name) or []
+    while callbacks:
+        try:
+            callbacks[0]()
+        except Exception as e:
+            print(f"数据库 {db_name} 就绪回调执行失败，稍后重试: {e}")
+            return
+        callbacks.pop(0)
+    _lifecycle['pending_callbacks'].pop(db_name, None)
+
+
+def _run_lifecycle():
+    """预热连接池、执行就绪回调并启动健康检查线程"""
+    _lifecycle['pending_callbacks'] = {name: list(callbacks) for name, callbacks in _lifecycle['on_ready'].items()}
+    for db_name in _lifecycle['db_names']:
+        if _lifecycle['warmup']:
+            ok = warm_up_pool(db_name)
+        else:
+            ok = check_pool_health(db_name).get('healthy')
+        # 数据库暂不可用时回调保留到健康检查恢复后执行
+        if ok:
+            _run_ready_callbacks(db_name)
+
+    interval = config.DB_POOL_HEALTH_CHECK_INTERVAL
+    if interval > 0 and _lifecycle['health_thread'] is None:
+        thread = threading.Thread(target=_health_check_loop, args=(interval,),
+                                  name='db-pool-health', daemon=True)
+        _lifecycle['health_thread'] = thread
+        thread.start()
+
+
+def init_pools(db_names=('home', 'kb', 'case'), on_ready=None, background=True):
+    """
+    启用连接池生命周期管理
+
+    Args:
+        db_names: 需要管理的数据库名称列表
+        on_ready: 连接池预热完成后执行的回调 {db_name: [callable, ...]}
+        background: 是否在后台线程中执行预热（默认 True，不阻塞启动）
+    """
+    _lifecycle.update({
+        'started': True,
+        'db_names': list(db_names),
+        'warmup': config.DB_POOL_WARMUP,
+        'on_ready': dict(on_ready or {}),
+    })
+    for db_name in db_names:
+        _pool_health.setdefault(db_name, {'healthy': False, 'error': None, 'checked_at': None, 'warmed': False})
+
+    if background:
+        threading.Thread(target=_run_lifecycle, name='db-pool-lifecycle', daemon=True).start()
+    else:
+        _run_lifecycle()
+
+
+def get_pools_health():
+    """
+    获取所有受管连接池的健康状态
+
+    Returns:
+        (ready, details): ready 表示所有连接池均健康，且就绪回调（建表等）均已执行成功
+    """
+    db_names = _lifecycle['db_names'] or list(_db_pools)
+    details = {}
+    for db_name in db_names:
+        status = dict(_pool_health.get(db_name, {'healthy': False, 'error': '未初始化', 'checked_at': None}))
+        status['initialized'] = not _lifecycle['pending_callbacks'].get(db_name)
+        details[db_name] = status
+    ready = bool(details) and all(status.get('healthy') and status['initialized'] for status in details.values())
+    return ready, details
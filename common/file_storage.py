@@ -0,0 +1,225 @@
+"""
+附件存储后端
+文件按内容 SHA-256 寻址，存储键为 ab/cd/<sha256>，按哈希前缀分两级子目录，
+单个目录下的文件数有界；相同内容只存一份（去重）
+
+通过 ATTACHMENT_STORAGE 选择后端:
+- local（默认）: 本地目录 ATTACHMENT_STORAGE_ROOT，下载通过 send_file 发送（支持 Range/条件请求）
+- s3: S3 兼容对象存储（AWS S3、MinIO 等，需要 boto3），下载重定向到预签名 URL；
+  ATTACHMENT_S3_ENDPOINT_URL 指向本地 MinIO 即可在开发环境测试
+
+写入时边接收边计算哈希，不需要先把整个文件读入内存
+
+Example:
+    >>> from common.file_storage import get_storage
+    >>> stored = get_storage().save(file.stream)
+    >>> stored['key'], stored['sha256'], stored['size'], stored['deduplicated']
+"""
+import hashlib
+import os
+import tempfile
+import threading
+from typing import Any, BinaryIO, Dict, Optional
+from urllib.parse import quote
+import config
+from common.logger import logger
+
+
+CHUNK_SIZE = 64 * 1024
+
+
+def storage_key(sha256: str) -> str:
+    """内容哈希对应的存储键"""
+    return f'{sha256[:2]}/{sha256[2:4]}/{sha256}'
+
+
+def _copy_hashing(stream: BinaryIO, target: BinaryIO):
+    """复制数据流并计算 SHA-256，返回 (sha256, size)"""
+    sha256 = hashlib.sha256()
+    size = 0
+    while True:
+        chunk = stream.read(CHUNK_SIZE)
+        if not chunk:
+            break
+        sha256.update(chunk)
+        size += len(chunk)
+        target.write(chunk)
+    return sha256.hexdigest(), size
+
+
+class LocalStorage:
+    """本地目录存储"""
+    name = 'local'
+
+    def __init__(self, root: Optional[str] = None):
+        self.root = os.path.abspath(root or config.ATTACHMENT_STORAGE_ROOT)
+        self.tmp_dir = os.path.join(self.root, 'tmp')
+        os.makedirs(self.tmp_dir, exist_ok=True)
+
+    def path(self, key: str) -> str:
+        """存储键对应的本地文件路径"""
+        return os.path.join(self.root, *key.split('/'))
+
+    def save(self, stream: BinaryIO) -> Dict[str, Any]:
+        """
+        保存数据流
+
+        先写入临时文件并计算哈希，再原子重命名到内容寻址路径；已存在相同内容时丢弃临时文件
+
+        Returns:
+            dict: key, sha256, size, deduplicated
+        """
+        fd, tmp_path = tempfile.mkstemp(dir=self.tmp_dir)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                sha256, size = _copy_hashing(stream, f)
+            key = storage_key(sha256)
+            target = self.path(key)
+            deduplicated = os.path.exists(target)
+            if deduplicated:
+                os.remove(tmp_path)
+            else:
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                # 并发写入相同内容时 replace 是原子的，结果一致
+                os.replace(tmp_path, target)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return {'key': key, 'sha256': sha256, 'size': size, 'deduplicated': deduplicated}
+
+    def put(self, key: str, stream: BinaryIO):
+        """按指定键写入（图片缩略图等派生文件，存放在原文件旁）"""
+        target = self.path(key)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.tmp_dir)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                _copy_hashing(stream, f)
+            os.replace(tmp_path, target)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def exists(self, key: str) -> bool:
+        return os.path.isfile(self.path(key))
+
+    def open(self, key: str) -> BinaryIO:
+        return open(self.path(key), 'rb')
+
+    def delete(self, key: str):
+        try:
+            os.remove(self.path(key))
+        except FileNotFoundError:
+            pass
+
+
+class S3Storage:
+    """S3 兼容对象存储"""
+    name = 's3'
+
+    def __init__(self, bucket: Optional[str] = None, endpoint_url: Optional[str] = None,
+                 prefix: Optional[str] = None, client=None):
+        self.bucket = bucket or config.ATTACHMENT_S3_BUCKET
+        self.prefix = (prefix if prefix is not None else config.ATTACHMENT_S3_PREFIX).strip('/')
+        if not self.bucket:
+            raise RuntimeError('ATTACHMENT_STORAGE=s3 时必须配置 ATTACHMENT_S3_BUCKET')
+        if client is None:
+            try:
+                import boto3
+            except ImportError:
+                raise RuntimeError('S3 附件存储需要安装 boto3: pip install boto3')
+            client = boto3.client(
+                's3',
+                endpoint_url=endpoint_url or config.ATTACHMENT_S3_ENDPOINT_URL or None,
+                region_name=config.ATTACHMENT_S3_REGION or None,
+                aws_access_key_id=config.ATTACHMENT_S3_ACCESS_KEY or None,
+                aws_secret_access_key=config.ATTACHMENT_S3_SECRET_KEY or None,
+            )
+        self.client = client
+
+    def _object_key(self, key: str) -> str:
+        return f'{self.prefix}/{key}' if self.prefix else key
+
+    def save(self, stream: BinaryIO) -> Dict[str, Any]:
+        """
+        保存数据流
+
+        内容哈希需要在上传前确定对象键，数据先写入临时文件（小文件在内存中）并计算哈希，
+        对象已存在时不再上传
+        """
+        with tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024) as spool:
+            sha256, size = _copy_hashing(stream, spool)
+            key = storage_key(sha256)
+            deduplicated = self.exists(key)
+            if not deduplicated:
+                spool.seek(0)
+                self.client.upload_fileobj(spool, self.bucket, self._object_key(key))
+        return {'key': key, 'sha256': sha256, 'size': size, 'deduplicated': deduplicated}
+
+    def put(self, key: str, stream: BinaryIO):
+        """按指定键写入（图片缩略图等派生文件，存放在原文件旁）"""
+        self.client.upload_fileobj(stream, self.bucket, self._object_key(key))
+
+    def exists(self, key: str) -> bool:
+        from botocore.exceptions import ClientError
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=self._object_key(key))
+            return True
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound'):
+                return False
+            raise
+
+    def open(self, key: str) -> BinaryIO:
+        return self.client.get_object(Bucket=self.bucket, Key=self._object_key(key))['Body']
+
+    def delete(self, key: str):
+        self.client.delete_object(Bucket=self.bucket, Key=self._object_key(key))
+
+    def presigned_url(self, key: str, filename: str, mime_type: Optional[str] = None) -> str:
+        """生成下载用的预签名 URL（对象存储原生支持 Range 请求）"""
+        params = {
+            'Bucket': self.bucket,
+            'Key': self._object_key(key),
+            'ResponseContentDisposition': f"attachment; filename*=UTF-8''{quote(filename, safe='')}",
+        }
+        if mime_type:
+            params['ResponseContentType'] = mime_type
+        return self.client.generate_presigned_url('get_object', Params=params,
+                                                  ExpiresIn=config.ATTACHMENT_S3_PRESIGN_EXPIRES)
+
+
+_storages: Dict[str, Any] = {}
+_storage_lock = threading.Lock()
+
+
+def create_storage(backend: str):
+    """创建存储后端"""
+    backend = backend.lower()
+    if backend == 's3':
+        return S3Storage()
+    if backend == 'local':
+        return LocalStorage()
+    raise ValueError(f'不支持的附件存储后端: {backend}')
+
+
+def get_storage(backend: Optional[str] = None):
+    """
+    获取存储后端（进程内单例）
+
+    Args:
+        backend: 后端名称，默认为 ATTACHMENT_STORAGE；读取已有附件时传入其登记的后端，
+            切换配置后旧附件仍可下载
+    """
+    backend = (backend or config.ATTACHMENT_STORAGE).lower()
+    storage = _storages.get(backend)
+    if storage is None:
+        with _storage_lock:
+            storage = _storages.get(backend)
+            if storage is None:
+                storage = create_storage(backend)
+                _storages[backend] = storage
+                logger.info(f"附件存储后端: {storage.name}")
+    return storage
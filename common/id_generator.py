@@ -0,0 +1,203 @@
+"""
+工单编号生成模块
+按时间有序生成工单编号，保持原有格式 TK-<YYYYMMDDHHMMSS>-<6 位十六进制>：
+
+- 后缀为 2 位节点号 + 4 位序号（Snowflake 风格），同一进程内严格递增，
+  不同节点之间不会重复，每个节点每秒最多 65536 个编号
+- 编号按时间排序，新工单总是追加在 ticket_id 唯一索引末尾，也可以直接按编号分页
+- 本秒序号用尽或系统时钟回拨时借用下一秒，保证单调
+- 节点号优先取 TICKET_ID_NODE；未配置时从 id_sequences 表租用（每个进程启动时递增，超过 255 后回绕），
+  数据库不可用时退化为随机节点号
+- 生成器初始化时从 tickets 表中该节点最近的编号续接（同一秒内重启、借用了未来秒数后重启都不会重复）；
+  节点号仍可能与其他进程相同（回绕、随机、配置重复），由建单时的唯一键冲突重试兜底（resync_generator）
+
+Example:
+    >>> from common.id_generator import generate_ticket_id, generate_ticket_ids
+    >>> generate_ticket_id()
+    'TK-20261019143211-070000'
+    >>> generate_ticket_ids(3)       # 批量导入
+    ['TK-20261019143211-070001', 'TK-20261019143211-070002', 'TK-20261019143211-070003']
+"""
+import os
+import random
+import threading
+import time
+from datetime import datetime
+from typing import List, Optional, Tuple
+import config
+from common.logger import logger
+
+
+TICKET_ID_PREFIX = 'TK'
+TIMESTAMP_FORMAT = '%Y%m%d%H%M%S'
+
+MAX_NODE = 0xFF
+MAX_SEQUENCE = 0xFFFF
+
+# id_sequences 中租用节点号的序列名
+NODE_SEQUENCE_NAME = 'ticket_id_node'
+
+# 续接时只查找最近这段时间内生成的编号（秒），走 ticket_id 唯一索引的范围扫描
+SEED_LOOKBACK_SECONDS = 3600
+
+# 建单时编号冲突的最多尝试次数
+TICKET_ID_MAX_ATTEMPTS = 3
+
+_generator = None
+_generator_pid = None
+_generator_lock = threading.Lock()
+
+
+class TicketIdGenerator:
+    """单个节点的工单编号生成器（线程安全）"""
+
+    def __init__(self, node: int):
+        if not 0 <= node <= MAX_NODE:
+            raise ValueError(f'节点号必须在 0-{MAX_NODE} 之间')
+        self.node = node
+        self._second = 0
+        self._sequence = 0
+        self._stamp = ''
+        self._lock = threading.Lock()
+
+    def _next(self) -> str:
+        now = int(time.time())
+        if now > self._second:
+            self._second = now
+            self._sequence = 0
+            self._stamp = datetime.fromtimestamp(now).strftime(TIMESTAMP_FORMAT)
+        else:
+            self._sequence += 1
+            if self._sequence > MAX_SEQUENCE:
+                self._second += 1
+                self._sequence = 0
+                self._stamp = datetime.fromtimestamp(self._second).strftime(TIMESTAMP_FORMAT)
+        return f'{TICKET_ID_PREFIX}-{self._stamp}-{self.node:02X}{self._sequence:04X}'
+
+    def advance_to(self, second: int, sequence: int):
+        """跳过 (second, sequence) 及之前的编号（已写入数据库的编号）"""
+        with self._lock:
+            if (second, sequence) > (self._second, self._sequence):
+                self._second = second
+                self._sequence = sequence
+                self._stamp = datetime.fromtimestamp(second).strftime(TIMESTAMP_FORMAT)
+
+    def generate(self) -> str:
+        with self._lock:
+            return self._next()
+
+    def generate_many(self, count: int) -> List[str]:
+        """一次生成 count 个连续编号（批量导入）"""
+        if count < 0:
+            raise ValueError('count 不能为负数')
+        with self._lock:
+            return [self._next() for _ in range(count)]
+
+
+def parse_ticket_id(ticket_id: str) -> Optional[Tuple[datetime, int, int]]:
+    """
+    解析工单编号
+
+    Returns:
+        (生成时间, 节点号, 序号)；格式不符时返回 None。
+        旧版编号的后缀为随机值，节点号和序号没有意义
+    """
+    parts = ticket_id.split('-') if ticket_id else []
+    if len(parts) != 3 or parts[0] != TICKET_ID_PREFIX or len(parts[2]) != 6:
+        return None
+    try:
+        created = datetime.strptime(parts[1], TIMESTAMP_FORMAT)
+        suffix = int(parts[2], 16)
+    except ValueError:
+        return None
+    return created, suffix >> 16, suffix & MAX_SEQUENCE
+
+
+def _lease_node() -> int:
+    """从 id_sequences 租用节点号（每次调用递增，按 256 取模，回绕后的重复由续接和冲突重试处理）"""
+    from common.database_context import db_connection
+
+    try:
+        with db_connection('case') as conn:
+            cursor = conn.cursor()
+            cursor.execute("INSERT IGNORE INTO id_sequences (name, next_value) VALUES (%s, 0)",
+                           (NODE_SEQUENCE_NAME,))
+            cursor.execute(
+                "UPDATE id_sequences SET next_value = LAST_INSERT_ID(next_value + 1) WHERE name = %s",
+                (NODE_SEQUENCE_NAME,)
+            )
+            cursor.execute("SELECT LAST_INSERT_ID() AS value")
+            value = int(cursor.fetchone()['value'])
+            conn.commit()
+        if value > MAX_NODE:
+            logger.info(f"工单编号节点号已回绕（第 {value} 次租用），可能与存活进程共用节点号")
+        return value % (MAX_NODE + 1)
+    except Exception as e:
+        node = random.randint(0, MAX_NODE)
+        logger.warning(f"工单编号节点号租用失败，使用随机节点号 {node:02X}: {e}")
+        return node
+
+
+def _seed(generator: TicketIdGenerator):
+    """从 tickets 表中该节点最近写入的编号续接"""
+    from common.database_context import db_connection
+
+    lower = datetime.fromtimestamp(time.time() - SEED_LOOKBACK_SECONDS).strftime(TIMESTAMP_FORMAT)
+    # TK-<14 位时间>-<2 位节点号><4 位序号>，后缀为定长大写十六进制，字符串最大即最新
+    pattern = f"{TICKET_ID_PREFIX}-{'_' * len(lower)}-{generator.node:02X}____"
+    try:
+        with db_connection('case') as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                "SELECT MAX(ticket_id) AS last_id FROM tickets WHERE ticket_id >= %s AND ticket_id LIKE %s",
+                (f'{TICKET_ID_PREFIX}-{lower}', pattern)
+            )
+            last_id = (cursor.fetchone() or {}).get('last_id')
+    except Exception as e:
+        logger.warning(f"工单编号生成器续接失败（节点号 {generator.node:02X}）: {e}")
+        return
+    parsed = parse_ticket_id(last_id)
+    if parsed:
+        created, _, sequence = parsed
+        generator.advance_to(int(created.timestamp()), sequence)
+        logger.info(f"工单编号生成器从 {last_id} 续接")
+
+
+def get_generator() -> TicketIdGenerator:
+    """
+    获取当前进程的编号生成器（fork 后的子进程重新分配节点号）
+
+    租用节点号和续接都要访问数据库，在锁外完成后再发布：_generator_lock 在导入时创建，
+    早于 eventlet/gevent 的 monkey patch，是原生锁，持有它等待网络 I/O 会阻塞整个事件循环。
+    并发首次调用时可能多租用一个节点号，只有先发布的生成器会被使用
+    """
+    global _generator, _generator_pid
+    pid = os.getpid()
+    generator = _generator
+    if generator is not None and _generator_pid == pid:
+        return generator
+
+    node = config.TICKET_ID_NODE if config.TICKET_ID_NODE >= 0 else _lease_node()
+    generator = TicketIdGenerator(node)
+    _seed(generator)
+    with _generator_lock:
+        if _generator is None or _generator_pid != pid:
+            _generator = generator
+            _generator_pid = pid
+            logger.info(f"工单编号生成器初始化: 节点号 {node:02X} (pid={pid})")
+    return _generator
+
+
+def generate_ticket_id() -> str:
+    """生成一个工单编号"""
+    return get_generator().generate()
+
+
+def generate_ticket_ids(count: int) -> List[str]:
+    """批量生成连续的工单编号"""
+    return get_generator().generate_many(count)
+
+
+def resync_generator():
+    """编号与已写入的工单冲突时调用：按数据库中该节点最新的编号续接，之后生成的编号都在其后"""
+    _seed(get_generator())
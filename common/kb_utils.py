@@ -2,12 +2,19 @@
 知识库工具函数
 从 modules/kb 迁移而来
 优化版本 - 使用连接池提高性能
+
+查询按视图投影列（KB_VIEWS），列表页只读取需要展示的列，
+不再 SELECT * 拉取 KB_Description 等大字段；结果使用轻量行对象
+（namedtuple，按下标存储，不为每行创建字典），需要输出 JSON 时
+调用 rows_to_dicts 一次完成字典转换和 datetime 序列化。
 """
 import pymysql
 import json
+from collections import namedtuple
 from datetime import datetime
 from config import DB_HOST, DB_PORT, DB_USER, DB_PASSWORD, DB_NAME_KB
 from common.db_manager import get_pool
+from common.statement_cache import register_statement, fetch_one
 from common.logger import logger
 
 
@@ -18,6 +25,76 @@ def serialize_datetime(obj):
     return obj
 
 
+def _make_row_type(name, columns):
+    """
+    创建轻量行类型
+
+    基于 namedtuple（__slots__ 为空，无实例字典），同时兼容模板中的
+    record.KB_Name 属性访问和旧代码中的 record['KB_Name'] / record.get() 字典访问。
+    """
+    base = namedtuple(name, columns)
+
+    class Row(base):
+        __slots__ = ()
+
+        def __getitem__(self, key):
+            if isinstance(key, str):
+                try:
+                    return getattr(self, key)
+                except AttributeError:
+                    raise KeyError(key)
+            return base.__getitem__(self, key)
+
+        def get(self, key, default=None):
+            return getattr(self, key, default)
+
+        def keys(self):
+            return self._fields
+
+        def to_dict(self):
+            """转换为可 JSON 序列化的字典（datetime 转 ISO 字符串）"""
+            return {field: serialize_datetime(value) for field, value in zip(self._fields, self)}
+
+    Row.__name__ = Row.__qualname__ = name
+    return Row
+
+
+# 各视图的列投影
+KB_VIEWS = {
+    # 知识库首页、名称搜索：只展示编号、名称、链接
+    'list': ('KB_Number', 'KB_Name', 'KB_link'),
+    # 管理页面列表：额外展示更新时间
+    'management': ('KB_Number', 'KB_Name', 'KB_link', 'KB_UpdateTime'),
+    # 详情/导出：全部字段
+    'full': ('KB_Number', 'KB_Name', 'KB_link', 'KB_Description', 'KB_Category',
+             'KB_Author', 'KB_CreateTime', 'KB_UpdateTime'),
+}
+
+KB_ROW_TYPES = {
+    'list': _make_row_type('KBListRow', KB_VIEWS['list']),
+    'management': _make_row_type('KBManagementRow', KB_VIEWS['management']),
+    'full': _make_row_type('KBRecordRow', KB_VIEWS['full']),
+}
+
+
+def _select_columns(view):
+    """获取视图对应的 SELECT 列列表"""
+    if view not in KB_VIEWS:
+        raise ValueError(f"不支持的知识库视图: {view}")
+    return ', '.join(f'`{column}`' for column in KB_VIEWS[view])
+
+
+def _fetch_rows(cursor, view):
+    """以元组游标读取结果并包装为视图行对象"""
+    row_type = KB_ROW_TYPES[view]
+    return [row_type._make(row) for row in cursor.fetchall()]
+
+
+def rows_to_dicts(rows):
+    """行对象列表转换为 JSON 可序列化的字典列表（单次遍历）"""
+    return [row.to_dict() for row in rows]
+
+
 def serialize_records(records):
     """序列化记录列表，处理 datetime 对象"""
     if not records:
@@ -25,12 +102,23 @@ def serialize_records(records):
 
     serialized = []
     for record in records:
+        if hasattr(record, 'to_dict'):
+            serialized.append(record.to_dict())
+            continue
         serialized_record = {}
         for key, value in record.items():
             serialized_record[key] = serialize_datetime(value)
         serialized.append(serialized_record)
     return serialized
 
+
+# 热点查询：按编号查询知识库记录（服务端预编译）
+STMT_RECORD_BY_ID = register_statement(
+    'kb.record_by_id', 'kb',
+    f"SELECT {_select_columns('full')} FROM `KB-info` WHERE KB_Number = %s"
+)
+
+
 def get_kb_db_connection():
     """获取知识库数据库连接 - 使用连接池"""
     try:
@@ -58,16 +146,23 @@ def get_kb_db_connection():
         return None
 
 
-def fetch_all_records():
-    """获取所有记录 - 使用连接池优化"""
+def fetch_all_records(view='list'):
+    """获取所有记录 - 使用连接池优化
+
+    Args:
+        view: 列投影视图 ('list', 'management', 'full')
+
+    Returns:
+        list: 视图行对象列表
+    """
     connection = get_kb_db_connection()
     if connection is None:
         return []
 
     try:
-        with connection.cursor() as cursor:
-            cursor.execute("SELECT * FROM `KB-info` ORDER BY KB_Number ASC")
-            records = cursor.fetchall()
+        with connection.cursor(pymysql.cursors.Cursor) as cursor:
+            cursor.execute(f"SELECT {_select_columns(view)} FROM `KB-info` ORDER BY KB_Number ASC")
+            records = _fetch_rows(cursor, view)
         return records
     except Exception as e:
         print(f"获取记录失败: {e}")
@@ -77,21 +172,12 @@ def fetch_all_records():
 
 
 def fetch_record_by_id(kb_number):
-    """根据ID获取记录 - 使用连接池优化"""
-    connection = get_kb_db_connection()
-    if connection is None:
-        return None
-
+    """根据ID获取记录 - 使用预编译语句"""
     try:
-        with connection.cursor() as cursor:
-            cursor.execute("SELECT * FROM `KB-info` WHERE KB_Number = %s", (kb_number,))
-            record = cursor.fetchone()
-        return record
+        return fetch_one(STMT_RECORD_BY_ID, (kb_number,))
     except Exception as e:
         print(f"获取记录失败: {e}")
         return None
-    finally:
-        connection.close()
 
 
 def get_total_count():
@@ -117,8 +203,17 @@ def get_total_count():
         connection.close()
 
 
-def fetch_records_with_pagination(page, per_page):
-    """分页获取记录 - 使用连接池优化"""
+def fetch_records_with_pagination(page, per_page, view='list'):
+    """分页获取记录 - 使用连接池优化
+
+    Args:
+        page: 页码（从 1 开始）
+        per_page: 每页数量
+        view: 列投影视图 ('list', 'management', 'full')
+
+    Returns:
+        (records, total_count)
+    """
     connection = get_kb_db_connection()
     if connection is None:
         logger.error("无法获取数据库连接，返回空结果")
@@ -128,16 +223,19 @@ def fetch_records_with_pagination(page, per_page):
         offset = (page - 1) * per_page
         logger.info(f"分页查询: page={page}, per_page={per_page}, offset={offset}")
 
-        with connection.cursor() as cursor:
+        with connection.cursor(pymysql.cursors.Cursor) as cursor:
             # 获取总数
-            cursor.execute("SELECT COUNT(*) as count FROM `KB-info`")
+            cursor.execute("SELECT COUNT(*) FROM `KB-info`")
             total_count_result = cursor.fetchone()
-            total_count = total_count_result['count'] if total_count_result else 0
+            total_count = total_count_result[0] if total_count_result else 0
             logger.info(f"查询到总记录数: {total_count}")
 
             # 获取分页数据
-            cursor.execute("SELECT * FROM `KB-info` ORDER BY KB_Number ASC LIMIT %s OFFSET %s", (per_page, offset))
-            records = cursor.fetchall()
+            cursor.execute(
+                f"SELECT {_select_columns(view)} FROM `KB-info` ORDER BY KB_Number ASC LIMIT %s OFFSET %s",
+                (per_page, offset)
+            )
+            records = _fetch_rows(cursor, view)
             logger.info(f"获取到记录数: {len(records)}")
 
         return records, total_count
@@ -150,8 +248,18 @@ def fetch_records_with_pagination(page, per_page):
         connection.close()
 
 
-def fetch_records_by_name_with_pagination(name, page, per_page):
-    """按名称分页搜索记录 - 使用连接池优化"""
+def fetch_records_by_name_with_pagination(name, page, per_page, view='list'):
+    """按名称分页搜索记录 - 使用连接池优化
+
+    Args:
+        name: 名称关键词
+        page: 页码（从 1 开始）
+        per_page: 每页数量
+        view: 列投影视图 ('list', 'management', 'full')
+
+    Returns:
+        (records, total_count)
+    """
     connection = get_kb_db_connection()
     if connection is None:
         return [], 0
@@ -160,15 +268,19 @@ def fetch_records_by_name_with_pagination(name, page, per_page):
         offset = (page - 1) * per_page
         search_pattern = f"%{name}%"
 
-        with connection.cursor() as cursor:
+        with connection.cursor(pymysql.cursors.Cursor) as cursor:
             # 获取总数
-            cursor.execute("SELECT COUNT(*) as count FROM `KB-info` WHERE KB_Name LIKE %s", (search_pattern,))
+            cursor.execute("SELECT COUNT(*) FROM `KB-info` WHERE KB_Name LIKE %s", (search_pattern,))
             total_count_result = cursor.fetchone()
-            total_count = total_count_result['count'] if total_count_result else 0
+            total_count = total_count_result[0] if total_count_result else 0
 
             # 获取分页数据
-            cursor.execute("SELECT * FROM `KB-info` WHERE KB_Name LIKE %s ORDER BY KB_Number ASC LIMIT %s OFFSET %s", (search_pattern, per_page, offset))
-            records = cursor.fetchall()
+            cursor.execute(
+                f"SELECT {_select_columns(view)} FROM `KB-info` WHERE KB_Name LIKE %s "
+                f"ORDER BY KB_Number ASC LIMIT %s OFFSET %s",
+                (search_pattern, per_page, offset)
+            )
+            records = _fetch_rows(cursor, view)
 
         return records, total_count
     except Exception as e:
@@ -0,0 +1,164 @@
+"""
+SocketIO 跨进程消息总线
+多个 worker 进程共享 SocketIO 房间，任一进程 emit 的事件会转发到持有对应连接的进程
+
+通过 SOCKETIO_MESSAGE_QUEUE 选择后端:
+- 空（默认）: 单进程，不启用消息总线
+- redis://、rediss://: python-socketio RedisManager
+- kafka://: KafkaManager
+- zmq+tcp://: ZmqManager
+- sqlite:///path/to/bus.db: 本模块的 SQLitePubSubManager，
+  同一台机器的多个进程通过共享 SQLite 文件轮询通信，适合本地多 worker 调试和测试
+- 其他（amqp:// 等）: KombuManager
+
+Example:
+    >>> from common.socketio_bus import create_client_manager
+    >>> socketio = SocketIO(app, client_manager=create_client_manager())
+    >>>
+    >>> # 非 SocketIO 服务进程（后台任务、脚本）发送事件
+    >>> from common.socketio_bus import get_external_emitter
+    >>> get_external_emitter().emit('ticket_update', {'ticket_id': 'TK-xxx'}, room='ticket_TK-xxx')
+"""
+import os
+import pickle
+import sqlite3
+import threading
+import time
+import socketio
+import config
+from common.logger import logger
+
+
+class SQLitePubSubManager(socketio.PubSubManager):
+    """
+    基于 SQLite 文件的 SocketIO 消息总线
+
+    发布即向 bus 表插入一行，各进程的监听线程按 id 递增轮询新消息。
+    过期消息由发布方定期清理。只适用于同一台机器上的多进程，不适合跨主机部署。
+    """
+    name = 'sqlite'
+
+    def __init__(self, url='sqlite:///instance/socketio_bus.db', channel='flask-socketio',
+                 write_only=False, logger=None, poll_interval=None, retention=60):
+        super().__init__(channel=channel, write_only=write_only, logger=logger)
+        self.path = url[len('sqlite:///'):] if url.startswith('sqlite:///') else url
+        self.poll_interval = poll_interval if poll_interval is not None else config.SOCKETIO_BUS_POLL_INTERVAL
+        self.retention = retention
+        self._local = threading.local()
+        self._last_cleanup = 0.0
+
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS socketio_bus (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    channel TEXT NOT NULL,
+                    payload BLOB NOT NULL,
+                    created_at REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_channel_id ON socketio_bus (channel, id)")
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        return conn
+
+    def _get_conn(self):
+        """每个线程使用独立连接（sqlite3 连接不能跨线程共享）"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._connect()
+            self._local.conn = conn
+        return conn
+
+    def _publish(self, data):
+        now = time.time()
+        conn = self._get_conn()
+        conn.execute(
+            "INSERT INTO socketio_bus (channel, payload, created_at) VALUES (?, ?, ?)",
+            (self.channel, pickle.dumps(data), now)
+        )
+        if now - self._last_cleanup > self.retention:
+            self._last_cleanup = now
+            conn.execute("DELETE FROM socketio_bus WHERE created_at < ?", (now - self.retention,))
+
+    def _sleep(self, seconds):
+        if self.server is not None:
+            self.server.sleep(seconds)
+        else:
+            time.sleep(seconds)
+
+    def _listen(self):
+        conn = self._get_conn()
+        # 只接收启动之后发布的消息
+        row = conn.execute("SELECT COALESCE(MAX(id), 0) FROM socketio_bus").fetchone()
+        last_id = row[0]
+        while True:
+            try:
+                rows = conn.execute(
+                    "SELECT id, payload FROM socketio_bus WHERE channel = ? AND id > ? ORDER BY id",
+                    (self.channel, last_id)
+                ).fetchall()
+            except sqlite3.Error as e:
+                logger.error(f"SocketIO 消息总线读取失败: {e}")
+                rows = []
+                self._sleep(1)
+            for message_id, payload in rows:
+                last_id = message_id
+                yield payload
+            if not rows:
+                self._sleep(self.poll_interval)
+
+
+def create_client_manager(url=None, channel=None, write_only=False):
+    """
+    根据消息队列 URL 创建 SocketIO 客户端管理器
+
+    Args:
+        url: 消息队列 URL，默认使用 config.SOCKETIO_MESSAGE_QUEUE
+        channel: 频道名称，默认使用 config.SOCKETIO_CHANNEL
+        write_only: 只发布不监听（非 SocketIO 服务进程使用）
+
+    Returns:
+        socketio.PubSubManager | None: 未配置消息队列时返回 None（单进程模式）
+    """
+    url = config.SOCKETIO_MESSAGE_QUEUE if url is None else url
+    channel = channel or config.SOCKETIO_CHANNEL
+    if not url:
+        return None
+
+    if url.startswith('sqlite://'):
+        manager = SQLitePubSubManager(url, channel=channel, write_only=write_only)
+    elif url.startswith(('redis://', 'rediss://')):
+        manager = socketio.RedisManager(url, channel=channel, write_only=write_only)
+    elif url.startswith('kafka://'):
+        manager = socketio.KafkaManager(url, channel=channel, write_only=write_only)
+    elif url.startswith('zmq'):
+        manager = socketio.ZmqManager(url, channel=channel, write_only=write_only)
+    else:
+        manager = socketio.KombuManager(url, channel=channel, write_only=write_only)
+
+    logger.info(f"SocketIO 消息总线: {manager.name} ({'只写' if write_only else '读写'})")
+    return manager
+
+
+_external_emitter = None
+_emitter_lock = threading.Lock()
+
+
+def get_external_emitter():
+    """
+    获取只写的消息总线客户端，供没有 SocketIO 服务实例的进程发送事件
+
+    Returns:
+        socketio.PubSubManager | None: 未配置消息队列时返回 None
+    """
+    global _external_emitter
+    if _external_emitter is None and config.SOCKETIO_MESSAGE_QUEUE:
+        with _emitter_lock:
+            if _external_emitter is None:
+                _external_emitter = create_client_manager(write_only=True)
+    return _external_emitter
@@ -0,0 +1,160 @@
+"""
+预编译语句缓存模块
+热点查询按名称注册，使用 MySQL 服务端预编译语句（二进制协议）执行
+
+- 每条语句在每个物理连接上只 PREPARE 一次，之后复用语句句柄，只传参数
+- 预编译游标按物理连接缓存，连接归还连接池后再次检出仍可复用
+- 连接断开重连后底层连接对象变化，缓存随旧连接自动释放
+- 未安装 mysql-connector-python 或关闭 DB_PREPARED_STATEMENTS 时，
+  回退到 PyMySQL 文本协议执行同一条 SQL，调用方无需关心
+
+Example:
+    >>> from common.statement_cache import register_statement, fetch_one
+    >>> register_statement('kb.record_by_id', 'kb',
+    ...                    "SELECT * FROM `KB-info` WHERE KB_Number = %s")
+    >>> record = fetch_one('kb.record_by_id', (1001,))
+"""
+import threading
+import weakref
+import config
+from common.db_manager import get_prepared_pool
+from common.database_context import db_connection
+from common.logger import logger
+
+
+# 已注册的语句 {name: (db_name, sql)}
+_statements = {}
+
+# 物理连接 -> {name: 预编译游标}
+_cursor_cache = weakref.WeakKeyDictionary()
+_cache_lock = threading.Lock()
+
+# 预编译不可用时只记录一次日志
+_prepared_available = None
+
+
+def register_statement(name, db_name, sql):
+    """
+    注册命名语句
+
+    Args:
+        name: 语句名称，如 'kb.record_by_id'
+        db_name: 数据库名称 ('home', 'kb', 'case')
+        sql: SQL 语句，参数占位符使用 %s
+
+    Returns:
+        str: 语句名称
+    """
+    existing = _statements.get(name)
+    if existing and existing != (db_name, sql):
+        raise ValueError(f"语句 {name} 已注册为不同的 SQL")
+    _statements[name] = (db_name, sql)
+    return name
+
+
+def get_statement(name):
+    """获取已注册的语句 (db_name, sql)"""
+    try:
+        return _statements[name]
+    except KeyError:
+        raise KeyError(f"未注册的语句: {name}")
+
+
+def prepared_enabled():
+    """当前进程是否可以使用服务端预编译语句"""
+    global _prepared_available
+    if not config.DB_PREPARED_STATEMENTS:
+        return False
+    if _prepared_available is None:
+        try:
+            import mysql.connector  # noqa: F401
+            _prepared_available = True
+        except ImportError:
+            logger.warning("未安装 mysql-connector-python，热点查询回退到 PyMySQL 文本协议")
+            _prepared_available = False
+    return _prepared_available
+
+
+def _get_prepared_cursor(raw_conn, name, sql):
+    """获取物理连接上的预编译游标，不存在则创建"""
+    with _cache_lock:
+        cursors = _cursor_cache.get(raw_conn)
+        if cursors is None:
+            cursors = {}
+            _cursor_cache[raw_conn] = cursors
+    cursor = cursors.get(name)
+    if cursor is None:
+        cursor = raw_conn.cursor(prepared=True)
+        cursors[name] = cursor
+    return cursor
+
+
+def _execute_prepared(name, params):
+    """使用预编译语句执行查询，返回字典列表"""
+    db_name, sql = get_statement(name)
+    conn = get_prepared_pool(db_name).connection()
+    try:
+        # PooledDedicatedDBConnection -> SteadyDBConnection -> 原始连接
+        raw_conn = conn._con._con
+        cursor = _get_prepared_cursor(raw_conn, name, sql)
+        try:
+            cursor.execute(sql, params)
+            rows = cursor.fetchall()
+        except Exception:
+            # 语句句柄可能已失效（如服务端重启），关闭并丢弃后由下次调用重新 PREPARE；
+            # 只丢弃不关闭会让服务端语句句柄一直占用到连接断开
+            try:
+                cursor.close()
+            except Exception:
+                pass
+            _cursor_cache.get(raw_conn, {}).pop(name, None)
+            raise
+        columns = cursor.column_names
+        return [dict(zip(columns, row)) for row in rows]
+    finally:
+        conn.close()
+
+
+def _execute_text(name, params):
+    """使用 PyMySQL 文本协议执行查询，返回字典列表"""
+    db_name, sql = get_statement(name)
+    with db_connection(db_name) as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(sql, params)
+            return list(cursor.fetchall())
+
+
+def fetch_all(name, params=()):
+    """
+    执行已注册的查询语句并返回全部结果
+
+    Args:
+        name: 语句名称
+        params: 参数元组
+
+    Returns:
+        list[dict]: 查询结果
+    """
+    if prepared_enabled():
+        try:
+            return _execute_prepared(name, params)
+        except ImportError:
+            pass
+        except Exception as e:
+            logger.warning(f"预编译语句 {name} 执行失败，回退到文本协议: {e}")
+    return _execute_text(name, params)
+
+
+def fetch_one(name, params=()):
+    """
+    执行已注册的查询语句并返回第一行
+
+    Args:
+        name: 语句名称
+        params: 参数元组
+
+    Returns:
+        dict | None: 查询结果
+    """
+    rows = fetch_all(name, params)
+    return rows[0] if rows else None
@@ -6,12 +6,27 @@
 from werkzeug.security import check_password_hash, generate_password_hash
 from flask import session, request
 from common.db_manager import get_connection
+from common.statement_cache import register_statement, fetch_one
+
+
+# 热点查询：登录时按用户名或邮箱查询活跃用户（服务端预编译）
+STMT_AUTH_USER_LOOKUP = register_statement(
+    'auth.user_lookup', 'kb',
+    """
+    SELECT id, username, password_hash, display_name, real_name, role, status, login_attempts
+    FROM `users`
+    WHERE (username = %s OR email = %s) AND status = 'active'
+    """
+)
 
 
 def authenticate_user(username, password):
     """
     统一用户认证
     统一使用 werkzeug 密码加密（更安全）
+
+    用户查询走 common.statement_cache 的预编译连接池，登录日志和失败计数仍使用 PyMySQL 连接，
+    因此每次登录同时占用两个池化连接（kb 与 kb:prepared 各一个），设置连接池上限时需考虑
     """
     conn = get_connection('kb')
     if conn is None:
@@ -20,13 +35,7 @@ def authenticate_user(username, password):
     try:
         with conn.cursor() as cursor:
             # 查询用户信息 - 支持用户名或邮箱登录
-            sql = """
-            SELECT id, username, password_hash, display_name, real_name, role, status, login_attempts
-            FROM `users`
-            WHERE (username = %s OR email = %s) AND status = 'active'
-            """
-            cursor.execute(sql, (username, username))
-            user = cursor.fetchone()
+            user = fetch_one(STMT_AUTH_USER_LOOKUP, (username, username))
 
             if not user:
                 return False, "用户名或密码错误"
@@ -72,7 +72,8 @@ CREATE TABLE IF NOT EXISTS `users` (
     INDEX idx_username (`username`),
     INDEX idx_status (`status`),
     INDEX idx_role (`role`),
-    INDEX idx_system (`system`)
+    INDEX idx_system (`system`),
+    INDEX idx_email (`email`)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='统一用户表';
 
 -- 知识库登录日志表
@@ -88,7 +89,8 @@ CREATE TABLE IF NOT EXISTS `mgmt_login_logs` (
     INDEX idx_user_id (`user_id`),
     INDEX idx_username (`username`),
     INDEX idx_status (`status`),
-    INDEX idx_login_time (`login_time`)
+    INDEX idx_login_time (`login_time`),
+    INDEX idx_status_login_time (`status`, `login_time`)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='知识库登录日志表';
 
 -- 插入默认管理员用户
@@ -141,7 +143,14 @@ CREATE TABLE IF NOT EXISTS `tickets` (
     INDEX idx_customer_contact_name (`customer_contact_name`),
     INDEX idx_submit_user (`submit_user`),
     INDEX idx_status (`status`),
-    INDEX idx_assignee (`assignee`)
+    INDEX idx_assignee (`assignee`),
+    -- 工单列表键集分页复合索引 (v2.3)
+    INDEX idx_submit_user_create_time (`submit_user`, `create_time`, `id`),
+    INDEX idx_status_create_time (`status`, `create_time`, `id`),
+    INDEX idx_assignee_create_time (`assignee`, `create_time`, `id`),
+    INDEX idx_create_time (`create_time`, `id`),
+    -- 查找待归档工单 (v2.3)
+    INDEX idx_status_update_time (`status`, `update_time`)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='工单系统主表';
 
 -- 工单聊天消息表
@@ -153,9 +162,137 @@ CREATE TABLE IF NOT EXISTS `messages` (
     `content` TEXT NOT NULL COMMENT '消息内容',
     `send_time` DATETIME NOT NULL COMMENT '发送时间',
     INDEX idx_ticket_id (`ticket_id`),
-    INDEX idx_send_time (`send_time`)
+    INDEX idx_send_time (`send_time`),
+    INDEX idx_ticket_id_send_time (`ticket_id`, `send_time`, `id`)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='工单聊天消息表';
 
+-- 工单消息已读游标表
+CREATE TABLE IF NOT EXISTS `ticket_read_cursors` (
+    `username` VARCHAR(50) NOT NULL COMMENT '用户名',
+    `ticket_id` VARCHAR(32) NOT NULL COMMENT '工单ID',
+    `last_read_message_id` INT NOT NULL DEFAULT 0 COMMENT '已读到的消息ID',
+    `unread_count` INT NOT NULL DEFAULT 0 COMMENT '未读消息数',
+    `update_time` DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP COMMENT '更新时间',
+    PRIMARY KEY (`username`, `ticket_id`),
+    INDEX idx_ticket_id (`ticket_id`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='工单消息已读游标表';
+
+-- id 序列表（批量写入模式下按块预分配消息 id）
+CREATE TABLE IF NOT EXISTS `id_sequences` (
+    `name` VARCHAR(64) NOT NULL PRIMARY KEY COMMENT '序列名称',
+    `next_value` BIGINT NOT NULL DEFAULT 1 COMMENT '下一个可分配的值'
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='id 序列表';
+
+-- 工单附件表
+CREATE TABLE IF NOT EXISTS `attachments` (
+    `id` INT AUTO_INCREMENT PRIMARY KEY COMMENT '附件ID',
+    `ticket_id` VARCHAR(32) NOT NULL COMMENT '工单ID',
+    `filename` VARCHAR(255) NOT NULL COMMENT '原始文件名',
+    `stored_path` VARCHAR(512) NOT NULL COMMENT '存储路径/存储键',
+    `storage` VARCHAR(16) NOT NULL DEFAULT 'static' COMMENT '存储后端: static（旧版 static 目录）/ local / s3',
+    `file_size` BIGINT NOT NULL DEFAULT 0 COMMENT '文件大小（字节）',
+    `mime_type` VARCHAR(100) DEFAULT NULL COMMENT 'MIME 类型',
+    `sha256` CHAR(64) DEFAULT NULL COMMENT '文件内容 SHA-256',
+    `uploaded_by` VARCHAR(50) DEFAULT NULL COMMENT '上传人用户名',
+    `upload_time` DATETIME NOT NULL COMMENT '上传时间',
+    `preview_status` VARCHAR(16) DEFAULT NULL COMMENT '图片预览生成状态: pending / ready / failed，非图片为空',
+    `variants` TEXT DEFAULT NULL COMMENT '图片缩略图/WebP 预览（JSON）',
+    INDEX idx_ticket_id (`ticket_id`, `id`),
+    INDEX idx_sha256 (`sha256`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='工单附件表';
+
+-- 工单统计计数表（按 维度 + 维度值 + 状态 计数）
+CREATE TABLE IF NOT EXISTS `ticket_stat_counters` (
+    `dimension` VARCHAR(16) NOT NULL COMMENT '统计维度: priority / assignee / product',
+    `dim_value` VARCHAR(100) NOT NULL DEFAULT '' COMMENT '维度值（未分配为空字符串）',
+    `status` VARCHAR(10) NOT NULL COMMENT '工单状态',
+    `ticket_count` INT NOT NULL DEFAULT 0 COMMENT '工单数',
+    PRIMARY KEY (`dimension`, `dim_value`, `status`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='工单统计计数表';
+
+-- 工单每日统计表
+CREATE TABLE IF NOT EXISTS `ticket_daily_stats` (
+    `stat_date` DATE NOT NULL PRIMARY KEY COMMENT '日期',
+    `created` INT NOT NULL DEFAULT 0 COMMENT '新建工单数',
+    `closed` INT NOT NULL DEFAULT 0 COMMENT '关闭工单数'
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='工单每日统计表';
+
+-- 工单检索倒排索引表
+CREATE TABLE IF NOT EXISTS `ticket_search_terms` (
+    `term` VARCHAR(32) NOT NULL COMMENT '词项（中文二元组 / 小写英文单词、数字）',
+    `ticket_id` VARCHAR(32) NOT NULL COMMENT '工单ID',
+    `weight` INT NOT NULL DEFAULT 0 COMMENT '加权词频（标题 4、解决方案 2、正文和消息 1）',
+    PRIMARY KEY (`term`, `ticket_id`),
+    INDEX idx_ticket_id (`ticket_id`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_bin COMMENT='工单检索倒排索引表';
+
+-- 归档工单表（关闭超过 TICKET_ARCHIVE_AFTER_DAYS 天的工单，列与 tickets 相同，id 保留原值）
+CREATE TABLE IF NOT EXISTS `tickets_archive` (
+    `id` INT NOT NULL COMMENT '原工单自增ID(重启后自增值可能回退，不保证唯一)',
+    `ticket_id` VARCHAR(32) NOT NULL PRIMARY KEY COMMENT '工单唯一标识ID',
+    `customer_name` VARCHAR(100) NOT NULL COMMENT '客户名称',
+    `customer_contact_name` VARCHAR(100) NOT NULL DEFAULT '' COMMENT '客户联系人姓名(当前登录用户)',
+    `customer_contact` VARCHAR(50) NOT NULL COMMENT '客户联系方式',
+    `customer_email` VARCHAR(100) NOT NULL COMMENT '客户邮箱',
+    `submit_user` VARCHAR(100) NOT NULL DEFAULT '' COMMENT '提交工单的用户名(来自统一用户表)',
+    `product` VARCHAR(50) NOT NULL COMMENT '涉及产品',
+    `issue_type` VARCHAR(20) NOT NULL COMMENT '问题类型',
+    `priority` VARCHAR(10) NOT NULL COMMENT '工单优先级',
+    `title` VARCHAR(200) NOT NULL COMMENT '问题标题',
+    `content` TEXT NOT NULL COMMENT '问题详情',
+    `resolution` TEXT NULL COMMENT '解决方案',
+    `status` VARCHAR(10) DEFAULT 'pending' COMMENT '工单状态',
+    `assignee` VARCHAR(100) NULL COMMENT '处理人',
+    `create_time` DATETIME NOT NULL COMMENT '创建时间',
+    `update_time` DATETIME NOT NULL COMMENT '更新时间',
+    `archived_at` DATETIME NOT NULL COMMENT '归档时间',
+    INDEX idx_submit_user (`submit_user`),
+    INDEX idx_archived_at (`archived_at`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='归档工单表';
+
+-- 归档工单聊天消息表
+CREATE TABLE IF NOT EXISTS `messages_archive` (
+    `id` INT NOT NULL COMMENT '原消息ID',
+    `ticket_id` VARCHAR(32) NOT NULL COMMENT '工单ID',
+    `sender` VARCHAR(20) NOT NULL COMMENT '发送者',
+    `sender_name` VARCHAR(100) NOT NULL COMMENT '发送者名称',
+    `content` TEXT NOT NULL COMMENT '消息内容',
+    `send_time` DATETIME NOT NULL COMMENT '发送时间',
+    PRIMARY KEY (`ticket_id`, `id`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='归档工单聊天消息表';
+
+-- 工单 SLA 期限表（next_due 为最近一个未达成、未升级的期限）
+CREATE TABLE IF NOT EXISTS `ticket_sla` (
+    `ticket_id` VARCHAR(32) NOT NULL PRIMARY KEY COMMENT '工单ID',
+    `priority` VARCHAR(10) NOT NULL COMMENT '计算期限时的优先级',
+    `response_due` DATETIME NOT NULL COMMENT '首次响应期限',
+    `resolution_due` DATETIME NOT NULL COMMENT '解决期限',
+    `responded_at` DATETIME NULL COMMENT '首次响应时间',
+    `resolved_at` DATETIME NULL COMMENT '解决时间（重新打开时清除）',
+    `response_escalated_at` DATETIME NULL COMMENT '首次响应超时升级时间',
+    `resolution_escalated_at` DATETIME NULL COMMENT '解决超时升级时间',
+    `next_due` DATETIME NULL COMMENT '最近一个未达成、未升级的期限',
+    INDEX idx_next_due (`next_due`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='工单 SLA 期限表';
+
+-- 邮件发件箱表（后台线程发送，失败按指数退避重试）
+CREATE TABLE IF NOT EXISTS `mail_outbox` (
+    `id` BIGINT AUTO_INCREMENT PRIMARY KEY COMMENT '邮件ID',
+    `category` VARCHAR(32) NOT NULL DEFAULT 'general' COMMENT '类别: ticket/sla/contact/general',
+    `recipient` VARCHAR(255) NOT NULL COMMENT '收件人',
+    `subject` VARCHAR(255) NOT NULL COMMENT '主题',
+    `body` TEXT NOT NULL COMMENT '正文',
+    `digest_key` VARCHAR(255) NULL COMMENT '摘要合并键（为空时单独发送）',
+    `status` VARCHAR(16) NOT NULL DEFAULT 'pending' COMMENT '状态: pending/sent/failed',
+    `attempts` INT NOT NULL DEFAULT 0 COMMENT '已尝试次数',
+    `next_attempt_at` DATETIME NOT NULL COMMENT '下次发送时间',
+    `last_error` VARCHAR(500) NULL COMMENT '最近一次失败原因',
+    `created_at` DATETIME NOT NULL COMMENT '创建时间',
+    `sent_at` DATETIME NULL COMMENT '发送时间',
+    INDEX idx_status_next_attempt (`status`, `next_attempt_at`),
+    INDEX idx_digest_key (`digest_key`, `status`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='邮件发件箱表';
+
 -- 工单数据由用户通过前端界面创建
 
 
@@ -173,7 +310,7 @@ CREATE TABLE IF NOT EXISTS `messages` (
     `created_at` TIMESTAMP DEFAULT CURRENT_TIMESTAMP COMMENT '创建时间',
     `status` VARCHAR(20) DEFAULT 'pending' COMMENT '状态：pending-待处理, processed-已处理',
     INDEX idx_created_at (`created_at`),
-    INDEX idx_status (`status`)
+    INDEX idx_status_created_at (`status`, `created_at`, `id`)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='官网留言表';
 
 -- 留言数据由用户通过前端界面提交
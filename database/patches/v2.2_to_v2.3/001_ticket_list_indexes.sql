@@ -0,0 +1,71 @@
+-- =====================================================
+-- 补丁: 工单列表复合索引
+-- 影响数据库: casedb
+-- 创建时间: 2026-10-19
+-- 版本范围: v2.2 -> v2.3
+-- 功能说明: 为工单列表键集分页 (ORDER BY create_time DESC, id DESC) 添加复合索引
+--           覆盖按提交用户、状态、处理人过滤以及无过滤条件的列表查询
+-- =====================================================
+
+USE `casedb`;
+
+-- =====================================================
+-- 1. 客户查看自己的工单: WHERE submit_user = ? ORDER BY create_time, id
+-- =====================================================
+SET @idx_exists = (SELECT COUNT(*) FROM INFORMATION_SCHEMA.STATISTICS
+     WHERE TABLE_SCHEMA = 'casedb' AND TABLE_NAME = 'tickets' AND INDEX_NAME = 'idx_submit_user_create_time');
+SET @sql = IF(@idx_exists = 0,
+    'CREATE INDEX `idx_submit_user_create_time` ON `tickets`(`submit_user`, `create_time`, `id`)',
+    'SELECT "Index idx_submit_user_create_time already exists" AS message');
+PREPARE stmt FROM @sql;
+EXECUTE stmt;
+DEALLOCATE PREPARE stmt;
+
+-- =====================================================
+-- 2. 按状态筛选: WHERE status = ? ORDER BY create_time, id
+-- =====================================================
+SET @idx_exists = (SELECT COUNT(*) FROM INFORMATION_SCHEMA.STATISTICS
+     WHERE TABLE_SCHEMA = 'casedb' AND TABLE_NAME = 'tickets' AND INDEX_NAME = 'idx_status_create_time');
+SET @sql = IF(@idx_exists = 0,
+    'CREATE INDEX `idx_status_create_time` ON `tickets`(`status`, `create_time`, `id`)',
+    'SELECT "Index idx_status_create_time already exists" AS message');
+PREPARE stmt FROM @sql;
+EXECUTE stmt;
+DEALLOCATE PREPARE stmt;
+
+-- =====================================================
+-- 3. 我处理的工单: WHERE assignee = ? ORDER BY create_time, id
+-- =====================================================
+SET @idx_exists = (SELECT COUNT(*) FROM INFORMATION_SCHEMA.STATISTICS
+     WHERE TABLE_SCHEMA = 'casedb' AND TABLE_NAME = 'tickets' AND INDEX_NAME = 'idx_assignee_create_time');
+SET @sql = IF(@idx_exists = 0,
+    'CREATE INDEX `idx_assignee_create_time` ON `tickets`(`assignee`, `create_time`, `id`)',
+    'SELECT "Index idx_assignee_create_time already exists" AS message');
+PREPARE stmt FROM @sql;
+EXECUTE stmt;
+DEALLOCATE PREPARE stmt;
+
+-- =====================================================
+-- 4. 全部工单 / 按优先级、产品、日期筛选: ORDER BY create_time, id
+-- =====================================================
+SET @idx_exists = (SELECT COUNT(*) FROM INFORMATION_SCHEMA.STATISTICS
+     WHERE TABLE_SCHEMA = 'casedb' AND TABLE_NAME = 'tickets' AND INDEX_NAME = 'idx_create_time');
+SET @sql = IF(@idx_exists = 0,
+    'CREATE INDEX `idx_create_time` ON `tickets`(`create_time`, `id`)',
+    'SELECT "Index idx_create_time already exists" AS message');
+PREPARE stmt FROM @sql;
+EXECUTE stmt;
+DEALLOCATE PREPARE stmt;
+
+-- =====================================================
+-- 5. 验证索引
+-- =====================================================
+SELECT '=================================================' AS info;
+SELECT '工单列表复合索引补丁验证' AS info;
+SELECT '=================================================' AS info;
+
+SHOW INDEX FROM `tickets`;
+
+SELECT '=================================================' AS info;
+SELECT '补丁执行完成!' AS status;
+SELECT '=================================================' AS info;
@@ -0,0 +1,66 @@
+-- =====================================================
+-- 补丁: 热点查询复合索引
+-- 影响数据库: casedb, YHKB
+-- 创建时间: 2026-10-19
+-- 版本范围: v2.2 -> v2.3
+-- 功能说明: 为工单消息、登录日志、登录用户查询添加复合/缺失索引
+--           工单列表相关索引见 001_ticket_list_indexes.sql
+-- =====================================================
+
+USE `casedb`;
+
+-- =====================================================
+-- 1. 工单消息: WHERE ticket_id = ? ORDER BY send_time, id
+-- =====================================================
+SET @idx_exists = (SELECT COUNT(*) FROM INFORMATION_SCHEMA.STATISTICS
+     WHERE TABLE_SCHEMA = 'casedb' AND TABLE_NAME = 'messages' AND INDEX_NAME = 'idx_ticket_id_send_time');
+SET @sql = IF(@idx_exists = 0,
+    'CREATE INDEX `idx_ticket_id_send_time` ON `messages`(`ticket_id`, `send_time`, `id`)',
+    'SELECT "Index idx_ticket_id_send_time already exists" AS message');
+PREPARE stmt FROM @sql;
+EXECUTE stmt;
+DEALLOCATE PREPARE stmt;
+
+
+USE `YHKB`;
+
+-- =====================================================
+-- 2. 登录日志: WHERE status = ? [AND login_time >= ?]
+--    今日登录统计已改为 login_time 范围查询，可直接使用 idx_login_time
+-- =====================================================
+SET @idx_exists = (SELECT COUNT(*) FROM INFORMATION_SCHEMA.STATISTICS
+     WHERE TABLE_SCHEMA = 'YHKB' AND TABLE_NAME = 'mgmt_login_logs' AND INDEX_NAME = 'idx_status_login_time');
+SET @sql = IF(@idx_exists = 0,
+    'CREATE INDEX `idx_status_login_time` ON `mgmt_login_logs`(`status`, `login_time`)',
+    'SELECT "Index idx_status_login_time already exists" AS message');
+PREPARE stmt FROM @sql;
+EXECUTE stmt;
+DEALLOCATE PREPARE stmt;
+
+-- =====================================================
+-- 3. 登录用户查询: WHERE (username = ? OR email = ?) AND status = 'active'
+--    email 无索引时 OR 条件会退化为全表扫描
+-- =====================================================
+SET @idx_exists = (SELECT COUNT(*) FROM INFORMATION_SCHEMA.STATISTICS
+     WHERE TABLE_SCHEMA = 'YHKB' AND TABLE_NAME = 'users' AND INDEX_NAME = 'idx_email');
+SET @sql = IF(@idx_exists = 0,
+    'CREATE INDEX `idx_email` ON `users`(`email`)',
+    'SELECT "Index idx_email already exists" AS message');
+PREPARE stmt FROM @sql;
+EXECUTE stmt;
+DEALLOCATE PREPARE stmt;
+
+-- =====================================================
+-- 4. 验证索引
+-- =====================================================
+SELECT '=================================================' AS info;
+SELECT '热点查询索引补丁验证' AS info;
+SELECT '=================================================' AS info;
+
+SHOW INDEX FROM `casedb`.`messages`;
+SHOW INDEX FROM `YHKB`.`mgmt_login_logs`;
+SHOW INDEX FROM `YHKB`.`users`;
+
+SELECT '=================================================' AS info;
+SELECT '补丁执行完成!' AS status;
+SELECT '=================================================' AS info;
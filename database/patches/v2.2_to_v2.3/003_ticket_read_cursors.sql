@@ -0,0 +1,27 @@
+-- =====================================================
+-- 补丁: 工单消息已读游标表
+-- 影响数据库: casedb
+-- 创建时间: 2026-10-19
+-- 版本范围: v2.2 -> v2.3
+-- 功能说明: 按 (用户, 工单) 记录已读到的消息ID和未读数
+--           新消息写入时增量维护，工单列表一次查询取回未读数
+-- =====================================================
+
+USE `casedb`;
+
+CREATE TABLE IF NOT EXISTS `ticket_read_cursors` (
+    `username` VARCHAR(50) NOT NULL COMMENT '用户名',
+    `ticket_id` VARCHAR(32) NOT NULL COMMENT '工单ID',
+    `last_read_message_id` INT NOT NULL DEFAULT 0 COMMENT '已读到的消息ID',
+    `unread_count` INT NOT NULL DEFAULT 0 COMMENT '未读消息数',
+    `update_time` DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP COMMENT '更新时间',
+    PRIMARY KEY (`username`, `ticket_id`),
+    INDEX idx_ticket_id (`ticket_id`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='工单消息已读游标表';
+
+-- =====================================================
+-- 验证
+-- =====================================================
+SHOW CREATE TABLE `casedb`.`ticket_read_cursors`;
+
+SELECT '补丁执行完成!' AS status;
@@ -0,0 +1,24 @@
+-- =====================================================
+-- 补丁: id 序列表
+-- 影响数据库: casedb
+-- 创建时间: 2026-10-19
+-- 版本范围: v2.2 -> v2.3
+-- 功能说明: CHAT_MESSAGE_DURABILITY=batched 时按块（HiLo）预分配消息 id，
+--           消息可在写库前确定 id 并立即推送
+-- =====================================================
+
+USE `casedb`;
+
+-- id 序列表（批量写入模式下按块预分配消息 id）
+CREATE TABLE IF NOT EXISTS `id_sequences` (
+    `name` VARCHAR(64) NOT NULL PRIMARY KEY COMMENT '序列名称',
+    `next_value` BIGINT NOT NULL DEFAULT 1 COMMENT '下一个可分配的值'
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='id 序列表';
+
+-- 从当前最大消息 id 开始分配
+INSERT IGNORE INTO `id_sequences` (`name`, `next_value`)
+SELECT 'messages', COALESCE(MAX(`id`), 0) + 1 FROM `messages`;
+
+SELECT * FROM `id_sequences`;
+
+SELECT '补丁执行完成!' AS status;
@@ -0,0 +1,29 @@
+-- =====================================================
+-- 补丁: 工单附件表
+-- 影响数据库: casedb
+-- 创建时间: 2026-10-19
+-- 版本范围: v2.2 -> v2.3
+-- 功能说明: 附件上传时登记元数据，附件列表按 (ticket_id, id) 索引查询，
+--           不再扫描上传目录；已有文件用 scripts/backfill_attachments.py 补录
+-- =====================================================
+
+USE `casedb`;
+
+-- 工单附件表
+CREATE TABLE IF NOT EXISTS `attachments` (
+    `id` INT AUTO_INCREMENT PRIMARY KEY COMMENT '附件ID',
+    `ticket_id` VARCHAR(32) NOT NULL COMMENT '工单ID',
+    `filename` VARCHAR(255) NOT NULL COMMENT '原始文件名',
+    `stored_path` VARCHAR(512) NOT NULL COMMENT '存储路径',
+    `file_size` BIGINT NOT NULL DEFAULT 0 COMMENT '文件大小（字节）',
+    `mime_type` VARCHAR(100) DEFAULT NULL COMMENT 'MIME 类型',
+    `sha256` CHAR(64) DEFAULT NULL COMMENT '文件内容 SHA-256',
+    `uploaded_by` VARCHAR(50) DEFAULT NULL COMMENT '上传人用户名',
+    `upload_time` DATETIME NOT NULL COMMENT '上传时间',
+    INDEX idx_ticket_id (`ticket_id`, `id`),
+    INDEX idx_sha256 (`sha256`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='工单附件表';
+
+SHOW INDEX FROM `attachments`;
+
+SELECT '补丁执行完成!' AS status;
@@ -0,0 +1,23 @@
+-- =====================================================
+-- 补丁: 附件存储后端字段
+-- 影响数据库: casedb
+-- 创建时间: 2026-10-19
+-- 版本范围: v2.2 -> v2.3
+-- 功能说明: 附件改为按内容 SHA-256 寻址存储（本地目录或 S3 兼容对象存储），
+--           storage 记录附件所在后端；已有附件保留在 static/uploads/case，标记为 static
+-- =====================================================
+
+USE `casedb`;
+
+SET @col_exists = (SELECT COUNT(*) FROM INFORMATION_SCHEMA.COLUMNS
+     WHERE TABLE_SCHEMA = 'casedb' AND TABLE_NAME = 'attachments' AND COLUMN_NAME = 'storage');
+SET @sql = IF(@col_exists = 0,
+    'ALTER TABLE `attachments` MODIFY COLUMN `stored_path` VARCHAR(512) NOT NULL COMMENT ''存储路径/存储键'', ADD COLUMN `storage` VARCHAR(16) NOT NULL DEFAULT ''static'' COMMENT ''存储后端: static（旧版 static 目录）/ local / s3'' AFTER `stored_path`',
+    'SELECT "Column storage already exists" AS message');
+PREPARE stmt FROM @sql;
+EXECUTE stmt;
+DEALLOCATE PREPARE stmt;
+
+SELECT `storage`, COUNT(*) AS attachments FROM `attachments` GROUP BY `storage`;
+
+SELECT '补丁执行完成!' AS status;
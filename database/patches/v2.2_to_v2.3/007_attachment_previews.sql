@@ -0,0 +1,21 @@
+-- =====================================================
+-- 补丁: 附件图片预览字段
+-- 影响数据库: casedb
+-- 创建时间: 2026-10-19
+-- 版本范围: v2.2 -> v2.3
+-- 功能说明: 图片附件上传后在后台生成 WebP 缩略图和响应式尺寸，
+--           生成状态和各尺寸的存储键记录在 attachments 表中
+-- =====================================================
+
+USE `casedb`;
+
+SET @col_exists = (SELECT COUNT(*) FROM INFORMATION_SCHEMA.COLUMNS
+     WHERE TABLE_SCHEMA = 'casedb' AND TABLE_NAME = 'attachments' AND COLUMN_NAME = 'preview_status');
+SET @sql = IF(@col_exists = 0,
+    'ALTER TABLE `attachments` ADD COLUMN `preview_status` VARCHAR(16) DEFAULT NULL COMMENT ''图片预览生成状态: pending / ready / failed，非图片为空'' AFTER `upload_time`, ADD COLUMN `variants` TEXT DEFAULT NULL COMMENT ''图片缩略图/WebP 预览（JSON）'' AFTER `preview_status`',
+    'SELECT "Column preview_status already exists" AS message');
+PREPARE stmt FROM @sql;
+EXECUTE stmt;
+DEALLOCATE PREPARE stmt;
+
+SELECT '补丁执行完成!' AS status;
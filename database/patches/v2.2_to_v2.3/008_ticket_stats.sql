@@ -0,0 +1,50 @@
+-- =====================================================
+-- 补丁: 工单统计计数表
+-- 影响数据库: casedb
+-- 创建时间: 2026-10-19
+-- 版本范围: v2.2 -> v2.3
+-- 功能说明: /case/api/stats 看板统计从计数表读取，不再扫描 tickets；
+--           计数在修改工单的事务内更新，后台定期与 tickets 核对
+-- =====================================================
+
+USE `casedb`;
+
+-- 工单统计计数表（按 维度 + 维度值 + 状态 计数）
+CREATE TABLE IF NOT EXISTS `ticket_stat_counters` (
+    `dimension` VARCHAR(16) NOT NULL COMMENT '统计维度: priority / assignee / product',
+    `dim_value` VARCHAR(100) NOT NULL DEFAULT '' COMMENT '维度值（未分配为空字符串）',
+    `status` VARCHAR(10) NOT NULL COMMENT '工单状态',
+    `ticket_count` INT NOT NULL DEFAULT 0 COMMENT '工单数',
+    PRIMARY KEY (`dimension`, `dim_value`, `status`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='工单统计计数表';
+
+-- 工单每日统计表
+CREATE TABLE IF NOT EXISTS `ticket_daily_stats` (
+    `stat_date` DATE NOT NULL PRIMARY KEY COMMENT '日期',
+    `created` INT NOT NULL DEFAULT 0 COMMENT '新建工单数',
+    `closed` INT NOT NULL DEFAULT 0 COMMENT '关闭工单数'
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='工单每日统计表';
+
+-- 按现有工单初始化计数（已有计数时保留，偏差由后台核对修正）
+INSERT IGNORE INTO `ticket_stat_counters` (`dimension`, `dim_value`, `status`, `ticket_count`)
+SELECT 'priority', COALESCE(`priority`, ''), COALESCE(`status`, 'pending'), COUNT(*) FROM `tickets` GROUP BY 2, 3;
+
+INSERT IGNORE INTO `ticket_stat_counters` (`dimension`, `dim_value`, `status`, `ticket_count`)
+SELECT 'assignee', COALESCE(`assignee`, ''), COALESCE(`status`, 'pending'), COUNT(*) FROM `tickets` GROUP BY 2, 3;
+
+INSERT IGNORE INTO `ticket_stat_counters` (`dimension`, `dim_value`, `status`, `ticket_count`)
+SELECT 'product', COALESCE(`product`, ''), COALESCE(`status`, 'pending'), COUNT(*) FROM `tickets` GROUP BY 2, 3;
+
+-- 每日新建数按创建时间统计；历史关闭时间未记录，按关闭工单的最后更新时间近似
+INSERT IGNORE INTO `ticket_daily_stats` (`stat_date`, `created`, `closed`)
+SELECT d.stat_date, SUM(d.created), SUM(d.closed)
+FROM (
+    SELECT DATE(`create_time`) AS stat_date, COUNT(*) AS created, 0 AS closed FROM `tickets` GROUP BY 1
+    UNION ALL
+    SELECT DATE(`update_time`), 0, COUNT(*) FROM `tickets` WHERE `status` = 'closed' GROUP BY 1
+) d
+GROUP BY d.stat_date;
+
+SELECT `dimension`, COUNT(*) AS `keys`, SUM(`ticket_count`) AS `tickets` FROM `ticket_stat_counters` GROUP BY `dimension`;
+
+SELECT '补丁执行完成!' AS status;
@@ -0,0 +1,25 @@
+-- =====================================================
+-- 补丁: 工单全文检索倒排索引表
+-- 影响数据库: casedb
+-- 创建时间: 2026-10-19
+-- 版本范围: v2.2 -> v2.3
+-- 功能说明: /case/api/tickets/search 检索工单标题、正文、解决方案和聊天消息；
+--           MariaDB FULLTEXT 没有中文 ngram 分词器，由应用切分二元组后写入本表，
+--           创建工单、写入消息时增量更新
+-- 执行后: 运行 python scripts/build_search_index.py 为已有工单建立索引
+-- =====================================================
+
+USE `casedb`;
+
+-- 工单检索倒排索引表（词项区分大小写比较，应用写入前已统一转小写）
+CREATE TABLE IF NOT EXISTS `ticket_search_terms` (
+    `term` VARCHAR(32) NOT NULL COMMENT '词项（中文二元组 / 小写英文单词、数字）',
+    `ticket_id` VARCHAR(32) NOT NULL COMMENT '工单ID',
+    `weight` INT NOT NULL DEFAULT 0 COMMENT '加权词频（标题 4、解决方案 2、正文和消息 1）',
+    PRIMARY KEY (`term`, `ticket_id`),
+    INDEX idx_ticket_id (`ticket_id`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_bin COMMENT='工单检索倒排索引表';
+
+SELECT COUNT(*) AS indexed_terms FROM `ticket_search_terms`;
+
+SELECT '补丁执行完成!' AS status;
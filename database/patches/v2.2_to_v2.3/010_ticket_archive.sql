@@ -0,0 +1,69 @@
+-- =====================================================
+-- 补丁: 工单归档表
+-- 影响数据库: casedb
+-- 创建时间: 2026-10-19
+-- 版本范围: v2.2 -> v2.3
+-- 功能说明: 关闭超过 TICKET_ARCHIVE_AFTER_DAYS 天的工单连同消息移入归档表，
+--           工单列表、未读数等查询只扫描活跃数据；详情、消息、检索回退读取归档表。
+--           tickets.ticket_id 为唯一键，MySQL 分区表要求分区列包含在每个唯一键中，
+--           因此使用独立的归档表而不是按时间分区
+-- 执行后: 由应用后台定期归档，或运行 python scripts/archive_tickets.py
+-- =====================================================
+
+USE `casedb`;
+
+-- =====================================================
+-- 1. 归档工单表（列与 tickets 相同，id 保留原值）
+-- =====================================================
+CREATE TABLE IF NOT EXISTS `tickets_archive` (
+    `id` INT NOT NULL PRIMARY KEY COMMENT '原工单自增ID',
+    `ticket_id` VARCHAR(32) NOT NULL UNIQUE COMMENT '工单唯一标识ID',
+    `customer_name` VARCHAR(100) NOT NULL COMMENT '客户名称',
+    `customer_contact_name` VARCHAR(100) NOT NULL DEFAULT '' COMMENT '客户联系人姓名(当前登录用户)',
+    `customer_contact` VARCHAR(50) NOT NULL COMMENT '客户联系方式',
+    `customer_email` VARCHAR(100) NOT NULL COMMENT '客户邮箱',
+    `submit_user` VARCHAR(100) NOT NULL DEFAULT '' COMMENT '提交工单的用户名(来自统一用户表)',
+    `product` VARCHAR(50) NOT NULL COMMENT '涉及产品',
+    `issue_type` VARCHAR(20) NOT NULL COMMENT '问题类型',
+    `priority` VARCHAR(10) NOT NULL COMMENT '工单优先级',
+    `title` VARCHAR(200) NOT NULL COMMENT '问题标题',
+    `content` TEXT NOT NULL COMMENT '问题详情',
+    `resolution` TEXT NULL COMMENT '解决方案',
+    `status` VARCHAR(10) DEFAULT 'pending' COMMENT '工单状态',
+    `assignee` VARCHAR(100) NULL COMMENT '处理人',
+    `create_time` DATETIME NOT NULL COMMENT '创建时间',
+    `update_time` DATETIME NOT NULL COMMENT '更新时间',
+    `archived_at` DATETIME NOT NULL COMMENT '归档时间',
+    INDEX idx_submit_user (`submit_user`),
+    INDEX idx_archived_at (`archived_at`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='归档工单表';
+
+-- =====================================================
+-- 2. 归档消息表（id 保留原值，按工单键集分页）
+-- =====================================================
+CREATE TABLE IF NOT EXISTS `messages_archive` (
+    `id` INT NOT NULL PRIMARY KEY COMMENT '原消息ID',
+    `ticket_id` VARCHAR(32) NOT NULL COMMENT '工单ID',
+    `sender` VARCHAR(20) NOT NULL COMMENT '发送者',
+    `sender_name` VARCHAR(100) NOT NULL COMMENT '发送者名称',
+    `content` TEXT NOT NULL COMMENT '消息内容',
+    `send_time` DATETIME NOT NULL COMMENT '发送时间',
+    INDEX idx_ticket_id (`ticket_id`, `id`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='归档工单聊天消息表';
+
+-- =====================================================
+-- 3. 查找待归档工单: WHERE status = 'closed' AND update_time < ? ORDER BY update_time
+-- =====================================================
+SET @idx_exists = (SELECT COUNT(*) FROM INFORMATION_SCHEMA.STATISTICS
+     WHERE TABLE_SCHEMA = 'casedb' AND TABLE_NAME = 'tickets' AND INDEX_NAME = 'idx_status_update_time');
+SET @sql = IF(@idx_exists = 0,
+    'CREATE INDEX `idx_status_update_time` ON `tickets`(`status`, `update_time`)',
+    'SELECT "Index idx_status_update_time already exists" AS message');
+PREPARE stmt FROM @sql;
+EXECUTE stmt;
+DEALLOCATE PREPARE stmt;
+
+SELECT COUNT(*) AS archive_candidates FROM `tickets`
+WHERE `status` = 'closed' AND `update_time` < DATE_SUB(NOW(), INTERVAL 180 DAY);
+
+SELECT '补丁执行完成!' AS status;
@@ -0,0 +1,53 @@
+-- =====================================================
+-- 补丁: 工单 SLA 期限表
+-- 影响数据库: casedb
+-- 创建时间: 2026-10-19
+-- 版本范围: v2.2 -> v2.3
+-- 功能说明: 按优先级记录首次响应、解决期限和升级时间；next_due 为最近一个未达成、
+--           未升级的期限，应用内调度按 idx_next_due 加载即将到期的定时器，重启后自动恢复
+-- 说明: 已有工单按默认期限（TICKET_SLA_*_MINUTES 默认值）初始化；已超时的期限
+--       直接标记为已升级，避免上线时集中发送历史超时的升级通知
+-- =====================================================
+
+USE `casedb`;
+
+-- 工单 SLA 期限表
+CREATE TABLE IF NOT EXISTS `ticket_sla` (
+    `ticket_id` VARCHAR(32) NOT NULL PRIMARY KEY COMMENT '工单ID',
+    `priority` VARCHAR(10) NOT NULL COMMENT '计算期限时的优先级',
+    `response_due` DATETIME NOT NULL COMMENT '首次响应期限',
+    `resolution_due` DATETIME NOT NULL COMMENT '解决期限',
+    `responded_at` DATETIME NULL COMMENT '首次响应时间',
+    `resolved_at` DATETIME NULL COMMENT '解决时间（重新打开时清除）',
+    `response_escalated_at` DATETIME NULL COMMENT '首次响应超时升级时间',
+    `resolution_escalated_at` DATETIME NULL COMMENT '解决超时升级时间',
+    `next_due` DATETIME NULL COMMENT '最近一个未达成、未升级的期限',
+    INDEX idx_next_due (`next_due`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='工单 SLA 期限表';
+
+-- 按默认期限初始化已有工单
+INSERT IGNORE INTO `ticket_sla` (`ticket_id`, `priority`, `response_due`, `resolution_due`,
+                                 `responded_at`, `resolved_at`)
+SELECT `ticket_id`, `priority`,
+       `create_time` + INTERVAL (CASE `priority` WHEN 'urgent' THEN 60 WHEN 'high' THEN 240
+                                                 WHEN 'low' THEN 1440 ELSE 480 END) MINUTE,
+       `create_time` + INTERVAL (CASE `priority` WHEN 'urgent' THEN 480 WHEN 'high' THEN 1440
+                                                 WHEN 'low' THEN 10080 ELSE 4320 END) MINUTE,
+       IF(`status` <> 'pending', `update_time`, NULL),
+       IF(`status` IN ('completed', 'closed'), `update_time`, NULL)
+FROM `tickets`;
+
+-- 已超时的期限视为已升级
+UPDATE `ticket_sla` SET `response_escalated_at` = NOW()
+WHERE `responded_at` IS NULL AND `response_escalated_at` IS NULL AND `response_due` <= NOW();
+UPDATE `ticket_sla` SET `resolution_escalated_at` = NOW()
+WHERE `resolved_at` IS NULL AND `resolution_escalated_at` IS NULL AND `resolution_due` <= NOW();
+
+UPDATE `ticket_sla` SET `next_due` = NULLIF(LEAST(
+    IF(`responded_at` IS NULL AND `response_escalated_at` IS NULL, `response_due`, TIMESTAMP('9999-12-31')),
+    IF(`resolved_at` IS NULL AND `resolution_escalated_at` IS NULL, `resolution_due`, TIMESTAMP('9999-12-31'))
+), TIMESTAMP('9999-12-31'));
+
+SELECT COUNT(*) AS total, COUNT(`next_due`) AS pending_timers FROM `ticket_sla`;
+
+SELECT '补丁执行完成!' AS status;
@@ -0,0 +1,31 @@
+-- =====================================================
+-- 补丁: 邮件发件箱表
+-- 影响数据库: casedb
+-- 创建时间: 2026-10-19
+-- 版本范围: v2.2 -> v2.3
+-- 功能说明: 工单通知、SLA 升级、官网留言等邮件先写入 mail_outbox（与业务数据同一事务），
+--           由后台发送线程按 idx_status_next_attempt 取出发送，失败按指数退避重试；
+--           digest_key 相同的待发送通知合并为一封摘要邮件
+-- =====================================================
+
+USE `casedb`;
+
+-- 邮件发件箱表
+CREATE TABLE IF NOT EXISTS `mail_outbox` (
+    `id` BIGINT AUTO_INCREMENT PRIMARY KEY COMMENT '邮件ID',
+    `category` VARCHAR(32) NOT NULL DEFAULT 'general' COMMENT '类别: ticket/sla/contact/general',
+    `recipient` VARCHAR(255) NOT NULL COMMENT '收件人',
+    `subject` VARCHAR(255) NOT NULL COMMENT '主题',
+    `body` TEXT NOT NULL COMMENT '正文',
+    `digest_key` VARCHAR(255) NULL COMMENT '摘要合并键（为空时单独发送）',
+    `status` VARCHAR(16) NOT NULL DEFAULT 'pending' COMMENT '状态: pending/sent/failed',
+    `attempts` INT NOT NULL DEFAULT 0 COMMENT '已尝试次数',
+    `next_attempt_at` DATETIME NOT NULL COMMENT '下次发送时间',
+    `last_error` VARCHAR(500) NULL COMMENT '最近一次失败原因',
+    `created_at` DATETIME NOT NULL COMMENT '创建时间',
+    `sent_at` DATETIME NULL COMMENT '发送时间',
+    INDEX idx_status_next_attempt (`status`, `next_attempt_at`),
+    INDEX idx_digest_key (`digest_key`, `status`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='邮件发件箱表';
+
+SELECT '补丁执行完成!' AS status;
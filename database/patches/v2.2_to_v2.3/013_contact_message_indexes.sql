@@ -0,0 +1,39 @@
+-- =====================================================
+-- 补丁: 官网留言列表复合索引
+-- 影响数据库: clouddoors_db
+-- 创建时间: 2026-10-19
+-- 版本范围: v2.2 -> v2.3
+-- 功能说明: 留言管理页面按 (created_at, id) 键集分页 (ORDER BY created_at DESC, id DESC)，
+--           按状态筛选时使用 (status, created_at, id) 复合索引，不再需要 filesort；
+--           原 idx_status 为新索引的前缀，一并删除
+-- =====================================================
+
+USE `clouddoors_db`;
+
+-- =====================================================
+-- 1. 按状态筛选: WHERE status = ? ORDER BY created_at, id
+-- =====================================================
+SET @idx_exists = (SELECT COUNT(*) FROM INFORMATION_SCHEMA.STATISTICS
+     WHERE TABLE_SCHEMA = 'clouddoors_db' AND TABLE_NAME = 'messages' AND INDEX_NAME = 'idx_status_created_at');
+SET @sql = IF(@idx_exists = 0,
+    'CREATE INDEX `idx_status_created_at` ON `messages`(`status`, `created_at`, `id`)',
+    'SELECT "Index idx_status_created_at already exists" AS message');
+PREPARE stmt FROM @sql;
+EXECUTE stmt;
+DEALLOCATE PREPARE stmt;
+
+-- =====================================================
+-- 2. 删除被覆盖的 idx_status
+-- =====================================================
+SET @idx_exists = (SELECT COUNT(*) FROM INFORMATION_SCHEMA.STATISTICS
+     WHERE TABLE_SCHEMA = 'clouddoors_db' AND TABLE_NAME = 'messages' AND INDEX_NAME = 'idx_status');
+SET @sql = IF(@idx_exists > 0,
+    'DROP INDEX `idx_status` ON `messages`',
+    'SELECT "Index idx_status already dropped" AS message');
+PREPARE stmt FROM @sql;
+EXECUTE stmt;
+DEALLOCATE PREPARE stmt;
+
+SHOW INDEX FROM `messages`;
+
+SELECT '补丁执行完成!' AS status;
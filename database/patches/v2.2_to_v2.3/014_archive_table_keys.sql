@@ -0,0 +1,64 @@
+-- =====================================================
+-- 补丁: 归档表改用业务键作为主键
+-- 影响数据库: casedb
+-- 创建时间: 2026-10-19
+-- 版本范围: v2.2 -> v2.3
+-- 功能说明: tickets_archive / messages_archive 原以活跃表的自增 id 为主键。
+--           MySQL 5.7 及 MariaDB 10.2.4 之前重启后 AUTO_INCREMENT 按当前最大 id 重新计算，
+--           已归档的 id 可能被新记录重用，再次归档时主键冲突导致归档失败。
+--           改为 tickets_archive 以 ticket_id 为主键、messages_archive 以 (ticket_id, id) 为主键，
+--           id 仅保留为原值（不再要求全局唯一）
+-- =====================================================
+
+USE `casedb`;
+
+-- =====================================================
+-- 1. tickets_archive: 主键 id -> ticket_id
+-- =====================================================
+SET @pk_is_id = (SELECT COUNT(*) FROM INFORMATION_SCHEMA.STATISTICS
+     WHERE TABLE_SCHEMA = 'casedb' AND TABLE_NAME = 'tickets_archive'
+       AND INDEX_NAME = 'PRIMARY' AND COLUMN_NAME = 'id');
+SET @sql = IF(@pk_is_id > 0,
+    'ALTER TABLE `tickets_archive` DROP PRIMARY KEY, ADD PRIMARY KEY (`ticket_id`)',
+    'SELECT "tickets_archive primary key already on ticket_id" AS message');
+PREPARE stmt FROM @sql;
+EXECUTE stmt;
+DEALLOCATE PREPARE stmt;
+
+-- ticket_id 上原有的唯一索引与主键重复
+SET @idx_exists = (SELECT COUNT(*) FROM INFORMATION_SCHEMA.STATISTICS
+     WHERE TABLE_SCHEMA = 'casedb' AND TABLE_NAME = 'tickets_archive' AND INDEX_NAME = 'ticket_id');
+SET @sql = IF(@idx_exists > 0,
+    'DROP INDEX `ticket_id` ON `tickets_archive`',
+    'SELECT "Index ticket_id already dropped" AS message');
+PREPARE stmt FROM @sql;
+EXECUTE stmt;
+DEALLOCATE PREPARE stmt;
+
+-- =====================================================
+-- 2. messages_archive: 主键 id -> (ticket_id, id)
+-- =====================================================
+SET @pk_is_id = (SELECT COUNT(*) FROM INFORMATION_SCHEMA.STATISTICS
+     WHERE TABLE_SCHEMA = 'casedb' AND TABLE_NAME = 'messages_archive'
+       AND INDEX_NAME = 'PRIMARY' AND COLUMN_NAME = 'ticket_id');
+SET @sql = IF(@pk_is_id = 0,
+    'ALTER TABLE `messages_archive` DROP PRIMARY KEY, ADD PRIMARY KEY (`ticket_id`, `id`)',
+    'SELECT "messages_archive primary key already on (ticket_id, id)" AS message');
+PREPARE stmt FROM @sql;
+EXECUTE stmt;
+DEALLOCATE PREPARE stmt;
+
+-- idx_ticket_id (ticket_id, id) 与新主键相同
+SET @idx_exists = (SELECT COUNT(*) FROM INFORMATION_SCHEMA.STATISTICS
+     WHERE TABLE_SCHEMA = 'casedb' AND TABLE_NAME = 'messages_archive' AND INDEX_NAME = 'idx_ticket_id');
+SET @sql = IF(@idx_exists > 0,
+    'DROP INDEX `idx_ticket_id` ON `messages_archive`',
+    'SELECT "Index idx_ticket_id already dropped" AS message');
+PREPARE stmt FROM @sql;
+EXECUTE stmt;
+DEALLOCATE PREPARE stmt;
+
+SHOW INDEX FROM `tickets_archive`;
+SHOW INDEX FROM `messages_archive`;
+
+SELECT '补丁执行完成!' AS status;
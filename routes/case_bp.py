@@ -1,24 +1,46 @@
 """
 工单系统路由蓝图
 """
-from flask import Blueprint, request, render_template, session, jsonify
+from flask import Blueprint, request, render_template, session, jsonify, make_response
 from common.response import success_response, error_response, unauthorized_response, server_error_response
 from common.unified_auth import get_current_user, authenticate_user
 from common.validators import validate_email, validate_required, validate_phone
 from common.logger import logger, log_request, log_exception
 from common.database_context import db_connection
+from common.id_generator import generate_ticket_id, resync_generator, TICKET_ID_MAX_ATTEMPTS
+from services.ticket_service import TicketService, DEFAULT_PAGE_SIZE
+from services.message_service import MessageService
+from services.attachment_service import AttachmentService
+from services.preview_service import ImagePreviewService
+from services.stats_service import TicketStatsService
+from services.search_service import TicketSearchService, DEFAULT_SEARCH_LIMIT
+from services.archive_service import TicketArchiveService
+from services.sla_service import TicketSlaService
+from services.mail_service import MailService
+from services.presence_service import presence
 from datetime import datetime
 import pymysql
 
 case_bp = Blueprint('case', __name__, url_prefix='/case')
 
 
-def generate_ticket_id():
-    """生成唯一工单ID"""
-    now = datetime.now().strftime('%Y%m%d%H%M%S')
-    import uuid
-    random_str = str(uuid.uuid4())[:6].upper()
-    return f"TK-{now}-{random_str}"
+def _check_ticket_access(ticket_id):
+    """
+    检查当前会话能否访问工单（客户只能访问自己提交的工单）
+
+    Returns:
+        无权访问时返回错误响应，否则返回 None
+    """
+    from common.response import forbidden_response
+    from services.socketio_service import can_access_ticket
+
+    username = session.get('username')
+    user_role = session.get('role')
+    if not username or not user_role:
+        return unauthorized_response(message='未登录')
+    if not can_access_ticket(ticket_id, username, user_role):
+        return forbidden_response(message='无权访问此工单')
+    return None
 
 
 @case_bp.route('/')
@@ -281,26 +303,8 @@ def create_ticket():
         if 'files' in request.files:
             files = request.files.getlist('files')
             for file in files:
-                if file and file.filename:
-                    import os
-                    from werkzeug.utils import secure_filename
-
-                    allowed_extensions = {'txt', 'pdf', 'png', 'jpg', 'jpeg', 'gif', 'doc', 'docx', 'xls', 'xlsx', 'zip', 'rar'}
-
-                    def allowed_file(filename):
-                        return '.' in filename and filename.rsplit('.', 1)[1].lower() in allowed_extensions
-
-                    if allowed_file(file.filename):
-                        filename = secure_filename(file.filename)
-                        timestamp = datetime.now().strftime('%Y%m%d%H%M%S')
-                        saved_filename = f"{ticket_id}_{timestamp}_{filename}"
-
-                        upload_dir = os.path.join('static', 'uploads', 'case')
-                        os.makedirs(upload_dir, exist_ok=True)
-
-                        file_path = os.path.join(upload_dir, saved_filename)
-                        file.save(file_path)
-                        uploaded_files.append(saved_filename)
+                if file and file.filename and AttachmentService.allowed_file(file.filename):
+                    uploaded_files.append(AttachmentService.save_file(file))
 
         with db_connection('case') as conn:
             cursor = conn.cursor()
@@ -323,28 +327,55 @@ def create_ticket():
             logger.info(f"创建工单 - submit_user: {submit_user}, final_customer_name: {final_customer_name}, final_contact_name: {final_contact_name}")
             logger.info(f"创建工单参数 - ticket_id: {ticket_id}, customer_contact_phone: {data.get('customer_contact_phone')}, customer_email: {customer_email}")
 
-            cursor.execute(insert_sql, (
-                ticket_id, final_customer_name, final_contact_name,
-                data['customer_contact_phone'].strip(), customer_email, submit_user,
-                data['product'].strip(), data['issue_type'].strip(),
-                data['priority'].strip(), data['title'].strip(), data['content'].strip(),
-                'pending', now, now
-            ))
-
-            # 如果有附件，保存到数据库
-            if uploaded_files:
-                for filename in uploaded_files:
-                    file_url = f'/static/uploads/case/{filename}'
-                    insert_msg_sql = """
-                        INSERT INTO messages (ticket_id, sender, sender_name, content, send_time)
-                        VALUES (%s, %s, %s, %s, %s)
-                    """
-                    cursor.execute(insert_msg_sql, (
-                        ticket_id, 'system', '系统',
-                        f'附件上传: {filename}|url:{file_url}', now
+            for attempt in range(TICKET_ID_MAX_ATTEMPTS):
+                try:
+                    cursor.execute(insert_sql, (
+                        ticket_id, final_customer_name, final_contact_name,
+                        data['customer_contact_phone'].strip(), customer_email, submit_user,
+                        data['product'].strip(), data['issue_type'].strip(),
+                        data['priority'].strip(), data['title'].strip(), data['content'].strip(),
+                        'pending', now, now
                     ))
+                    break
+                except pymysql.err.IntegrityError as e:
+                    # 编号与已写入的工单重复（节点号与其他进程相同）：续接到该节点最新编号后重新生成，
+                    # 只回滚这一条语句，事务仍可继续
+                    if e.args[0] != 1062 or attempt == TICKET_ID_MAX_ATTEMPTS - 1:
+                        raise
+                    logger.warning(f"工单编号 {ticket_id} 已存在，重新生成")
+                    resync_generator()
+                    ticket_id = generate_ticket_id()
+            TicketStatsService.apply_change(cursor, None, {
+                'status': 'pending', 'priority': data['priority'].strip(),
+                'product': data['product'].strip(), 'assignee': None
+            }, now)
+            TicketSearchService.index_fields(cursor, ticket_id, {
+                'title': data['title'].strip(), 'content': data['content'].strip()
+            })
+            TicketSlaService.start(cursor, ticket_id, data['priority'].strip(), now)
+            MailService.notify_ticket_created(cursor, ticket_id, data['title'].strip(), customer_email)
+
+            # 如果有附件，登记元数据并在聊天记录中提示
+            attachment_ids = []
+            for info in uploaded_files:
+                attachment_id = AttachmentService.add_attachment(cursor, ticket_id, info, submit_user, now)
+                attachment_ids.append((attachment_id, info['mime_type']))
+                file_url = AttachmentService.download_url(attachment_id)
+                MessageService.add_message(cursor, ticket_id, 'system', '系统',
+                                           f"附件上传: {info['filename']}|url:{file_url}", now)
 
             conn.commit()
+
+        # 图片附件在后台生成缩略图
+        for attachment_id, mime_type in attachment_ids:
+            ImagePreviewService.schedule(attachment_id, mime_type)
+
+        # 通知处理人员刷新工单列表
+        try:
+            from services.socketio_service import emit_ticket_update
+            emit_ticket_update(ticket_id, submit_user=submit_user, assignee='')
+        except ImportError:
+            pass
         
         logger.info(f"工单创建成功: {ticket_id}")
         return success_response(data={'ticket_id': ticket_id}, message='工单创建成功')
@@ -390,7 +421,58 @@ def debug_tickets():
 
 @case_bp.route('/api/tickets', methods=['GET'])
 def get_tickets():
-    """获取工单列表"""
+    """获取工单列表
+
+    按创建时间倒序返回工单，使用游标分页
+    ---
+    tags:
+      - 工单-操作
+    parameters:
+      - name: status
+        in: query
+        type: string
+        description: 工单状态，多个用逗号分隔（pending, processing, completed, closed）
+      - name: priority
+        in: query
+        type: string
+        description: 优先级，多个用逗号分隔（low, medium, high, urgent）
+      - name: assignee
+        in: query
+        type: string
+        description: 处理人用户名（仅 admin/user）
+      - name: my_only
+        in: query
+        type: boolean
+        description: 只看分配给自己的工单（仅 admin/user）
+      - name: product
+        in: query
+        type: string
+        description: 涉及产品
+      - name: date_from
+        in: query
+        type: string
+        description: 创建时间起（YYYY-MM-DD）
+      - name: date_to
+        in: query
+        type: string
+        description: 创建时间止（YYYY-MM-DD，包含当天）
+      - name: cursor
+        in: query
+        type: string
+        description: 上一页返回的 next_cursor
+      - name: limit
+        in: query
+        type: integer
+        default: 20
+        description: 每页数量（最大 100）
+    responses:
+      200:
+        description: 查询成功，data 包含 tickets、next_cursor、has_more
+      400:
+        description: 参数错误
+      401:
+        description: 未登录
+    """
     try:
         log_request(logger, request)
         user_role = session.get('role')
@@ -403,69 +485,19 @@ def get_tickets():
         if not user_role:
             return unauthorized_response(message='未登录')
 
-        status = request.args.get('status', '').strip()
-        my_only = request.args.get('my_only', 'false').lower() == 'true'
+        if user_role not in ['customer', 'admin', 'user']:
+            logger.warning(f"未知角色: {user_role}")
+            return success_response(data={'tickets': [], 'next_cursor': None, 'has_more': False,
+                                          'limit': DEFAULT_PAGE_SIZE}, message='查询成功')
 
-        with db_connection('case') as conn:
-            cursor = conn.cursor(pymysql.cursors.DictCursor)
+        try:
+            filters = TicketService.parse_list_filters(request.args, user_role, user_username)
+            limit = request.args.get('limit', DEFAULT_PAGE_SIZE, type=int)
+            result = TicketService.list_tickets(filters, request.args.get('cursor', '').strip() or None, limit)
+        except ValueError as e:
+            return error_response(message=str(e))
 
-            # customer 角色: 只能看到自己创建的工单（通过 submit_user 判断）
-            if user_role == 'customer':
-                if status:
-                    select_sql = """
-                        SELECT ticket_id, customer_name, customer_contact_name, customer_contact, customer_email,
-                               product, issue_type, priority, title, status, create_time
-                        FROM tickets WHERE submit_user = %s AND status = %s ORDER BY create_time DESC
-                    """
-                    params = (user_username, status)
-                    logger.info(f"SQL: {select_sql}, params: {params}")
-                    cursor.execute(select_sql, params)
-                else:
-                    select_sql = """
-                        SELECT ticket_id, customer_name, customer_contact_name, customer_contact, customer_email,
-                               product, issue_type, priority, title, status, create_time
-                        FROM tickets WHERE submit_user = %s ORDER BY create_time DESC
-                    """
-                    params = (user_username,)
-                    logger.info(f"SQL: {select_sql}, params: {params}")
-                    cursor.execute(select_sql, params)
-            # admin/user 角色: 可以查看所有工单，支持 my_only 筛选
-            elif user_role in ['admin', 'user']:
-                if status and my_only:
-                    select_sql = """
-                        SELECT ticket_id, customer_name, customer_contact_name, customer_contact, customer_email,
-                               product, issue_type, priority, title, status, create_time
-                        FROM tickets WHERE status = %s ORDER BY create_time DESC LIMIT 100
-                    """
-                    cursor.execute(select_sql, (status,))
-                elif status:
-                    select_sql = """
-                        SELECT ticket_id, customer_name, customer_contact_name, customer_contact, customer_email,
-                               product, issue_type, priority, title, status, create_time
-                        FROM tickets WHERE status = %s ORDER BY create_time DESC LIMIT 100
-                    """
-                    cursor.execute(select_sql, (status,))
-                else:
-                    select_sql = """
-                        SELECT ticket_id, customer_name, customer_contact_name, customer_contact, customer_email,
-                               product, issue_type, priority, title, status, create_time
-                        FROM tickets ORDER BY create_time DESC LIMIT 100
-                    """
-                    cursor.execute(select_sql)
-            else:
-                tickets = []
-                logger.warning(f"未知角色: {user_role}")
-                return success_response(data=tickets, message='查询成功')
-
-            tickets = cursor.fetchall()
-            logger.info(f"查询到工单数量: {len(tickets)}")
-            if tickets:
-                logger.info(f"第一个工单: {tickets[0]}")
-
-        for ticket in tickets:
-            ticket['create_time'] = ticket['create_time'].strftime('%Y-%m-%d %H:%M:%S')
-
-        return success_response(data=tickets, message='查询成功')
+        return success_response(data=result, message='查询成功')
     except Exception as e:
         log_exception(logger, "查询工单列表失败")
         import traceback
@@ -473,6 +505,98 @@ def get_tickets():
         return server_error_response(message=f'查询失败：{str(e)}')
 
 
+@case_bp.route('/api/tickets/search', methods=['GET'])
+def search_tickets():
+    """检索工单
+
+    按关键词检索工单标题、正文、解决方案和聊天消息，结果按相关度排序并附带摘要。
+    中文按二元组匹配，多个关键词之间为"且"；客户只能检索自己提交的工单
+    ---
+    tags:
+      - 工单-操作
+    parameters:
+      - name: q
+        in: query
+        type: string
+        required: true
+        description: 搜索关键词
+      - name: limit
+        in: query
+        type: integer
+        default: 20
+        description: 每页数量（最大 50）
+      - name: offset
+        in: query
+        type: integer
+        default: 0
+        description: 偏移量（最大 500）
+    responses:
+      200:
+        description: 查询成功，data 包含 tickets（含 score、matched_in、snippet、highlights）、has_more
+      400:
+        description: 参数错误
+      401:
+        description: 未登录
+    """
+    try:
+        log_request(logger, request)
+        user_role = session.get('role')
+        if not user_role:
+            return unauthorized_response(message='未登录')
+
+        limit = request.args.get('limit', DEFAULT_SEARCH_LIMIT, type=int)
+        offset = request.args.get('offset', 0, type=int)
+        try:
+            result = TicketSearchService.search(request.args.get('q', ''), session.get('username'),
+                                                user_role, limit, offset)
+        except ValueError as e:
+            return error_response(message=str(e))
+
+        return success_response(data=result, message='查询成功')
+    except Exception as e:
+        log_exception(logger, "检索工单失败")
+        return server_error_response(message=f'查询失败：{str(e)}')
+
+
+@case_bp.route('/api/stats', methods=['GET'])
+def get_ticket_stats():
+    """工单看板统计
+
+    按状态、优先级、处理人、产品统计工单数，并返回每日新建/关闭趋势。
+    数据来自随工单修改同步更新的计数表，不扫描工单表
+    ---
+    tags:
+      - 工单-操作
+    parameters:
+      - name: days
+        in: query
+        type: integer
+        default: 30
+        description: 每日趋势天数（含今天，最大 366）
+    responses:
+      200:
+        description: 查询成功，data 包含 total、by_status、by_priority、by_assignee、by_product、trend
+      400:
+        description: 参数错误
+      403:
+        description: 无权访问
+    """
+    try:
+        user_role = session.get('role')
+        if user_role != 'admin':
+            from common.response import forbidden_response
+            return forbidden_response(message='无权执行此操作')
+
+        days = request.args.get('days', 30, type=int)
+        if days is None or days < 1:
+            return error_response(message='days 参数不合法')
+
+        return success_response(data=TicketStatsService.get_stats(days), message='查询成功')
+    except Exception as e:
+        log_exception(logger, "查询工单统计失败")
+        return server_error_response(message=f'查询失败：{str(e)}')
+
+
 @case_bp.route('/api/ticket/<ticket_id>', methods=['GET'])
 def get_ticket_detail(ticket_id):
     """获取工单详情"""
@@ -484,11 +608,8 @@ def get_ticket_detail(ticket_id):
         if not user_role:
             return unauthorized_response(message='未登录')
         
-        with db_connection('case') as conn:
-            cursor = conn.cursor(pymysql.cursors.DictCursor)
-            select_sql = "SELECT * FROM tickets WHERE ticket_id = %s"
-            cursor.execute(select_sql, (ticket_id,))
-            ticket = cursor.fetchone()
+        # 活跃表中没有时读取归档表
+        ticket = TicketArchiveService.get_ticket(ticket_id)
         
         if not ticket:
             from common.response import not_found_response
@@ -501,6 +622,9 @@ def get_ticket_detail(ticket_id):
         
         ticket['create_time'] = ticket['create_time'].strftime('%Y-%m-%d %H:%M:%S')
         ticket['update_time'] = ticket['update_time'].strftime('%Y-%m-%d %H:%M:%S')
+        if ticket.get('archived_at'):
+            ticket['archived_at'] = ticket['archived_at'].strftime('%Y-%m-%d %H:%M:%S')
+        ticket['sla'] = TicketSlaService.get(ticket_id)
         ticket['current_user_role'] = user_role
         
         return success_response(data=ticket, message='查询成功')
@@ -529,20 +653,24 @@ def update_ticket_status(ticket_id):
         with db_connection('case') as conn:
             cursor = conn.cursor()
             
-            cursor.execute("SELECT id FROM tickets WHERE ticket_id = %s", (ticket_id,))
-            if not cursor.fetchone():
+            ticket = TicketStatsService.lock_ticket(cursor, ticket_id)
+            if not ticket:
                 from common.response import not_found_response
                 return not_found_response(message='工单不存在')
             
             now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
             update_sql = "UPDATE tickets SET status = %s, update_time = %s WHERE ticket_id = %s"
             cursor.execute(update_sql, (new_status, now, ticket_id))
+            TicketStatsService.apply_change(cursor, ticket, dict(ticket, status=new_status), now)
+            TicketSlaService.on_status_change(cursor, ticket_id, new_status, now)
+            if ticket['status'] != new_status:
+                MailService.notify_status_changed(cursor, [ticket_id], new_status)
             conn.commit()
 
         # 发送 WebSocket 更新通知
         try:
             from services.socketio_service import emit_ticket_update
-            emit_ticket_update(ticket_id)
+            emit_ticket_update(ticket_id, submit_user=ticket['submit_user'], assignee=ticket['assignee'])
         except ImportError:
             pass
 
@@ -555,28 +683,225 @@ def update_ticket_status(ticket_id):
 
 @case_bp.route('/api/ticket/<ticket_id>/messages', methods=['GET'])
 def get_messages(ticket_id):
-    """获取工单消息"""
+    """获取工单消息
+
+    键集分页：默认返回最新的 limit 条，before_id 向上翻页，after_id 增量同步。
+    支持 If-None-Match，消息未变化时返回 304
+    ---
+    tags:
+      - 工单系统
+    parameters:
+      - name: ticket_id
+        in: path
+        type: string
+        required: true
+      - name: after_id
+        in: query
+        type: integer
+        description: 只返回 id 大于该值的消息
+      - name: before_id
+        in: query
+        type: integer
+        description: 只返回 id 小于该值的消息
+      - name: limit
+        in: query
+        type: integer
+        default: 50
+        description: 返回数量（最大 200）
+    responses:
+      200:
+        description: 查询成功，data 包含 messages（按 id 升序）、has_more、first_id、last_id、message_count
+      304:
+        description: 消息未变化
+      400:
+        description: 参数错误
+      401:
+        description: 未登录
+      403:
+        description: 无权访问此工单
+    """
     try:
         log_request(logger, request)
 
-        with db_connection('case') as conn:
-            cursor = conn.cursor(pymysql.cursors.DictCursor)
-            select_sql = """
-                SELECT id, ticket_id, sender, sender_name, content, send_time
-                FROM messages WHERE ticket_id = %s ORDER BY send_time ASC
-            """
-            cursor.execute(select_sql, (ticket_id,))
-            messages = cursor.fetchall()
-        
-        for msg in messages:
-            msg['send_time'] = msg['send_time'].strftime('%Y-%m-%d %H:%M:%S')
-        
-        return success_response(data=messages, message='查询成功')
+        denied = _check_ticket_access(ticket_id)
+        if denied:
+            return denied
+
+        try:
+            page = MessageService.parse_page_args(request.args)
+        except ValueError as e:
+            return error_response(str(e), 400)
+
+        summary = MessageService.get_summary(ticket_id)
+        etag = MessageService.summary_etag(summary, page)
+        if request.if_none_match.contains(etag):
+            response = make_response('', 304)
+            response.set_etag(etag)
+            return response
+
+        result = MessageService.list_messages(ticket_id, archived=summary['archived'], **page)
+        result['message_count'] = summary['message_count']
+
+        response, code = success_response(data=result, message='查询成功')
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response, code
     except Exception as e:
         log_exception(logger, "查询工单消息失败")
         return server_error_response(message=f'查询失败：{str(e)}')
 
 
+@case_bp.route('/api/ticket/<ticket_id>/messages/summary', methods=['GET'])
+def get_messages_summary(ticket_id):
+    """获取工单消息摘要（消息数与最新消息 id）
+    ---
+    tags:
+      - 工单系统
+    parameters:
+      - name: ticket_id
+        in: path
+        type: string
+        required: true
+    responses:
+      200:
+        description: 查询成功，data 包含 message_count、last_id、archived（工单已归档）
+      401:
+        description: 未登录
+      403:
+        description: 无权访问此工单
+    """
+    try:
+        log_request(logger, request)
+
+        denied = _check_ticket_access(ticket_id)
+        if denied:
+            return denied
+        return success_response(data=MessageService.get_summary(ticket_id), message='查询成功')
+    except Exception as e:
+        log_exception(logger, "查询工单消息摘要失败")
+        return server_error_response(message=f'查询失败：{str(e)}')
+
+
+@case_bp.route('/api/ticket/<ticket_id>/read', methods=['POST'])
+def mark_ticket_read(ticket_id):
+    """标记工单消息已读
+    ---
+    tags:
+      - 工单系统
+    parameters:
+      - name: ticket_id
+        in: path
+        type: string
+        required: true
+      - name: body
+        in: body
+        schema:
+          type: object
+          properties:
+            message_id:
+              type: integer
+              description: 已读到的消息 id，不传则全部标记为已读
+    responses:
+      200:
+        description: 标记成功，data 包含 last_read_message_id、unread_count
+      401:
+        description: 未登录
+      403:
+        description: 无权访问此工单
+    """
+    try:
+        log_request(logger, request)
+
+        denied = _check_ticket_access(ticket_id)
+        if denied:
+            return denied
+        username = session.get('username')
+
+        data = request.get_json(silent=True) or {}
+        try:
+            message_id = MessageService.parse_id(data.get('message_id'), 'message_id')
+        except ValueError as e:
+            return error_response(str(e), 400)
+
+        result = MessageService.mark_read(username, ticket_id, message_id)
+        return success_response(data=result, message='已标记为已读')
+    except Exception as e:
+        log_exception(logger, "标记工单已读失败")
+        return server_error_response(message=f'标记失败：{str(e)}')
+
+
+@case_bp.route('/api/tickets/unread', methods=['GET'])
+def get_unread_counts():
+    """获取工单未读消息数
+    ---
+    tags:
+      - 工单系统
+    parameters:
+      - name: ticket_ids
+        in: query
+        type: string
+        description: 逗号分隔的工单ID（最多 200 个）；不传则返回所有有未读消息的工单
+    responses:
+      200:
+        description: 查询成功，data 包含 tickets（ticket_id -> unread_count）、total_unread
+      401:
+        description: 未登录
+    """
+    try:
+        log_request(logger, request)
+
+        username = session.get('username')
+        user_role = session.get('role')
+        if not username or not user_role:
+            return unauthorized_response(message='未登录')
+
+        ticket_ids = [t.strip() for t in request.args.get('ticket_ids', '').split(',') if t.strip()]
+        result = MessageService.get_unread_counts(username, user_role, ticket_ids)
+        return success_response(data=result, message='查询成功')
+    except Exception as e:
+        log_exception(logger, "查询未读消息数失败")
+        return server_error_response(message=f'查询失败：{str(e)}')
+
+
+@case_bp.route('/api/ticket/<ticket_id>/viewers', methods=['GET'])
+def get_ticket_viewers(ticket_id):
+    """获取正在查看工单的用户
+    ---
+    tags:
+      - 工单系统
+    parameters:
+      - name: ticket_id
+        in: path
+        type: string
+        required: true
+    responses:
+      200:
+        description: 查询成功，data 包含 viewers（username、display_name、role、connections）
+      401:
+        description: 未登录
+      403:
+        description: 无权访问此工单
+    """
+    try:
+        log_request(logger, request)
+
+        username = session.get('username')
+        user_role = session.get('role')
+        if not username or not user_role:
+            return unauthorized_response(message='未登录')
+
+        from services.socketio_service import STAFF_ROLES, ticket_room, can_access_ticket
+        if user_role not in STAFF_ROLES and not can_access_ticket(ticket_id, username, user_role):
+            from common.response import forbidden_response
+            return forbidden_response(message='无权访问此工单')
+
+        viewers = presence.viewers(ticket_room(ticket_id))
+        return success_response(data={'ticket_id': ticket_id, 'viewers': viewers}, message='查询成功')
+    except Exception as e:
+        log_exception(logger, "查询工单查看者失败")
+        return server_error_response(message=f'查询失败：{str(e)}')
+
+
 @case_bp.route('/submit', methods=['GET'])
 def submit_ticket_page():
     """工单提交页面"""
@@ -610,6 +935,10 @@ def send_message(ticket_id):
         user_id = session.get('user_id')
         if not user_id:
             return unauthorized_response(message='未登录')
+
+        denied = _check_ticket_access(ticket_id)
+        if denied:
+            return denied
         
         data = request.get_json()
         content = data.get('content', '').strip()
@@ -620,19 +949,22 @@ def send_message(ticket_id):
         sender = session.get('role')
         sender_name = session.get('real_name') or session.get('username', '匿名用户')
         
-        now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        
-        with db_connection('case') as conn:
-            cursor = conn.cursor()
-            insert_sql = """
-                INSERT INTO messages (ticket_id, sender, sender_name, content, send_time)
-                VALUES (%s, %s, %s, %s, %s)
-            """
-            cursor.execute(insert_sql, (ticket_id, sender, sender_name, content, now))
-            conn.commit()
+        try:
+            message = MessageService.insert_message(ticket_id, sender, sender_name, content,
+                                                    username=session.get('username'))
+        except ValueError as e:
+            return error_response(message=str(e))
+
+        # 推送给工单房间内的其他客户端（批量写入模式下由写入线程提交后推送）
+        if message['id'] is not None:
+            try:
+                from services.socketio_service import emit_new_message
+                emit_new_message(message)
+            except ImportError:
+                pass
         
         logger.info(f"工单 {ticket_id} 新消息: {sender_name}")
-        return success_response(message='消息发送成功')
+        return success_response(data=message, message='消息发送成功')
     except Exception as e:
         log_exception(logger, "发送消息失败")
         return server_error_response(message=f'发送失败：{str(e)}')
@@ -655,29 +987,35 @@ def upload_attachment(ticket_id):
         if file.filename == '':
             return error_response(message='未选择文件')
         
-        import os
-        from werkzeug.utils import secure_filename
-        
         allowed_extensions = {'txt', 'pdf', 'png', 'jpg', 'jpeg', 'gif', 'doc', 'docx', 'xls', 'xlsx'}
-        
-        def allowed_file(filename):
-            return '.' in filename and filename.rsplit('.', 1)[1].lower() in allowed_extensions
-        
-        if not allowed_file(file.filename):
+        if not AttachmentService.allowed_file(file.filename, allowed_extensions):
             return error_response(message='不支持的文件类型')
-        
-        filename = secure_filename(file.filename)
-        timestamp = datetime.now().strftime('%Y%m%d%H%M%S')
-        saved_filename = f"{timestamp}_{filename}"
-        
-        upload_dir = os.path.join('static', 'uploads', 'case')
-        os.makedirs(upload_dir, exist_ok=True)
-        
-        file_path = os.path.join(upload_dir, saved_filename)
-        file.save(file_path)
-        
-        logger.info(f"工单 {ticket_id} 附件上传: {saved_filename}")
-        return success_response(data={'filename': saved_filename}, message='附件上传成功')
+
+        with db_connection('case') as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT 1 FROM tickets WHERE ticket_id = %s", (ticket_id,))
+            if not cursor.fetchone():
+                from common.response import not_found_response
+                return not_found_response(message='工单不存在')
+        denied = _check_ticket_access(ticket_id)
+        if denied:
+            return denied
+
+        with db_connection('case') as conn:
+            cursor = conn.cursor()
+            info = AttachmentService.save_file(file)
+            attachment_id = AttachmentService.add_attachment(cursor, ticket_id, info, session.get('username'))
+            conn.commit()
+        ImagePreviewService.schedule(attachment_id, info['mime_type'])
+
+        logger.info(f"工单 {ticket_id} 附件上传: {info['filename']} ({info['stored_path']}"
+                    f"{'，内容重复已去重' if info['deduplicated'] else ''})")
+        return success_response(data={
+            'id': attachment_id,
+            'filename': info['filename'],
+            'url': AttachmentService.download_url(attachment_id),
+            'size': info['file_size']
+        }, message='附件上传成功')
     except Exception as e:
         log_exception(logger, "附件上传失败")
         return server_error_response(message=f'上传失败：{str(e)}')
@@ -685,32 +1023,384 @@ def upload_attachment(ticket_id):
 
 @case_bp.route('/api/ticket/<ticket_id>/attachments', methods=['GET'])
 def get_attachments(ticket_id):
-    """获取附件列表"""
+    """获取附件列表
+
+    从附件元数据表按工单索引查询，按上传顺序返回
+    """
     try:
-        import os
-        
-        upload_dir = os.path.join('static', 'uploads', 'case')
-        
-        if not os.path.exists(upload_dir):
-            return success_response(data=[], message='查询成功')
-        
-        files = []
-        for filename in os.listdir(upload_dir):
-            if filename.startswith(f"{ticket_id}_"):
-                file_path = os.path.join(upload_dir, filename)
-                if os.path.isfile(file_path):
-                    files.append({
-                        'filename': filename,
-                        'url': f'/static/uploads/case/{filename}',
-                        'size': os.path.getsize(file_path)
-                    })
-        
+        denied = _check_ticket_access(ticket_id)
+        if denied:
+            return denied
+
+        files = AttachmentService.list_attachments(ticket_id)
         return success_response(data=files, message='查询成功')
     except Exception as e:
         log_exception(logger, "获取附件列表失败")
         return server_error_response(message=f'查询失败：{str(e)}')
 
 
+def _upload_error_response(e):
+    """分片上传异常转换为响应"""
+    from common.response import forbidden_response, not_found_response
+    if isinstance(e, LookupError):
+        return not_found_response(message=str(e))
+    if isinstance(e, PermissionError):
+        return forbidden_response(message=str(e))
+    return error_response(message=str(e))
+
+
+def _notify_upload_progress(username, progress):
+    try:
+        from services.socketio_service import emit_upload_progress
+        emit_upload_progress(username, progress)
+    except Exception as e:
+        logger.warning(f"推送上传进度失败：{e}")
+
+
+@case_bp.route('/api/ticket/<ticket_id>/uploads', methods=['POST'])
+def init_chunked_upload(ticket_id):
+    """创建分片上传
+
+    大文件按分片上传，支持断点续传；上传进度通过 SocketIO upload_progress 事件推送到上传人的连接
+    ---
+    tags:
+      - 工单系统
+    parameters:
+      - name: ticket_id
+        in: path
+        type: string
+        required: true
+      - name: body
+        in: body
+        required: true
+        schema:
+          type: object
+          required: [filename, size]
+          properties:
+            filename:
+              type: string
+            size:
+              type: integer
+              description: 文件大小（字节）
+            sha256:
+              type: string
+              description: 文件 SHA-256（可选，合并时校验）
+            mime_type:
+              type: string
+    responses:
+      200:
+        description: 创建成功，data 包含 upload_id、chunk_size、total_chunks
+      400:
+        description: 参数不合法
+      403:
+        description: 无权访问此工单
+      404:
+        description: 工单不存在
+    """
+    from common.response import forbidden_response, not_found_response
+    from services.socketio_service import can_access_ticket
+    from services.upload_service import ChunkedUploadService
+
+    try:
+        log_request(logger, request)
+
+        username = session.get('username')
+        user_role = session.get('role')
+        if not username or not user_role:
+            return unauthorized_response(message='未登录')
+
+        with db_connection('case') as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT 1 FROM tickets WHERE ticket_id = %s", (ticket_id,))
+            if not cursor.fetchone():
+                return not_found_response(message='工单不存在')
+        if not can_access_ticket(ticket_id, username, user_role):
+            return forbidden_response(message='无权访问此工单')
+
+        data = request.get_json() or {}
+        try:
+            status = ChunkedUploadService.init_upload(ticket_id, data.get('filename'), data.get('size'), username,
+                                                      sha256=data.get('sha256'), mime_type=data.get('mime_type'))
+        except ValueError as e:
+            return error_response(message=str(e))
+        return success_response(data=status, message='上传会话已创建')
+    except Exception as e:
+        log_exception(logger, "创建分片上传失败")
+        return server_error_response(message=f'创建上传失败：{str(e)}')
+
+
+@case_bp.route('/api/uploads/<upload_id>', methods=['GET'])
+def get_chunked_upload(upload_id):
+    """查询分片上传状态
+
+    断线重连后查询已收到的分片，只补传缺失的分片
+    ---
+    tags:
+      - 工单系统
+    parameters:
+      - name: upload_id
+        in: path
+        type: string
+        required: true
+    responses:
+      200:
+        description: 查询成功，data.received_chunks 为已收到的分片序号
+      404:
+        description: 上传会话不存在
+    """
+    from services.upload_service import ChunkedUploadService
+
+    username = session.get('username')
+    if not username:
+        return unauthorized_response(message='未登录')
+    try:
+        return success_response(data=ChunkedUploadService.get_status(upload_id, username), message='查询成功')
+    except (LookupError, PermissionError) as e:
+        return _upload_error_response(e)
+    except Exception as e:
+        log_exception(logger, "查询分片上传失败")
+        return server_error_response(message=f'查询失败：{str(e)}')
+
+
+@case_bp.route('/api/uploads/<upload_id>/chunks/<int:index>', methods=['PUT'])
+def upload_chunk(upload_id, index):
+    """上传分片
+
+    请求体为分片原始字节（application/octet-stream），直接流式写入磁盘；同一分片可重复上传
+    ---
+    tags:
+      - 工单系统
+    consumes:
+      - application/octet-stream
+    parameters:
+      - name: upload_id
+        in: path
+        type: string
+        required: true
+      - name: index
+        in: path
+        type: integer
+        required: true
+        description: 分片序号（从 0 开始）
+      - name: X-Chunk-Sha256
+        in: header
+        type: string
+        required: false
+        description: 分片 SHA-256（可选）
+    responses:
+      200:
+        description: 分片已保存，data 为上传进度
+      400:
+        description: 分片大小或校验和不正确
+      404:
+        description: 上传会话不存在
+    """
+    from services.upload_service import ChunkedUploadService
+
+    username = session.get('username')
+    if not username:
+        return unauthorized_response(message='未登录')
+    try:
+        status = ChunkedUploadService.write_chunk(upload_id, index, request.stream, username,
+                                                  checksum=request.headers.get('X-Chunk-Sha256'))
+    except (LookupError, PermissionError, ValueError) as e:
+        return _upload_error_response(e)
+    except Exception as e:
+        log_exception(logger, "上传分片失败")
+        return server_error_response(message=f'上传失败：{str(e)}')
+
+    _notify_upload_progress(username, dict(status, status='uploading'))
+    return success_response(data=status, message='分片已保存')
+
+
+@case_bp.route('/api/uploads/<upload_id>/complete', methods=['POST'])
+def complete_chunked_upload(upload_id):
+    """完成分片上传
+
+    按序合并分片写入附件存储，校验大小和 SHA-256 后登记附件并在聊天中发送附件消息
+    ---
+    tags:
+      - 工单系统
+    parameters:
+      - name: upload_id
+        in: path
+        type: string
+        required: true
+    responses:
+      200:
+        description: 上传完成，data 为附件信息
+      400:
+        description: 分片不完整或校验失败
+      404:
+        description: 上传会话不存在
+    """
+    from services.upload_service import ChunkedUploadService
+
+    username = session.get('username')
+    if not username:
+        return unauthorized_response(message='未登录')
+    try:
+        result = ChunkedUploadService.complete(upload_id, username)
+    except (LookupError, PermissionError, ValueError) as e:
+        if isinstance(e, ValueError):
+            _notify_upload_progress(username, {'upload_id': upload_id, 'status': 'failed', 'message': str(e)})
+        return _upload_error_response(e)
+    except Exception as e:
+        log_exception(logger, "合并分片失败")
+        return server_error_response(message=f'上传失败：{str(e)}')
+
+    try:
+        ticket_id = result['ticket_id']
+        info = result['info']
+        with db_connection('case') as conn:
+            cursor = conn.cursor()
+            attachment_id = AttachmentService.add_attachment(cursor, ticket_id, info, username)
+            conn.commit()
+        ImagePreviewService.schedule(attachment_id, info['mime_type'])
+
+        file_url = AttachmentService.download_url(attachment_id)
+        message = MessageService.insert_message(ticket_id, 'system', '系统',
+                                                f"附件上传: {info['filename']}|url:{file_url}", username=username)
+        if message['id'] is not None:
+            try:
+                from services.socketio_service import emit_new_message
+                emit_new_message(message)
+            except ImportError:
+                pass
+
+        attachment = {
+            'id': attachment_id,
+            'ticket_id': ticket_id,
+            'filename': info['filename'],
+            'url': file_url,
+            'size': info['file_size'],
+            'sha256': info['sha256']
+        }
+        _notify_upload_progress(username, {'upload_id': upload_id, 'ticket_id': ticket_id,
+                                           'filename': info['filename'], 'status': 'completed',
+                                           'percent': 100.0, 'attachment': attachment})
+        logger.info(f"工单 {ticket_id} 附件上传: {info['filename']}（分片上传 {upload_id}）")
+        return success_response(data=attachment, message='附件上传成功')
+    except Exception as e:
+        log_exception(logger, "登记分片上传附件失败")
+        return server_error_response(message=f'上传失败：{str(e)}')
+
+
+@case_bp.route('/api/uploads/<upload_id>', methods=['DELETE'])
+def abort_chunked_upload(upload_id):
+    """取消分片上传
+    ---
+    tags:
+      - 工单系统
+    parameters:
+      - name: upload_id
+        in: path
+        type: string
+        required: true
+    responses:
+      200:
+        description: 已取消
+      404:
+        description: 上传会话不存在
+    """
+    from services.upload_service import ChunkedUploadService
+
+    username = session.get('username')
+    if not username:
+        return unauthorized_response(message='未登录')
+    try:
+        ChunkedUploadService.abort(upload_id, username)
+    except (LookupError, PermissionError) as e:
+        return _upload_error_response(e)
+    return success_response(message='上传已取消')
+
+
+@case_bp.route('/api/attachment/<int:attachment_id>/download', methods=['GET'])
+def download_attachment(attachment_id):
+    """下载附件
+
+    校验工单访问权限后发送附件：本地存储通过 send_file 发送，支持 Range 断点续传和条件请求；
+    对象存储重定向到预签名 URL。图片附件可通过 variant 获取 WebP 缩略图/预览
+    ---
+    tags:
+      - 工单系统
+    parameters:
+      - name: attachment_id
+        in: path
+        type: integer
+        required: true
+        description: 附件ID
+      - name: variant
+        in: query
+        type: string
+        required: false
+        description: 预览尺寸 sm / md / lg / webp（见附件列表 previews）
+    responses:
+      200:
+        description: 附件内容
+      206:
+        description: 部分内容（Range 请求）
+      302:
+        description: 重定向到对象存储预签名 URL
+      401:
+        description: 未登录
+      403:
+        description: 无权访问此工单
+      404:
+        description: 附件不存在
+    """
+    from flask import send_file, redirect
+    from common.response import forbidden_response, not_found_response
+    from common.file_storage import get_storage
+    from services.socketio_service import can_access_ticket
+
+    try:
+        username = session.get('username')
+        user_role = session.get('role')
+        if not username or not user_role:
+            return unauthorized_response(message='未登录')
+
+        attachment = AttachmentService.get_attachment(attachment_id)
+        if not attachment:
+            return not_found_response(message='附件不存在')
+        if not can_access_ticket(attachment['ticket_id'], username, user_role):
+            return forbidden_response(message='无权访问此工单')
+
+        key = attachment['stored_path']
+        filename = attachment['filename']
+        mime_type = attachment['mime_type'] or 'application/octet-stream'
+        etag = attachment['sha256'] or True
+        variant_name = request.args.get('variant')
+        if variant_name:
+            variant = AttachmentService.variants(attachment).get(variant_name)
+            if not variant:
+                return not_found_response(message='预览不存在')
+            key = variant['key']
+            filename = f"{filename.rsplit('.', 1)[0]}-{variant_name}.webp"
+            mime_type = 'image/webp'
+            etag = f"{attachment['sha256']}-{variant_name}" if attachment['sha256'] else True
+
+        # 图片在页面内预览，其他类型作为附件下载
+        as_attachment = not mime_type.startswith('image/')
+
+        path = AttachmentService.local_path(attachment, key)
+        if path is None:
+            storage = get_storage(attachment['storage'])
+            return redirect(storage.presigned_url(key, filename, mime_type))
+
+        import os
+        if not os.path.isfile(path):
+            logger.error(f"附件 {attachment_id} 文件缺失: {path}")
+            return not_found_response(message='附件文件不存在')
+
+        # 内容寻址，sha256 即为强 ETag
+        return send_file(os.path.abspath(path), mimetype=mime_type, as_attachment=as_attachment,
+                         download_name=filename, conditional=True, etag=etag)
+    except Exception as e:
+        log_exception(logger, "下载附件失败")
+        return server_error_response(message=f'下载失败：{str(e)}')
+
+
 @case_bp.route('/api/ticket/<ticket_id>/assign', methods=['POST'])
 def assign_ticket(ticket_id):
     """分配工单"""
@@ -731,20 +1421,24 @@ def assign_ticket(ticket_id):
         with db_connection('case') as conn:
             cursor = conn.cursor()
             
-            cursor.execute("SELECT id FROM tickets WHERE ticket_id = %s", (ticket_id,))
-            if not cursor.fetchone():
+            ticket = TicketStatsService.lock_ticket(cursor, ticket_id)
+            if not ticket:
                 from common.response import not_found_response
                 return not_found_response(message='工单不存在')
             
             now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
             update_sql = "UPDATE tickets SET assignee = %s, update_time = %s WHERE ticket_id = %s"
             cursor.execute(update_sql, (assignee, now, ticket_id))
+            TicketStatsService.apply_change(cursor, ticket, dict(ticket, assignee=assignee), now)
+            if ticket['assignee'] != assignee:
+                MailService.notify_assigned(cursor, [ticket_id], assignee)
             conn.commit()
 
-        # 发送 WebSocket 更新通知
+        # 发送 WebSocket 更新通知（同时通知被替换的原处理人）
         try:
             from services.socketio_service import emit_ticket_update
-            emit_ticket_update(ticket_id)
+            emit_ticket_update(ticket_id, submit_user=ticket['submit_user'], assignee=assignee,
+                               extra_users=(ticket['assignee'],))
         except ImportError:
             pass
 
@@ -755,6 +1449,147 @@ def assign_ticket(ticket_id):
         return server_error_response(message=f'分配失败：{str(e)}')
 
 
+@case_bp.route('/api/tickets/bulk', methods=['POST'])
+def bulk_update_tickets():
+    """批量修改工单
+
+    在一个事务内批量修改工单状态、分配处理人或关闭工单，逐个返回处理结果；
+    每个受影响的 SocketIO 房间只收到一次合并的 ticket_update 通知
+    ---
+    tags:
+      - 工单-操作
+    parameters:
+      - in: body
+        name: body
+        required: true
+        schema:
+          type: object
+          required:
+            - ticket_ids
+            - action
+          properties:
+            ticket_ids:
+              type: array
+              items:
+                type: string
+              description: 工单ID列表（最多 200 个）
+            action:
+              type: string
+              enum: [status, assign, close]
+              description: 操作类型
+            status:
+              type: string
+              enum: [pending, processing, completed, closed]
+              description: 新状态（action 为 status 时必填）
+            assignee:
+              type: string
+              description: 处理人用户名（action 为 assign 时必填）
+    responses:
+      200:
+        description: 处理完成，data.results 为每个工单的结果（updated / unchanged / not_found）
+      400:
+        description: 参数错误
+      403:
+        description: 无权执行此操作
+    """
+    try:
+        log_request(logger, request)
+
+        user_role = session.get('role')
+        if not user_role or user_role != 'admin':
+            from common.response import forbidden_response
+            return forbidden_response(message='无权执行此操作')
+
+        data = request.get_json(silent=True) or {}
+        action = data.get('action')
+        value = data.get('assignee') if action == 'assign' else data.get('status')
+        try:
+            result = TicketService.bulk_update(data.get('ticket_ids'), action, value)
+        except ValueError as e:
+            return error_response(message=str(e))
+
+        # 按房间合并发送 WebSocket 更新通知
+        if result['updated']:
+            try:
+                from services.socketio_service import emit_tickets_update
+                emit_tickets_update(result['updated'])
+            except ImportError:
+                pass
+
+        results = result['results']
+        summary = {
+            name: sum(1 for item in results if item['result'] == name)
+            for name in ('updated', 'unchanged', 'not_found')
+        }
+        return success_response(data=dict(summary, results=results),
+                                message=f"已修改 {summary['updated']} 个工单")
+    except Exception as e:
+        log_exception(logger, "批量修改工单失败")
+        return server_error_response(message=f'批量修改失败：{str(e)}')
+
+
+@case_bp.route('/api/archive', methods=['POST'])
+def archive_tickets():
+    """归档工单
+
+    将关闭超过 days 天的工单及其消息移入归档表。归档后的工单仍可查看详情和消息，
+    但不再出现在工单列表中，也不能再发送消息。同一时间只有一个归档任务执行
+    ---
+    tags:
+      - 工单-操作
+    parameters:
+      - in: body
+        name: body
+        required: false
+        schema:
+          type: object
+          properties:
+            days:
+              type: integer
+              description: 关闭（最后更新）超过多少天的工单归档，默认 TICKET_ARCHIVE_AFTER_DAYS
+            limit:
+              type: integer
+              description: 本次最多归档的工单数
+            dry_run:
+              type: boolean
+              default: false
+              description: 只统计待归档的工单数
+    responses:
+      200:
+        description: 执行完成，data 包含 cutoff、tickets、messages、batches、skipped（dry_run 时为 candidates）
+      400:
+        description: 参数错误
+      403:
+        description: 无权执行此操作
+    """
+    try:
+        log_request(logger, request)
+
+        user_role = session.get('role')
+        if not user_role or user_role != 'admin':
+            from common.response import forbidden_response
+            return forbidden_response(message='无权执行此操作')
+
+        data = request.get_json(silent=True) or {}
+        days = data.get('days')
+        limit = data.get('limit')
+        for name, value in (('days', days), ('limit', limit)):
+            if value is not None and (not isinstance(value, int) or isinstance(value, bool) or value < 1):
+                return error_response(message=f'{name} 参数不合法')
+
+        result = TicketArchiveService.run(days=days, limit=limit, dry_run=bool(data.get('dry_run')))
+        if result['skipped']:
+            message = '归档任务正在执行中'
+        elif data.get('dry_run'):
+            message = f"待归档 {result['candidates']} 个工单"
+        else:
+            message = f"已归档 {result['tickets']} 个工单"
+        return success_response(data=result, message=message)
+    except Exception as e:
+        log_exception(logger, "归档工单失败")
+        return server_error_response(message=f'归档失败：{str(e)}')
+
+
 @case_bp.route('/api/ticket/<ticket_id>/close', methods=['POST'])
 def close_ticket(ticket_id):
     """关闭工单"""
@@ -769,15 +1604,26 @@ def close_ticket(ticket_id):
         with db_connection('case') as conn:
             cursor = conn.cursor()
             
-            cursor.execute("SELECT id FROM tickets WHERE ticket_id = %s", (ticket_id,))
-            if not cursor.fetchone():
+            ticket = TicketStatsService.lock_ticket(cursor, ticket_id)
+            if not ticket:
                 from common.response import not_found_response
                 return not_found_response(message='工单不存在')
             
             now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
             update_sql = "UPDATE tickets SET status = 'closed', update_time = %s WHERE ticket_id = %s"
             cursor.execute(update_sql, (now, ticket_id))
+            TicketStatsService.apply_change(cursor, ticket, dict(ticket, status='closed'), now)
+            TicketSlaService.on_status_change(cursor, ticket_id, 'closed', now)
+            if ticket['status'] != 'closed':
+                MailService.notify_status_changed(cursor, [ticket_id], 'closed')
             conn.commit()
+
+        # 发送 WebSocket 更新通知
+        try:
+            from services.socketio_service import emit_ticket_update
+            emit_ticket_update(ticket_id, submit_user=ticket['submit_user'], assignee=ticket['assignee'])
+        except ImportError:
+            pass
         
         logger.info(f"工单关闭: {ticket_id}")
         return success_response(message='工单关闭成功')
@@ -0,0 +1,65 @@
+"""
+健康检查路由蓝图
+提供存活（liveness）和就绪（readiness）探针，供负载均衡/容器编排使用
+"""
+from flask import Blueprint
+from datetime import datetime
+import os
+from common.response import success_response, error_response
+from common.db_manager import get_pools_health, get_pool_stats
+from services.message_writer import batched_enabled, get_writer
+from services.contact_service import get_writer_stats as get_contact_writer_stats
+from services.socketio_service import get_batcher_stats
+
+health_bp = Blueprint('health', __name__, url_prefix='/health')
+
+
+@health_bp.route('/live', methods=['GET'])
+def liveness():
+    """存活探针
+
+    进程能够处理请求即返回 200，不访问数据库
+    ---
+    tags:
+      - 系统
+    responses:
+      200:
+        description: 进程存活
+    """
+    return success_response(data={
+        'pid': os.getpid(),
+        'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    }, message='alive')
+
+
+@health_bp.route('/ready', methods=['GET'])
+def readiness():
+    """就绪探针
+
+    返回各数据库连接池的健康状态，任一连接池不健康或就绪回调（如工单库建表）尚未完成时返回 503
+    ---
+    tags:
+      - 系统
+    responses:
+      200:
+        description: 所有连接池健康且已完成初始化
+      503:
+        description: 存在不健康或未完成初始化的连接池
+    """
+    ready, pools = get_pools_health()
+    for db_name, status in pools.items():
+        pools[db_name] = dict(status, stats=get_pool_stats(db_name))
+
+    data = {'pid': os.getpid(), 'pools': pools}
+    if batched_enabled():
+        data['chat_writer'] = get_writer().get_stats()
+    contact_stats = get_contact_writer_stats()
+    if contact_stats:
+        data['contact_writer'] = contact_stats
+    batcher_stats = get_batcher_stats()
+    if batcher_stats:
+        data['socketio_batcher'] = batcher_stats
+
+    if ready:
+        return success_response(data=data, message='ready')
+    return error_response('数据库连接池未就绪', 503, details=data)
@@ -1,12 +1,15 @@
 """
 官网系统路由蓝图
 """
-from flask import Blueprint, request, render_template, send_from_directory
+from flask import Blueprint, request, render_template, send_from_directory, session
 from datetime import datetime
 import os
-from common.response import success_response, error_response, validation_error_response, server_error_response
+from common.response import (success_response, error_response, validation_error_response, server_error_response,
+                             unauthorized_response)
 from common.validators import validate_required, validate_email
 from common.logger import logger, log_exception
+from common.unified_auth import login_required
+from services.contact_service import ContactMessageService, CONTACT_STATUS_LABELS, DEFAULT_PAGE_SIZE
 
 home_bp = Blueprint('home', __name__)
 
@@ -58,9 +61,10 @@ def test_images():
 
 
 @home_bp.route('/view-messages')
+@login_required(roles=['admin', 'user'])
 def view_messages():
     """留言管理页面"""
-    return render_template('home/admin_messages.html')
+    return render_template('home/admin_messages.html', status_labels=CONTACT_STATUS_LABELS, now=datetime.now)
 
 
 @home_bp.route('/api/contact', methods=['POST'])
@@ -126,6 +130,9 @@ def contact():
             return error_response(msg, 400)
         
         logger.info(f"收到联系表单: {data['name']} <{data['email']}>")
+
+        # 留言进入写入队列，由后台线程批量写库并发送通知邮件
+        ContactMessageService.submit(data['name'].strip()[:100], data['email'].strip()[:100], data['message'])
         return success_response(message='留言提交成功')
     except Exception as e:
         log_exception(logger, "提交联系表单失败")
@@ -134,5 +141,97 @@ def contact():
 
 @home_bp.route('/api/messages', methods=['GET'])
 def get_messages():
-    """获取留言列表"""
-    return success_response(data={'messages': []}, message='查询成功')
+    """获取留言列表
+
+    按提交时间倒序返回官网留言，使用游标分页
+    ---
+    tags:
+      - 官网
+    parameters:
+      - name: status
+        in: query
+        type: string
+        description: 留言状态（pending, processed），为空时返回全部
+      - name: cursor
+        in: query
+        type: string
+        description: 上一页返回的 next_cursor
+      - name: limit
+        in: query
+        type: integer
+        default: 20
+        description: 每页数量（最大 100）
+    responses:
+      200:
+        description: 查询成功，data 包含 messages、next_cursor、has_more、counts（各状态留言数）
+      400:
+        description: 参数错误
+      401:
+        description: 未登录
+    """
+    try:
+        if session.get('role') not in ('admin', 'user'):
+            return unauthorized_response(message='未登录')
+
+        try:
+            result = ContactMessageService.list_messages(
+                request.args.get('status', '').strip() or None,
+                request.args.get('cursor', '').strip() or None,
+                request.args.get('limit', DEFAULT_PAGE_SIZE, type=int)
+            )
+        except ValueError as e:
+            return error_response(str(e), 400)
+        return success_response(data=result, message='查询成功')
+    except Exception as e:
+        log_exception(logger, "查询留言列表失败")
+        return server_error_response(f'查询失败：{str(e)}')
+
+
+@home_bp.route('/api/messages/status', methods=['POST'])
+def update_messages_status():
+    """批量修改留言状态
+    ---
+    tags:
+      - 官网
+    consumes:
+      - application/json
+    parameters:
+      - in: body
+        name: body
+        required: true
+        schema:
+          type: object
+          required:
+            - ids
+            - status
+          properties:
+            ids:
+              type: array
+              items:
+                type: integer
+              description: 留言ID列表（最多 200 条）
+            status:
+              type: string
+              description: 新状态（pending, processed）
+              example: processed
+    responses:
+      200:
+        description: 修改成功，data 包含 updated（已修改数）、not_found（不存在的留言ID）
+      400:
+        description: 参数错误
+      401:
+        description: 未登录
+    """
+    try:
+        if session.get('role') not in ('admin', 'user'):
+            return unauthorized_response(message='未登录')
+
+        data = request.get_json(silent=True) or {}
+        try:
+            result = ContactMessageService.bulk_update_status(data.get('ids'), (data.get('status') or '').strip())
+        except ValueError as e:
+            return error_response(str(e), 400)
+        return success_response(data=result, message='修改成功')
+    except Exception as e:
+        log_exception(logger, "批量修改留言状态失败")
+        return server_error_response(f'修改失败：{str(e)}')
@@ -8,7 +8,7 @@ from common.unified_auth import get_current_user, login_required
 from common.logger import logger
 from common.kb_utils import (
     fetch_all_records, fetch_record_by_id, fetch_records_by_name_with_pagination,
-    get_total_count, fetch_records_with_pagination, get_kb_db_connection
+    get_total_count, fetch_records_with_pagination, get_kb_db_connection, rows_to_dicts
 )
 import config
 
@@ -213,7 +213,7 @@ def get_all():
     try:
         records = fetch_all_records()
         from common.response import success_response
-        return success_response(data={'records': records, 'count': len(records)}, message='查询成功')
+        return success_response(data={'records': rows_to_dicts(records), 'count': len(records)}, message='查询成功')
     except Exception as e:
         from common.response import server_error_response
         from common.logger import log_exception
@@ -239,7 +239,7 @@ def search_by_name():
         from common.response import success_response
         return success_response(
             data={
-                'records': records,
+                'records': rows_to_dicts(records),
                 'count': len(records),
                 'total_count': total_count,
                 'page': page,
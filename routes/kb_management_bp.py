@@ -6,7 +6,7 @@ from common.unified_auth import login_required, get_current_user
 from common.response import success_response, error_response, validation_error_response, server_error_response
 from common.validators import validate_required
 from common.logger import logger, log_exception
-from common.kb_utils import fetch_record_by_id, fetch_records_with_pagination, get_total_count, fetch_all_records, serialize_records
+from common.kb_utils import fetch_record_by_id, fetch_records_with_pagination, get_total_count, fetch_all_records, rows_to_dicts
 from common.database_context import db_connection
 from datetime import datetime
 
@@ -28,11 +28,11 @@ def management():
         per_page = 20
         logger.info(f"分页参数: page={page}, per_page={per_page}")
 
-        records, total_count = fetch_records_with_pagination(page, per_page)
+        records, total_count = fetch_records_with_pagination(page, per_page, view='management')
         logger.info(f"获取到 records={len(records)} 条, total_count={total_count}")
 
         # 序列化 datetime 对象为字符串（用于 JavaScript）
-        records_json = serialize_records(records) if records else []
+        records_json = rows_to_dicts(records)
 
         total_pages = (total_count + per_page - 1) // per_page
         showing_start = (page - 1) * per_page + 1
@@ -710,12 +710,12 @@ def batch_delete_records():
 def export_data():
     """导出所有数据"""
     try:
-        records = fetch_all_records()
+        records = fetch_all_records(view='full')
         logger.info(f"导出知识库数据: {len(records)} 条记录")
         return success_response(
             message='数据导出成功',
             data={
-                'data': records,
+                'data': rows_to_dicts(records),
                 'count': len(records)
             }
         )
@@ -740,16 +740,16 @@ def get_paginated_records():
         
         from common.kb_utils import fetch_records_by_name_with_pagination
         if search_name:
-            records, total_count = fetch_records_by_name_with_pagination(search_name, page, per_page)
+            records, total_count = fetch_records_by_name_with_pagination(search_name, page, per_page, view='management')
         else:
-            records, total_count = fetch_records_with_pagination(page, per_page)
+            records, total_count = fetch_records_with_pagination(page, per_page, view='management')
         
         total_pages = (total_count + per_page - 1) // per_page
         showing_start = (page - 1) * per_page + 1
         showing_end = min(page * per_page, total_count)
         
         response_data = {
-            'records': records,
+            'records': rows_to_dicts(records),
             'total_count': total_count,
             'showing_count': showing_end - showing_start + 1 if records else 0,
             'page': page,
@@ -306,7 +306,8 @@ def get_user_stats():
             cursor.execute("SELECT COUNT(*) as total FROM mgmt_login_logs")
             stats['login_logs']['total'] = cursor.fetchone()['total']
             
-            cursor.execute("SELECT COUNT(*) as count FROM mgmt_login_logs WHERE DATE(login_time) = CURDATE()")
+            # 使用范围条件而非 DATE(login_time)，以便使用 idx_login_time 索引
+            cursor.execute("SELECT COUNT(*) as count FROM mgmt_login_logs WHERE login_time >= CURDATE() AND login_time < CURDATE() + INTERVAL 1 DAY")
             stats['login_logs']['today'] = cursor.fetchone()['count']
             
             cursor.execute("SELECT COUNT(*) as count FROM mgmt_login_logs WHERE status = 'success'")
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+工单归档脚本
+将关闭超过 N 天的工单连同消息移入 tickets_archive / messages_archive，每批一个事务，可重复执行；
+应用内后台归档关闭（TICKET_ARCHIVE_INTERVAL=0）时可由 cron 定时执行
+
+用法:
+    python scripts/archive_tickets.py --dry-run             # 只统计待归档的工单
+    python scripts/archive_tickets.py                       # 按 TICKET_ARCHIVE_AFTER_DAYS 归档
+    python scripts/archive_tickets.py --days 365 --limit 1000
+    python scripts/archive_tickets.py --restore TK-xxx      # 将归档工单恢复到活跃表
+"""
+
+import argparse
+import sys
+from pathlib import Path
+
+# 设置输出编码为 UTF-8
+if sys.platform == 'win32':
+    import io
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
+    sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8')
+
+# 添加项目根目录到 Python 路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from services.archive_service import TicketArchiveService
+
+
+def main():
+    parser = argparse.ArgumentParser(description='工单归档')
+    parser.add_argument('--days', type=int, default=None, help='关闭超过多少天的工单归档（默认 TICKET_ARCHIVE_AFTER_DAYS）')
+    parser.add_argument('--limit', type=int, default=None, help='本次最多归档的工单数')
+    parser.add_argument('--dry-run', action='store_true', help='只统计待归档的工单，不归档')
+    parser.add_argument('--restore', action='append', default=[], help='将归档工单恢复到活跃表（可多次指定）')
+    args = parser.parse_args()
+
+    if args.restore:
+        failed = 0
+        for ticket_id in args.restore:
+            if TicketArchiveService.restore_ticket(ticket_id):
+                print(f"✓ 已恢复: {ticket_id}")
+            else:
+                failed += 1
+                print(f"✗ 归档表中不存在: {ticket_id}")
+        return 1 if failed else 0
+
+    result = TicketArchiveService.run(days=args.days, limit=args.limit, dry_run=args.dry_run)
+    print(f"归档截止时间: {result['cutoff']}")
+    if args.dry_run:
+        print(f"待归档工单: {result['candidates']}")
+    elif result['skipped']:
+        print("✗ 归档任务正在其他进程中执行")
+        return 1
+    else:
+        print(f"✓ 已归档 {result['tickets']} 个工单、{result['messages']} 条消息（{result['batches']} 批）")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
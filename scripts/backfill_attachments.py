@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+附件元数据补录脚本（一次性）
+扫描上传目录中 attachments 表尚未登记的文件，计算大小、SHA-256 和 MIME 类型后补录
+
+- 文件名为 {ticket_id}_{timestamp}_{filename} 的按前缀关联工单，上传时间取文件名中的时间戳
+- 工单已不存在的文件跳过
+- 旧版附件上传接口保存的 {timestamp}_{filename} 文件没有工单前缀，无法关联工单，只列出不补录
+- 已登记的文件自动跳过，可重复执行
+
+用法:
+    python scripts/backfill_attachments.py --dry-run    # 只统计，不写入
+    python scripts/backfill_attachments.py
+"""
+
+import argparse
+import hashlib
+import mimetypes
+import os
+import re
+import sys
+from datetime import datetime
+from pathlib import Path
+
+# 设置输出编码为 UTF-8
+if sys.platform == 'win32':
+    import io
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
+    sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8')
+
+# 添加项目根目录到 Python 路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+import pymysql
+import config
+
+UPLOAD_DIR = project_root / 'static' / 'uploads' / 'case'
+
+_TICKET_FILE_RE = re.compile(r'^(TK-\d{14}-[0-9A-Za-z]{6})_(\d{14})_(.+)$')
+_ORPHAN_FILE_RE = re.compile(r'^(\d{14})_(.+)$')
+
+
+def file_sha256(path):
+    sha256 = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(64 * 1024), b''):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+def scan_uploads():
+    """
+    扫描上传目录
+
+    Returns:
+        (candidates, orphans): 可关联工单的文件 [(ticket_id, stored_path, filename, upload_time, path)]；
+        无法关联工单的文件名列表
+    """
+    candidates = []
+    orphans = []
+    with os.scandir(UPLOAD_DIR) as entries:
+        for entry in entries:
+            if not entry.is_file():
+                continue
+            match = _TICKET_FILE_RE.match(entry.name)
+            if match:
+                ticket_id, timestamp, filename = match.groups()
+                upload_time = datetime.strptime(timestamp, '%Y%m%d%H%M%S').strftime('%Y-%m-%d %H:%M:%S')
+                candidates.append((ticket_id, f'uploads/case/{entry.name}', filename, upload_time, entry.path))
+            elif _ORPHAN_FILE_RE.match(entry.name):
+                orphans.append(entry.name)
+    return candidates, orphans
+
+
+def main():
+    parser = argparse.ArgumentParser(description='附件元数据补录')
+    parser.add_argument('--dry-run', action='store_true', help='只统计，不写入')
+    parser.add_argument('--batch-size', type=int, default=500, help='每批写入的记录数')
+    args = parser.parse_args()
+
+    if not UPLOAD_DIR.exists():
+        print(f"上传目录不存在: {UPLOAD_DIR}")
+        return 0
+
+    candidates, orphans = scan_uploads()
+    print(f"扫描到带工单前缀的文件 {len(candidates)} 个，无工单前缀的文件 {len(orphans)} 个")
+
+    try:
+        conn = pymysql.connect(
+            host=config.DB_HOST,
+            port=config.DB_PORT,
+            user=config.DB_USER,
+            password=config.DB_PASSWORD,
+            database=config.DB_NAME_CASE,
+            charset='utf8mb4',
+        )
+    except Exception as e:
+        print(f"错误: 数据库连接失败: {e}")
+        return 1
+
+    inserted = skipped_existing = skipped_missing = 0
+    try:
+        with conn.cursor() as cursor:
+            for start in range(0, len(candidates), args.batch_size):
+                batch = candidates[start:start + args.batch_size]
+
+                placeholders = ', '.join(['%s'] * len(batch))
+                cursor.execute(f"SELECT stored_path FROM attachments WHERE stored_path IN ({placeholders})",
+                               [item[1] for item in batch])
+                existing = {row[0] for row in cursor.fetchall()}
+
+                ticket_ids = sorted({item[0] for item in batch})
+                placeholders = ', '.join(['%s'] * len(ticket_ids))
+                cursor.execute(f"SELECT ticket_id, submit_user FROM tickets WHERE ticket_id IN ({placeholders})",
+                               ticket_ids)
+                tickets = dict(cursor.fetchall())
+
+                rows = []
+                for ticket_id, stored_path, filename, upload_time, path in batch:
+                    if stored_path in existing:
+                        skipped_existing += 1
+                        continue
+                    if ticket_id not in tickets:
+                        skipped_missing += 1
+                        continue
+                    # 旧文件无法确定上传人，按工单提交人登记
+                    rows.append((ticket_id, filename, stored_path, os.path.getsize(path),
+                                 mimetypes.guess_type(filename)[0], file_sha256(path),
+                                 tickets[ticket_id], upload_time))
+
+                if rows and not args.dry_run:
+                    cursor.executemany(
+                        """
+                        INSERT INTO attachments (ticket_id, filename, stored_path, file_size, mime_type, sha256,
+                                                 uploaded_by, upload_time)
+                        VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+                        """,
+                        rows
+                    )
+                    conn.commit()
+                inserted += len(rows)
+    finally:
+        conn.close()
+
+    action = '待补录' if args.dry_run else '已补录'
+    print(f"{action}: {inserted}  已登记跳过: {skipped_existing}  工单不存在跳过: {skipped_missing}")
+    if orphans:
+        print(f"\n以下 {len(orphans)} 个文件没有工单前缀（旧版附件上传接口保存），无法自动关联工单:")
+        for name in orphans:
+            print(f"  {name}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+预编译语句性能对比脚本
+对比 PyMySQL 文本协议与 mysql-connector 服务端预编译（二进制协议）执行热点查询的耗时
+
+用法:
+    python scripts/benchmark_prepared_statements.py
+    python scripts/benchmark_prepared_statements.py -n 2000 --kb-number 1 --username admin --ticket-id TK-xxx
+"""
+
+import argparse
+import statistics
+import sys
+import time
+from pathlib import Path
+
+# 设置输出编码为 UTF-8
+if sys.platform == 'win32':
+    import io
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
+    sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8')
+
+# 添加项目根目录到 Python 路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from common import statement_cache
+from common.statement_cache import _execute_prepared, _execute_text, prepared_enabled
+
+# 注册热点语句（导入即注册）
+from common.kb_utils import STMT_RECORD_BY_ID
+from common.unified_auth import STMT_AUTH_USER_LOOKUP
+
+
+def run(label, func, name, params, iterations):
+    """执行 iterations 次查询并统计耗时（毫秒）"""
+    # 预热：建立连接、完成首次 PREPARE
+    for _ in range(min(20, iterations)):
+        func(name, params)
+
+    timings = []
+    start = time.perf_counter()
+    for _ in range(iterations):
+        t0 = time.perf_counter()
+        func(name, params)
+        timings.append((time.perf_counter() - t0) * 1000)
+    elapsed = time.perf_counter() - start
+
+    timings.sort()
+    return {
+        'label': label,
+        'qps': iterations / elapsed if elapsed else 0,
+        'mean': statistics.mean(timings),
+        'p50': timings[int(len(timings) * 0.50)],
+        'p95': timings[min(len(timings) - 1, int(len(timings) * 0.95))],
+        'p99': timings[min(len(timings) - 1, int(len(timings) * 0.99))],
+    }
+
+
+def print_result(result):
+    print(f"  {result['label']:<22} {result['qps']:>10.1f} qps   "
+          f"mean {result['mean']:.3f}ms   p50 {result['p50']:.3f}ms   "
+          f"p95 {result['p95']:.3f}ms   p99 {result['p99']:.3f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='预编译语句 vs 文本协议性能对比')
+    parser.add_argument('-n', '--iterations', type=int, default=1000, help='每条语句执行次数')
+    parser.add_argument('--kb-number', type=int, default=1, help='知识库编号')
+    parser.add_argument('--username', default='admin', help='登录查询使用的用户名')
+    parser.add_argument('--ticket-id', default='', help='消息查询使用的工单ID（为空则跳过工单相关语句）')
+    args = parser.parse_args()
+
+    if not prepared_enabled():
+        print("错误: 预编译语句不可用（未安装 mysql-connector-python 或 DB_PREPARED_STATEMENTS=False）")
+        return 1
+
+    cases = [
+        (STMT_RECORD_BY_ID, (args.kb_number,)),
+        (STMT_AUTH_USER_LOOKUP, (args.username, args.username)),
+    ]
+    if args.ticket_id:
+        from services.message_service import STMT_MESSAGES_LATEST, DEFAULT_MESSAGE_LIMIT
+        cases.append((STMT_MESSAGES_LATEST, (args.ticket_id, DEFAULT_MESSAGE_LIMIT + 1)))
+
+    print("=" * 100)
+    print(f"预编译语句性能对比 (每条语句 {args.iterations} 次)")
+    print("=" * 100)
+
+    for name, params in cases:
+        db_name, sql = statement_cache.get_statement(name)
+        print(f"\n[{name}] ({db_name}) {' '.join(sql.split())[:80]}")
+        text = run('PyMySQL 文本协议', _execute_text, name, params, args.iterations)
+        prepared = run('服务端预编译', _execute_prepared, name, params, args.iterations)
+        print_result(text)
+        print_result(prepared)
+        if text['p50']:
+            print(f"  p50 变化: {(prepared['p50'] - text['p50']) / text['p50'] * 100:+.1f}%")
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
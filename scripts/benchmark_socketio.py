@@ -0,0 +1,385 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+工单聊天 WebSocket 压测脚本
+模拟 N 个 SocketIO 客户端加入 ticket_<id> 房间并通过 send_message 事件发送消息，
+统计消息投递延迟（p50/p95/p99）、吞吐量和数据库写入速率，可对比不同 async_mode
+
+- 默认为每个 async_mode 启动一个独立的应用进程（SOCKETIO_ASYNC_MODE 环境变量），压测结束后关闭
+- 使用 --url 时压测已运行的服务，只测一次
+- 每轮压测先在工单库中创建 BENCH-<run>-<n> 工单（发送消息要求工单存在），结束后连同消息、
+  已读游标、检索索引、SLA 记录和统计计数一并删除；--keep-data 保留以便排查
+- 需要工单库访问权限（读取 .env 配置），以及一个 admin/user 角色的账号（处理人员可加入任意工单房间），
+  所有客户端共用一次登录的会话
+
+用法:
+    python scripts/benchmark_socketio.py --username admin --password xxx
+    python scripts/benchmark_socketio.py --username admin --password xxx \\
+        --clients 200 --rooms 20 --messages 20 --modes eventlet,gevent,threading
+    python scripts/benchmark_socketio.py --url http://127.0.0.1:5000 --username admin --password xxx
+
+依赖: pip install "python-socketio[client]" requests
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from pathlib import Path
+
+# 设置输出编码为 UTF-8
+if sys.platform == 'win32':
+    import io
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
+    sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8')
+
+# 添加项目根目录到 Python 路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+import requests
+import socketio
+
+BENCH_PREFIX = 'BENCH-'
+CONTENT_PREFIX = 'bench:'
+
+# 压测工单的固定字段，统计计数按这些值增减
+BENCH_TICKET = {'status': 'pending', 'priority': 'low', 'product': 'benchmark', 'assignee': None}
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * p))]
+
+
+def start_server(mode, port):
+    """以指定 async_mode 启动应用进程，等待存活探针就绪"""
+    env = dict(os.environ, SOCKETIO_ASYNC_MODE=mode, FLASK_PORT=str(port), FLASK_HOST='127.0.0.1',
+               FLASK_DEBUG='False')
+    proc = subprocess.Popen([sys.executable, 'app.py'], cwd=str(project_root), env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    url = f'http://127.0.0.1:{port}'
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f'{mode} 模式应用进程启动失败（退出码 {proc.returncode}）')
+        try:
+            if requests.get(f'{url}/health/live', timeout=1).ok:
+                return proc, url
+        except requests.RequestException:
+            pass
+        time.sleep(0.5)
+    proc.terminate()
+    raise RuntimeError(f'{mode} 模式应用进程启动超时')
+
+
+def stop_server(proc):
+    proc.terminate()
+    try:
+        proc.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+
+
+def login(url, username, password):
+    """登录一次，返回会话 cookie"""
+    session = requests.Session()
+    resp = session.post(f'{url}/case/api/login', json={'username': username, 'password': password}, timeout=10)
+    result = resp.json()
+    if not result.get('success'):
+        raise RuntimeError(f"登录失败: {result.get('message')}")
+    return session.cookies.get_dict()
+
+
+class BenchClient:
+    """单个压测客户端"""
+
+    def __init__(self, url, cookies, ticket_id, results, lock):
+        http_session = requests.Session()
+        http_session.cookies.update(cookies)
+        self.sio = socketio.Client(http_session=http_session, reconnection=False)
+        self.url = url
+        self.ticket_id = ticket_id
+        self.results = results
+        self.lock = lock
+        self.sio.on('new_message', self._on_message)
+        self.sio.on('batch', self._on_batch)
+
+    def _on_batch(self, data):
+        # SOCKETIO_BATCH_WINDOW_MS 启用时同一窗口内的消息合并为 batch 事件
+        received = time.time()
+        for item in data.get('events', []):
+            if item.get('event') == 'new_message':
+                self._on_message(item.get('data'), received)
+
+    def _on_message(self, data, received=None):
+        received = received or time.time()
+        content = data.get('content', '') if isinstance(data, dict) else ''
+        if not content.startswith(CONTENT_PREFIX):
+            return
+        try:
+            sent = json.loads(content[len(CONTENT_PREFIX):])['ts']
+        except (ValueError, KeyError):
+            return
+        with self.lock:
+            self.results['latencies'].append((received - sent) * 1000)
+
+    def connect(self):
+        self.sio.connect(self.url, transports=['websocket'], wait_timeout=10)
+        result = self.sio.call('join', {'ticket_id': self.ticket_id}, timeout=10)
+        if not result or not result.get('success'):
+            raise RuntimeError(f'加入房间失败: {result}')
+
+    def send(self, seq):
+        payload = CONTENT_PREFIX + json.dumps({'ts': time.time(), 'seq': seq})
+        result = self.sio.call('send_message', {'ticket_id': self.ticket_id, 'content': payload}, timeout=30)
+        with self.lock:
+            if result and result.get('success'):
+                self.results['sent'] += 1
+            else:
+                self.results['errors'] += 1
+
+    def close(self):
+        try:
+            self.sio.disconnect()
+        except Exception:
+            pass
+
+
+def bench_ticket_ids(run_id, rooms):
+    return [f'{BENCH_PREFIX}{run_id}-{i}' for i in range(rooms)]
+
+
+def create_tickets(run_id, rooms, username):
+    """创建本轮压测使用的工单（与正常建单一样维护统计计数）"""
+    from datetime import datetime
+    from common.database_context import db_connection
+    from services.stats_service import TicketStatsService
+
+    now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    ticket_ids = bench_ticket_ids(run_id, rooms)
+    with db_connection('case') as conn:
+        cursor = conn.cursor()
+        cursor.executemany(
+            """
+            INSERT INTO tickets (ticket_id, customer_name, customer_contact_name, customer_contact, customer_email,
+                                 submit_user, product, issue_type, priority, title, content,
+                                 status, create_time, update_time)
+            VALUES (%s, 'benchmark', 'benchmark', '-', '-', %s, %s, 'other', %s, %s, 'WebSocket 压测工单', %s, %s, %s)
+            """,
+            [(ticket_id, username, BENCH_TICKET['product'], BENCH_TICKET['priority'],
+              f'压测 {ticket_id}', BENCH_TICKET['status'], now, now) for ticket_id in ticket_ids]
+        )
+        TicketStatsService.apply_changes(cursor, [(None, BENCH_TICKET)] * len(ticket_ids), now)
+        conn.commit()
+    return ticket_ids
+
+
+def db_message_count(run_id):
+    """统计本轮压测写入数据库的消息数"""
+    from common.database_context import db_connection
+    with db_connection('case') as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT COUNT(*) AS cnt FROM messages WHERE ticket_id LIKE %s", (f'{BENCH_PREFIX}{run_id}-%',))
+        return cursor.fetchone()['cnt']
+
+
+def cleanup(run_id):
+    """删除本轮压测的工单及其关联数据，统计计数和每日新建数同步扣减"""
+    from common.database_context import db_connection
+    from services.stats_service import TicketStatsService
+
+    pattern = f'{BENCH_PREFIX}{run_id}-%'
+    with db_connection('case') as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT ticket_id, create_time FROM tickets WHERE ticket_id LIKE %s FOR UPDATE", (pattern,))
+        rows = cursor.fetchall()
+        cursor.execute("DELETE FROM messages WHERE ticket_id LIKE %s", (pattern,))
+        for table in ('ticket_read_cursors', 'ticket_search_terms', 'ticket_sla'):
+            cursor.execute(f"DELETE FROM {table} WHERE ticket_id LIKE %s", (pattern,))
+        cursor.execute("DELETE FROM tickets WHERE ticket_id LIKE %s", (pattern,))
+        TicketStatsService.apply_changes(cursor, [(BENCH_TICKET, None)] * len(rows))
+        created = {}
+        for row in rows:
+            day = row['create_time'].date()
+            created[day] = created.get(day, 0) + 1
+        for day, count in created.items():
+            cursor.execute(
+                "UPDATE ticket_daily_stats SET created = GREATEST(created - %s, 0) WHERE stat_date = %s",
+                (count, day)
+            )
+        conn.commit()
+    return len(rows)
+
+
+def run_benchmark(url, cookies, args, label):
+    run_id = uuid.uuid4().hex[:8]
+    ticket_ids = create_tickets(run_id, args.rooms, args.username)
+    try:
+        return _run_clients(url, cookies, args, label, run_id, ticket_ids)
+    finally:
+        if args.keep_data:
+            print(f"  保留压测数据: {BENCH_PREFIX}{run_id}-*")
+        else:
+            try:
+                cleanup(run_id)
+            except Exception as e:
+                print(f"  ⚠️ 清理压测数据失败（工单 {BENCH_PREFIX}{run_id}-*）: {e}")
+
+
+def _run_clients(url, cookies, args, label, run_id, ticket_ids):
+    results = {'latencies': [], 'sent': 0, 'errors': 0}
+    lock = threading.Lock()
+
+    clients = [
+        BenchClient(url, cookies, ticket_ids[i % args.rooms], results, lock)
+        for i in range(args.clients)
+    ]
+    print(f"\n[{label}] 连接 {args.clients} 个客户端到 {args.rooms} 个房间...")
+    connect_start = time.perf_counter()
+    connected = []
+    for client in clients:
+        try:
+            client.connect()
+            connected.append(client)
+        except Exception as e:
+            print(f"  ✗ 客户端连接失败: {e}")
+    connect_elapsed = time.perf_counter() - connect_start
+    if not connected:
+        return None
+
+    def sender(client):
+        interval = 1.0 / args.rate if args.rate else 0
+        for seq in range(args.messages):
+            client.send(seq)
+            if interval:
+                time.sleep(interval)
+
+    expected = len(connected) * args.messages
+    threads = [threading.Thread(target=sender, args=(client,)) for client in connected]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    send_elapsed = time.perf_counter() - start
+
+    # 等待在途消息送达
+    time.sleep(args.drain)
+
+    # 数据库写入速率：等待全部消息落库（批量写入模式下会晚于推送）
+    db_count, db_elapsed = None, None
+    if not args.skip_db:
+        try:
+            deadline = time.time() + args.db_timeout
+            while True:
+                db_count = db_message_count(run_id)
+                if db_count >= results['sent'] or time.time() > deadline:
+                    break
+                time.sleep(0.2)
+            db_elapsed = time.perf_counter() - start
+        except Exception as e:
+            print(f"  ⚠️ 无法统计数据库写入: {e}")
+
+    for client in connected:
+        client.close()
+
+    latencies = sorted(results['latencies'])
+    per_room = len(connected) / args.rooms
+    return {
+        'label': label,
+        'clients': len(connected),
+        'connect_s': connect_elapsed,
+        'sent': results['sent'],
+        'errors': results['errors'],
+        'expected': expected,
+        'deliveries': len(latencies),
+        'expected_deliveries': int(results['sent'] * per_room),
+        'send_rate': results['sent'] / send_elapsed if send_elapsed else 0,
+        'delivery_rate': len(latencies) / (send_elapsed + args.drain),
+        'p50': percentile(latencies, 0.50),
+        'p95': percentile(latencies, 0.95),
+        'p99': percentile(latencies, 0.99),
+        'mean': statistics.mean(latencies) if latencies else 0,
+        'db_count': db_count,
+        'db_rate': db_count / db_elapsed if db_count and db_elapsed else None,
+    }
+
+
+def print_result(r):
+    print(f"  客户端: {r['clients']}  连接耗时: {r['connect_s']:.2f}s")
+    print(f"  发送: {r['sent']}/{r['expected']}  失败: {r['errors']}  发送速率: {r['send_rate']:.1f} msg/s")
+    print(f"  投递: {r['deliveries']}/{r['expected_deliveries']}  投递速率: {r['delivery_rate']:.1f} msg/s")
+    print(f"  投递延迟: mean {r['mean']:.1f}ms  p50 {r['p50']:.1f}ms  p95 {r['p95']:.1f}ms  p99 {r['p99']:.1f}ms")
+    if r['db_count'] is not None:
+        rate = f"{r['db_rate']:.1f} rows/s" if r['db_rate'] else '-'
+        print(f"  数据库写入: {r['db_count']} 条  写入速率: {rate}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='工单聊天 WebSocket 压测')
+    parser.add_argument('--url', help='压测已运行的服务（不启动应用进程）')
+    parser.add_argument('--modes', default='eventlet,gevent,threading', help='对比的 async_mode，逗号分隔')
+    parser.add_argument('--port', type=int, default=5099, help='启动应用进程使用的端口')
+    parser.add_argument('--username', required=True, help='admin/user 角色账号')
+    parser.add_argument('--password', required=True)
+    parser.add_argument('--clients', type=int, default=50, help='并发客户端数')
+    parser.add_argument('--rooms', type=int, default=10, help='工单房间数')
+    parser.add_argument('--messages', type=int, default=20, help='每个客户端发送的消息数')
+    parser.add_argument('--rate', type=float, default=0, help='每个客户端每秒发送消息数，0 为不限速')
+    parser.add_argument('--drain', type=float, default=2.0, help='发送结束后等待投递的时间（秒）')
+    parser.add_argument('--db-timeout', type=float, default=30.0, help='等待消息全部落库的最长时间（秒）')
+    parser.add_argument('--skip-db', action='store_true', help='不统计数据库写入速率')
+    parser.add_argument('--keep-data', action='store_true', help='结束后保留压测工单和消息')
+    args = parser.parse_args()
+    args.rooms = max(1, min(args.rooms, args.clients))
+
+    print("=" * 100)
+    print(f"工单聊天压测: {args.clients} 客户端 / {args.rooms} 房间 / 每客户端 {args.messages} 条消息")
+    print("=" * 100)
+
+    summary = []
+    if args.url:
+        cookies = login(args.url, args.username, args.password)
+        result = run_benchmark(args.url, cookies, args, args.url)
+        if result:
+            print_result(result)
+            summary.append(result)
+    else:
+        for mode in [m.strip() for m in args.modes.split(',') if m.strip()]:
+            try:
+                proc, url = start_server(mode, args.port)
+            except RuntimeError as e:
+                print(f"\n[{mode}] ✗ {e}")
+                continue
+            try:
+                cookies = login(url, args.username, args.password)
+                result = run_benchmark(url, cookies, args, mode)
+                if result:
+                    print_result(result)
+                    summary.append(result)
+            except Exception as e:
+                print(f"\n[{mode}] ✗ 压测失败: {e}")
+            finally:
+                stop_server(proc)
+
+    if len(summary) > 1:
+        print("\n" + "=" * 100)
+        print(f"{'模式':<12}{'发送 msg/s':>12}{'投递 msg/s':>12}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'写库 rows/s':>14}")
+        for r in summary:
+            db_rate = f"{r['db_rate']:.1f}" if r['db_rate'] else '-'
+            print(f"{r['label']:<12}{r['send_rate']:>12.1f}{r['delivery_rate']:>12.1f}"
+                  f"{r['p50']:>10.1f}{r['p95']:>10.1f}{r['p99']:>10.1f}{db_rate:>14}")
+        print("=" * 100)
+
+    return 0 if summary else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+工单检索索引重建脚本
+逐个工单（含已归档的工单）删除旧索引后按标题、正文、解决方案和全部消息重新建立，每批一个事务，可重复执行：
+- 执行 009_ticket_search_index.sql 后为已有工单建立索引
+- 调整分词规则或权重后重建
+- 手工修改工单/消息数据后修正单个工单
+
+用法:
+    python scripts/build_search_index.py                       # 重建全部工单
+    python scripts/build_search_index.py --ticket TK-xxx       # 只重建指定工单
+    python scripts/build_search_index.py --batch-size 100
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+# 设置输出编码为 UTF-8
+if sys.platform == 'win32':
+    import io
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
+    sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8')
+
+# 添加项目根目录到 Python 路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from common.database_context import db_connection
+from services.search_service import TicketSearchService
+
+
+def main():
+    parser = argparse.ArgumentParser(description='工单检索索引重建')
+    parser.add_argument('--ticket', action='append', default=[], help='只重建指定工单（可多次指定）')
+    parser.add_argument('--batch-size', type=int, default=200, help='每个事务处理的工单数')
+    args = parser.parse_args()
+
+    if args.ticket:
+        ticket_ids = args.ticket
+    else:
+        with db_connection('case') as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT ticket_id FROM tickets UNION ALL SELECT ticket_id FROM tickets_archive ORDER BY 1")
+            ticket_ids = [row['ticket_id'] for row in cursor.fetchall()]
+
+    print(f"待重建索引的工单: {len(ticket_ids)}")
+    started = time.time()
+    indexed = missing = 0
+    for start in range(0, len(ticket_ids), args.batch_size):
+        batch = ticket_ids[start:start + args.batch_size]
+        with db_connection('case') as conn:
+            cursor = conn.cursor()
+            for ticket_id in batch:
+                if TicketSearchService.reindex_ticket(cursor, ticket_id):
+                    indexed += 1
+                else:
+                    missing += 1
+                    print(f"✗ 工单不存在: {ticket_id}")
+            conn.commit()
+        print(f"  已处理 {min(start + args.batch_size, len(ticket_ids))}/{len(ticket_ids)}")
+
+    print(f"\n完成: 重建 {indexed} 个工单，耗时 {time.time() - started:.1f}s"
+          + (f"，{missing} 个不存在" if missing else ''))
+    return 1 if missing else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
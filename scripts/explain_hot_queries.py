@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+热点查询执行计划检查脚本
+对热点查询执行 EXPLAIN，检查是否命中预期索引，发现全表扫描或文件排序时给出警告
+
+用法:
+    python scripts/explain_hot_queries.py
+    python scripts/explain_hot_queries.py --strict      # 存在问题时返回非零退出码（可用于 CI/发布检查）
+
+执行前请先运行 python scripts/migrate_database.py 应用索引补丁
+"""
+
+import argparse
+import sys
+from datetime import datetime
+from pathlib import Path
+
+# 设置输出编码为 UTF-8
+if sys.platform == 'win32':
+    import io
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
+    sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8')
+
+# 添加项目根目录到 Python 路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from common.database_context import db_connection
+from common.statement_cache import get_statement
+from common.unified_auth import STMT_AUTH_USER_LOOKUP
+from services.ticket_service import TicketService
+from services.message_service import STMT_MESSAGES_LATEST, STMT_MESSAGES_AFTER, STMT_MESSAGES_SUMMARY
+from services.contact_service import ContactMessageService
+
+
+def _ticket_list(filters, cursor=None):
+    _, sql, params = TicketService.build_list_query(filters, cursor, 20)
+    return sql, params
+
+
+def _registered(name, params):
+    return get_statement(name)[1], params
+
+
+def build_cases():
+    """
+    热点查询列表
+
+    Returns:
+        list[tuple]: (说明, 数据库, SQL, 参数, 预期索引)
+    """
+    now = datetime.now().replace(microsecond=0)
+    cases = [
+        ('工单列表: 客户自己的工单', 'case',
+         *_ticket_list({'submit_user': 'customer'}), 'idx_submit_user_create_time'),
+        ('工单列表: 客户工单翻页', 'case',
+         *_ticket_list({'submit_user': 'customer'}, (now, 1000)), 'idx_submit_user_create_time'),
+        ('工单列表: 按状态', 'case',
+         *_ticket_list({'status': ['pending']}), 'idx_status_create_time'),
+        ('工单列表: 我处理的', 'case',
+         *_ticket_list({'assignee': 'admin'}), 'idx_assignee_create_time'),
+        ('工单列表: 全部', 'case',
+         *_ticket_list({}), 'idx_create_time'),
+        ('登录用户查询', 'kb',
+         *_registered(STMT_AUTH_USER_LOOKUP, ('admin', 'admin')), None),
+        ('今日登录次数', 'kb',
+         "SELECT COUNT(*) FROM mgmt_login_logs "
+         "WHERE login_time >= CURDATE() AND login_time < CURDATE() + INTERVAL 1 DAY",
+         (), 'idx_login_time'),
+        ('成功登录次数', 'kb',
+         "SELECT COUNT(*) FROM mgmt_login_logs WHERE status = %s", ('success',), None),
+        ('最近登录记录', 'kb',
+         "SELECT id, username, login_time FROM mgmt_login_logs ORDER BY login_time DESC LIMIT 20",
+         (), 'idx_login_time'),
+        ('工单消息: 最新 N 条', 'case',
+         *_registered(STMT_MESSAGES_LATEST, ('TK-0', 51)), None),
+        ('工单消息: 增量同步', 'case',
+         *_registered(STMT_MESSAGES_AFTER, ('TK-0', 1000, 51)), None),
+        ('工单消息: 摘要', 'case',
+         *_registered(STMT_MESSAGES_SUMMARY, ('TK-0',)), None),
+        ('官网留言: 按状态', 'home',
+         *ContactMessageService.build_list_query('pending', None, 20), 'idx_status_created_at'),
+        ('官网留言: 按状态翻页', 'home',
+         *ContactMessageService.build_list_query('pending', (now, 1000), 20), 'idx_status_created_at'),
+        ('官网留言: 全部', 'home',
+         *ContactMessageService.build_list_query(None, None, 20), 'idx_created_at'),
+    ]
+    return cases
+
+
+def explain(db_name, sql, params):
+    """执行 EXPLAIN，返回执行计划行"""
+    with db_connection(db_name) as conn:
+        with conn.cursor() as cursor:
+            cursor.execute('EXPLAIN ' + sql, params)
+            return list(cursor.fetchall())
+
+
+def check_plan(plan, expected_key):
+    """检查执行计划，返回问题列表"""
+    problems = []
+    for row in plan:
+        table = row.get('table')
+        access = (row.get('type') or '').upper()
+        key = row.get('key')
+        extra = row.get('Extra') or ''
+        if access == 'ALL':
+            problems.append(f"{table}: 全表扫描")
+        if 'filesort' in extra:
+            problems.append(f"{table}: 文件排序 (Using filesort)")
+        if expected_key and key and expected_key not in key.split(','):
+            problems.append(f"{table}: 使用索引 {key}，预期 {expected_key}")
+        if expected_key and not key:
+            problems.append(f"{table}: 未使用索引，预期 {expected_key}")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description='热点查询执行计划检查')
+    parser.add_argument('--strict', action='store_true', help='存在问题时返回非零退出码')
+    args = parser.parse_args()
+
+    print("=" * 100)
+    print("热点查询执行计划检查")
+    print("=" * 100)
+
+    issues = 0
+    for label, db_name, sql, params, expected_key in build_cases():
+        print(f"\n[{label}] ({db_name})")
+        print(f"  SQL: {' '.join(sql.split())[:120]}")
+        try:
+            plan = explain(db_name, sql, params)
+        except Exception as e:
+            print(f"  ✗ EXPLAIN 失败: {e}")
+            issues += 1
+            continue
+
+        for row in plan:
+            print(f"  table={row.get('table')} type={row.get('type')} key={row.get('key')} "
+                  f"rows={row.get('rows')} extra={row.get('Extra') or ''}")
+
+        problems = check_plan(plan, expected_key)
+        if problems:
+            issues += 1
+            for problem in problems:
+                print(f"  ⚠️ {problem}")
+        else:
+            print("  ✓ 执行计划正常")
+
+    print("\n" + "=" * 100)
+    if issues:
+        print(f"发现 {issues} 条查询执行计划异常（数据量很小时优化器可能选择全表扫描，请结合 rows 判断）")
+    else:
+        print("✓ 所有热点查询均命中索引")
+    print("=" * 100)
+
+    return 1 if issues and args.strict else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
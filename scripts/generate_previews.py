@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+工单图片附件预览补生成脚本
+为尚未生成预览的图片附件生成 WebP 缩略图和响应式尺寸：
+- scripts/backfill_attachments.py 补录的旧附件（preview_status 为空）
+- 进程重启前未处理完的附件（pending）
+- --retry-failed 时包括生成失败的附件
+
+用法:
+    python scripts/generate_previews.py --dry-run
+    python scripts/generate_previews.py --workers 4 --retry-failed
+"""
+
+import argparse
+import sys
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+
+# 设置输出编码为 UTF-8
+if sys.platform == 'win32':
+    import io
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
+    sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8')
+
+# 添加项目根目录到 Python 路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from common.database_context import db_connection
+from services.attachment_service import PREVIEW_MIME_TYPES
+from services.preview_service import ImagePreviewService
+
+
+def main():
+    parser = argparse.ArgumentParser(description='工单图片附件预览补生成')
+    parser.add_argument('--workers', type=int, default=2, help='并发线程数')
+    parser.add_argument('--retry-failed', action='store_true', help='重新处理生成失败的附件')
+    parser.add_argument('--limit', type=int, default=0, help='最多处理的附件数，0 为不限')
+    parser.add_argument('--dry-run', action='store_true', help='只统计，不生成')
+    args = parser.parse_args()
+
+    statuses = "preview_status IS NULL OR preview_status = 'pending'"
+    if args.retry_failed:
+        statuses += " OR preview_status = 'failed'"
+    placeholders = ', '.join(['%s'] * len(PREVIEW_MIME_TYPES))
+    sql = f"""
+        SELECT id, filename FROM attachments
+        WHERE mime_type IN ({placeholders}) AND ({statuses})
+        ORDER BY id
+    """
+    if args.limit:
+        sql += f" LIMIT {int(args.limit)}"
+
+    with db_connection('case') as conn:
+        cursor = conn.cursor()
+        cursor.execute(sql, sorted(PREVIEW_MIME_TYPES))
+        pending = cursor.fetchall()
+
+    print(f"待生成预览的图片附件: {len(pending)}")
+    if args.dry_run or not pending:
+        return 0
+
+    failed = 0
+    with ThreadPoolExecutor(max_workers=args.workers) as executor:
+        futures = {executor.submit(ImagePreviewService.generate, row['id']): row for row in pending}
+        for future in as_completed(futures):
+            row = futures[future]
+            try:
+                variants = future.result()
+                print(f"✓ {row['id']} {row['filename']}: {', '.join(variants)}")
+            except Exception as e:
+                failed += 1
+                ImagePreviewService.mark_status(row['id'], 'failed', None)
+                print(f"✗ {row['id']} {row['filename']}: {e}")
+
+    print(f"\n完成: 成功 {len(pending) - failed}，失败 {failed}")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+本地 SMTP 调试服务器
+接收邮件并打印到控制台，不实际投递，用于开发环境验证邮件通知（需要 pip install aiosmtpd）
+
+用法:
+    python scripts/mail_debug_server.py                     # 监听 127.0.0.1:1025
+    python scripts/mail_debug_server.py --port 2525
+
+.env 中配置:
+    SMTP_SERVER=127.0.0.1
+    SMTP_PORT=1025
+    SMTP_USERNAME=
+"""
+
+import argparse
+import sys
+import time
+from email import message_from_bytes, policy
+
+# 设置输出编码为 UTF-8
+if sys.platform == 'win32':
+    import io
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
+    sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8')
+
+try:
+    from aiosmtpd.controller import Controller
+except ImportError:
+    print("✗ 未安装 aiosmtpd，请执行: pip install aiosmtpd")
+    sys.exit(1)
+
+
+class PrintHandler:
+    """打印收到的邮件"""
+
+    async def handle_DATA(self, server, session, envelope):
+        message = message_from_bytes(envelope.content, policy=policy.default)
+        body = message.get_body(preferencelist=('plain', 'html'))
+        print('=' * 60)
+        print(f"发件人: {envelope.mail_from}")
+        print(f"收件人: {', '.join(envelope.rcpt_tos)}")
+        print(f"主题: {message['subject']}")
+        print('-' * 60)
+        print(body.get_content() if body else '')
+        return '250 Message accepted for delivery'
+
+
+def main():
+    parser = argparse.ArgumentParser(description='本地 SMTP 调试服务器')
+    parser.add_argument('--host', default='127.0.0.1', help='监听地址')
+    parser.add_argument('--port', type=int, default=1025, help='监听端口')
+    args = parser.parse_args()
+
+    controller = Controller(PrintHandler(), hostname=args.host, port=args.port)
+    controller.start()
+    print(f"✓ SMTP 调试服务器已启动: {args.host}:{args.port}（Ctrl+C 退出）")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        controller.stop()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+邮件发件箱管理脚本
+查看发件箱状态、立即发送到期邮件、重新发送失败的邮件；
+应用内发送线程关闭（MAIL_OUTBOX_ENABLED=False）时可由 cron 定时执行 --send-once
+
+用法:
+    python scripts/mail_outbox.py --status                  # 各状态邮件数
+    python scripts/mail_outbox.py --send-once               # 发送一批到期的邮件
+    python scripts/mail_outbox.py --test you@example.com    # 写入一封测试邮件并立即发送
+    python scripts/mail_outbox.py --retry-failed            # 失败的邮件重新加入队列
+"""
+
+import argparse
+import sys
+from pathlib import Path
+
+# 设置输出编码为 UTF-8
+if sys.platform == 'win32':
+    import io
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
+    sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8')
+
+# 添加项目根目录到 Python 路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from services.mail_service import MailService, get_sender
+
+
+def main():
+    parser = argparse.ArgumentParser(description='邮件发件箱管理')
+    parser.add_argument('--status', action='store_true', help='查看发件箱状态')
+    parser.add_argument('--send-once', action='store_true', help='发送一批到期的邮件')
+    parser.add_argument('--test', metavar='ADDR', help='写入一封测试邮件并立即发送')
+    parser.add_argument('--retry-failed', action='store_true', help='将发送失败的邮件重新加入队列')
+    args = parser.parse_args()
+
+    if not (args.status or args.send_once or args.test or args.retry_failed):
+        args.status = True
+
+    if args.retry_failed:
+        print(f"✓ 已重新加入队列: {MailService.retry_failed()} 封")
+
+    if args.test:
+        MailService.enqueue(args.test, '[测试] 邮件发送测试', '这是一封测试邮件，收到说明 SMTP 配置正确。',
+                            category='test')
+        args.send_once = True
+
+    if args.send_once:
+        result = get_sender().send_pending()
+        if result['skipped']:
+            print("✗ 发送任务正在其他进程中执行")
+            return 1
+        if result['unavailable']:
+            print("✗ SMTP 连接或登录失败，邮件保留在发件箱中（详见日志）")
+        print(f"✓ 成功 {result['sent']}，稍后重试 {result['retried']}，失败 {result['failed']}")
+
+    if args.status:
+        stats = MailService.get_stats()
+        for status in ('pending', 'sent', 'failed'):
+            print(f"{status:<8} {stats['by_status'].get(status, 0)}")
+        if stats['next_attempt_at']:
+            print(f"下次发送时间: {stats['next_attempt_at']}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
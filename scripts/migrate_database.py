@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+数据库迁移脚本
+按版本顺序执行 database/patches 下的补丁，并在 schema_migrations 表中记录已执行的补丁
+
+- 补丁目录命名为 vX.Y_to_vX.Z，目录内补丁文件命名为 NNN_description.sql
+- 按 (起始版本, 文件序号) 排序执行，已记录的补丁自动跳过
+- 已执行补丁的文件内容发生变化时给出警告（补丁发布后不应再修改）
+- 使用 GET_LOCK 防止多个实例同时执行迁移
+
+用法:
+    python scripts/migrate_database.py              # 执行所有未执行的补丁
+    python scripts/migrate_database.py --status     # 查看补丁执行状态
+    python scripts/migrate_database.py --dry-run    # 只列出将要执行的补丁
+    python scripts/migrate_database.py --baseline v2.1_to_v2.2
+                                                    # 将指定版本及之前的补丁标记为已执行（不实际执行）
+"""
+
+import argparse
+import hashlib
+import re
+import sys
+import time
+from pathlib import Path
+
+# 设置输出编码为 UTF-8
+if sys.platform == 'win32':
+    import io
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
+    sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8')
+
+# 添加项目根目录到 Python 路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+import pymysql
+import config
+
+PATCHES_DIR = project_root / 'database' / 'patches'
+MIGRATION_TABLE = f"`{config.DB_NAME_KB}`.`schema_migrations`"
+LOCK_NAME = 'clouddoors_schema_migration'
+LOCK_TIMEOUT = 30
+
+_VERSION_DIR_RE = re.compile(r'^v(\d+(?:\.\d+)*)_to_v(\d+(?:\.\d+)*)$')
+_PATCH_FILE_RE = re.compile(r'^(\d{3})_.+\.sql$')
+
+
+def discover_patches():
+    """
+    扫描补丁目录
+
+    Returns:
+        list[dict]: 按执行顺序排列的补丁 {'version', 'path', 'checksum'}
+    """
+    patches = []
+    for version_dir in PATCHES_DIR.iterdir():
+        match = _VERSION_DIR_RE.match(version_dir.name)
+        if not version_dir.is_dir() or not match:
+            continue
+        from_version = tuple(int(part) for part in match.group(1).split('.'))
+        for patch_file in version_dir.iterdir():
+            if not _PATCH_FILE_RE.match(patch_file.name):
+                continue
+            content = patch_file.read_bytes()
+            patches.append({
+                'order': (from_version, patch_file.name),
+                'version': f"{version_dir.name}/{patch_file.stem}",
+                'path': patch_file,
+                'checksum': hashlib.sha256(content).hexdigest(),
+            })
+    patches.sort(key=lambda p: p['order'])
+    return patches
+
+
+def split_statements(sql):
+    """
+    将补丁文件拆分为单条语句
+
+    按分号拆分，忽略引号内和注释中的分号
+    """
+    statements = []
+    current = []
+    quote = None
+    i = 0
+    length = len(sql)
+    while i < length:
+        ch = sql[i]
+        if quote:
+            current.append(ch)
+            if ch == '\\' and i + 1 < length:
+                current.append(sql[i + 1])
+                i += 2
+                continue
+            if ch == quote:
+                quote = None
+        elif ch in ('"', "'", '`'):
+            quote = ch
+            current.append(ch)
+        elif sql.startswith('--', i) or ch == '#':
+            # 单行注释，跳到行尾
+            end = sql.find('\n', i)
+            i = length if end == -1 else end
+            continue
+        elif sql.startswith('/*', i):
+            end = sql.find('*/', i + 2)
+            i = length if end == -1 else end + 2
+            continue
+        elif ch == ';':
+            statement = ''.join(current).strip()
+            if statement:
+                statements.append(statement)
+            current = []
+        else:
+            current.append(ch)
+        i += 1
+
+    statement = ''.join(current).strip()
+    if statement:
+        statements.append(statement)
+    return statements
+
+
+def get_connection():
+    """连接数据库服务器（不指定默认数据库，补丁中通过 USE 切换）"""
+    return pymysql.connect(
+        host=config.DB_HOST,
+        port=config.DB_PORT,
+        user=config.DB_USER,
+        password=config.DB_PASSWORD,
+        charset='utf8mb4',
+        autocommit=True,
+    )
+
+
+def ensure_migration_table(cursor):
+    """创建迁移记录表"""
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {MIGRATION_TABLE} (
+            `version` VARCHAR(191) NOT NULL PRIMARY KEY COMMENT '补丁标识: 版本目录/文件名',
+            `checksum` CHAR(64) NOT NULL COMMENT '补丁文件 SHA-256',
+            `applied_at` DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP COMMENT '执行时间',
+            `execution_ms` INT NOT NULL DEFAULT 0 COMMENT '执行耗时(毫秒)',
+            `baseline` TINYINT(1) NOT NULL DEFAULT 0 COMMENT '是否仅标记未实际执行'
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='数据库补丁执行记录'
+    """)
+
+
+def get_applied(cursor):
+    """获取已执行补丁 {version: checksum}"""
+    cursor.execute(f"SELECT version, checksum FROM {MIGRATION_TABLE}")
+    return {version: checksum for version, checksum in cursor.fetchall()}
+
+
+def record_migration(cursor, patch, execution_ms, baseline=False):
+    cursor.execute(
+        f"INSERT INTO {MIGRATION_TABLE} (version, checksum, execution_ms, baseline) VALUES (%s, %s, %s, %s)",
+        (patch['version'], patch['checksum'], execution_ms, 1 if baseline else 0)
+    )
+
+
+def apply_patch(cursor, patch):
+    """执行单个补丁文件，返回耗时（毫秒）"""
+    sql = patch['path'].read_text(encoding='utf-8')
+    start = time.perf_counter()
+    for statement in split_statements(sql):
+        cursor.execute(statement)
+        # 补丁中的 SELECT / SHOW 仅用于人工查看，读取结果后丢弃
+        while True:
+            cursor.fetchall()
+            if not cursor.nextset():
+                break
+    return int((time.perf_counter() - start) * 1000)
+
+
+def print_status(patches, applied):
+    print(f"{'状态':<8}{'补丁':<60}")
+    print("-" * 68)
+    for patch in patches:
+        checksum = applied.get(patch['version'])
+        if checksum is None:
+            state = '待执行'
+        elif checksum != patch['checksum']:
+            state = '已修改'
+        else:
+            state = '已执行'
+        print(f"{state:<8}{patch['version']:<60}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='数据库补丁迁移工具')
+    parser.add_argument('--status', action='store_true', help='查看补丁执行状态')
+    parser.add_argument('--dry-run', action='store_true', help='只列出将要执行的补丁')
+    parser.add_argument('--baseline', metavar='VERSION_DIR',
+                        help='将该版本目录及之前的补丁标记为已执行（用于已手动升级的数据库）')
+    args = parser.parse_args()
+
+    patches = discover_patches()
+    if not patches:
+        print(f"未找到补丁: {PATCHES_DIR}")
+        return 0
+
+    try:
+        conn = get_connection()
+    except Exception as e:
+        print(f"错误: 数据库连接失败: {e}")
+        return 1
+
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT GET_LOCK(%s, %s)", (LOCK_NAME, LOCK_TIMEOUT))
+            if cursor.fetchone()[0] != 1:
+                print("错误: 其他实例正在执行迁移，请稍后重试")
+                return 1
+
+            try:
+                ensure_migration_table(cursor)
+                applied = get_applied(cursor)
+
+                if args.status:
+                    print_status(patches, applied)
+                    return 0
+
+                for patch in patches:
+                    checksum = applied.get(patch['version'])
+                    if checksum is not None and checksum != patch['checksum']:
+                        print(f"⚠️ 警告: 已执行的补丁内容已修改: {patch['version']}")
+
+                if args.baseline:
+                    names = [p['path'].parent.name for p in patches]
+                    if args.baseline not in names:
+                        print(f"错误: 未找到版本目录 {args.baseline}")
+                        return 1
+                    last = max(i for i, name in enumerate(names) if name == args.baseline)
+                    for patch in patches[:last + 1]:
+                        if patch['version'] not in applied:
+                            record_migration(cursor, patch, 0, baseline=True)
+                            print(f"✓ 标记为已执行: {patch['version']}")
+                    return 0
+
+                pending = [p for p in patches if p['version'] not in applied]
+                if not pending:
+                    print("✓ 数据库已是最新版本")
+                    return 0
+
+                for patch in pending:
+                    if args.dry_run:
+                        print(f"待执行: {patch['version']}")
+                        continue
+                    print(f"执行补丁: {patch['version']} ...", end=' ', flush=True)
+                    try:
+                        execution_ms = apply_patch(cursor, patch)
+                    except Exception as e:
+                        print("失败")
+                        print(f"错误: {e}")
+                        print("补丁应保证幂等，修复问题后重新运行本脚本即可")
+                        return 1
+                    record_migration(cursor, patch, execution_ms)
+                    print(f"完成 ({execution_ms}ms)")
+            finally:
+                cursor.execute("SELECT RELEASE_LOCK(%s)", (LOCK_NAME,))
+                cursor.fetchall()
+    finally:
+        conn.close()
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
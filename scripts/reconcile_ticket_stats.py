@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+工单统计计数核对脚本
+将 ticket_stat_counters / ticket_daily_stats 与 tickets 表核对并修正偏差，
+应用内后台核对关闭（TICKET_STATS_RECONCILE_INTERVAL=0）时可由 cron 定时执行
+
+用法:
+    python scripts/reconcile_ticket_stats.py --dry-run    # 只报告偏差，不修正
+    python scripts/reconcile_ticket_stats.py
+"""
+
+import argparse
+import sys
+from pathlib import Path
+
+# 设置输出编码为 UTF-8
+if sys.platform == 'win32':
+    import io
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
+    sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8')
+
+# 添加项目根目录到 Python 路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from services.stats_service import TicketStatsService
+
+
+def main():
+    parser = argparse.ArgumentParser(description='工单统计计数核对')
+    parser.add_argument('--dry-run', action='store_true', help='只报告偏差，不修正')
+    args = parser.parse_args()
+
+    result = TicketStatsService.reconcile(dry_run=args.dry_run)
+    print(f"核对计数项: {result['checked']}")
+    for item in result['drift']:
+        print(f"  偏差 {item['key']}: 计数 {item['current']}，实际 {item['expected']}")
+    if not result['drift']:
+        print("✓ 计数与工单表一致")
+    elif args.dry_run:
+        print("以上偏差未修正（--dry-run）")
+    else:
+        print(f"✓ 已修正 {result['corrected']} 项")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
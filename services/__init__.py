@@ -3,5 +3,7 @@
 包含所有业务逻辑服务
 """
 from services.user_service import UserService
+from services.ticket_service import TicketService
+from services.message_service import MessageService
 
-__all__ = ['UserService']
+__all__ = ['UserService', 'TicketService', 'MessageService']
@@ -0,0 +1,265 @@
+"""
+工单归档服务类
+关闭超过 TICKET_ARCHIVE_AFTER_DAYS 天的工单连同消息移入 tickets_archive / messages_archive，
+工单列表等按 status、submit_user 的查询只扫描活跃数据：
+
+- 按批次归档，每批一个事务：加锁确认仍满足条件后复制到归档表，再从活跃表删除；
+  已读游标随之删除，附件和检索索引保留（附件按 ticket_id 关联，检索同时查询归档表）
+- 工单详情、消息、附件下载在活跃表中找不到时读取归档表，归档工单只读，不能再发送消息
+- 通过 MySQL 命名锁保证多 worker、后台线程和脚本同一时间只有一个归档任务在执行
+- 统计计数不受影响（归档的工单仍计入），核对时同时统计归档表
+
+tickets.ticket_id 为唯一键，MySQL 分区表要求分区列包含在每个唯一键中，
+因此不按 create_time 分区，而是使用独立的归档表
+"""
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+import config
+from common.database_context import db_connection
+from common.logger import logger
+
+
+# 归档表以 ticket_id / (ticket_id, id) 为主键，id 只保留原值：MySQL 5.7 / MariaDB 10.2.4 之前重启后
+# 自增值按当前最大 id 重新计算，已归档的 id 可能被新记录重用。恢复时不写回原 id，由活跃表重新分配
+TICKET_DATA_COLUMNS = ('ticket_id, customer_name, customer_contact_name, customer_contact, customer_email, '
+                       'submit_user, product, issue_type, priority, title, content, resolution, status, assignee, '
+                       'create_time, update_time')
+TICKET_COLUMNS = f'id, {TICKET_DATA_COLUMNS}'
+MESSAGE_DATA_COLUMNS = 'ticket_id, sender, sender_name, content, send_time'
+MESSAGE_COLUMNS = f'id, {MESSAGE_DATA_COLUMNS}'
+
+ARCHIVE_LOCK_NAME = 'casedb.ticket_archive'
+
+DATETIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+_scheduler_thread: Optional[threading.Thread] = None
+_scheduler_lock = threading.Lock()
+
+
+class TicketArchiveService:
+    """工单归档服务类"""
+
+    @staticmethod
+    def get_ticket(ticket_id: str, columns: str = '*') -> Optional[Dict[str, Any]]:
+        """
+        查询工单（活跃表中没有时查询归档表）
+
+        Returns:
+            dict: 工单，archived 表示是否已归档；不存在时返回 None
+        """
+        with db_connection('case') as conn:
+            cursor = conn.cursor()
+            cursor.execute(f"SELECT {columns} FROM tickets WHERE ticket_id = %s", (ticket_id,))
+            ticket = cursor.fetchone()
+            if ticket:
+                ticket['archived'] = False
+                return ticket
+            archive_columns = columns if columns == '*' else f'{columns}, archived_at'
+            cursor.execute(f"SELECT {archive_columns} FROM tickets_archive WHERE ticket_id = %s", (ticket_id,))
+            ticket = cursor.fetchone()
+        if ticket:
+            ticket['archived'] = True
+        return ticket
+
+    @staticmethod
+    def is_archived(ticket_id: str) -> bool:
+        with db_connection('case') as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT 1 FROM tickets_archive WHERE ticket_id = %s", (ticket_id,))
+            return cursor.fetchone() is not None
+
+    @staticmethod
+    def cutoff(days: Optional[int] = None) -> str:
+        days = config.TICKET_ARCHIVE_AFTER_DAYS if days is None else days
+        return (datetime.now() - timedelta(days=days)).strftime(DATETIME_FORMAT)
+
+    @staticmethod
+    def find_candidates(cutoff: str, limit: int) -> List[str]:
+        """关闭（最后更新）时间早于 cutoff 的工单，按 (status, update_time) 索引扫描"""
+        with db_connection('case') as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                """
+                SELECT ticket_id FROM tickets
+                WHERE status = 'closed' AND update_time < %s
+                ORDER BY update_time LIMIT %s
+                """,
+                (cutoff, limit)
+            )
+            return [row['ticket_id'] for row in cursor.fetchall()]
+
+    @staticmethod
+    def count_candidates(cutoff: str) -> int:
+        with db_connection('case') as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                "SELECT COUNT(*) AS candidates FROM tickets WHERE status = 'closed' AND update_time < %s",
+                (cutoff,)
+            )
+            return int((cursor.fetchone() or {}).get('candidates') or 0)
+
+    @staticmethod
+    def archive_batch(ticket_ids: List[str], cutoff: str) -> Dict[str, int]:
+        """
+        在一个事务内归档一批工单
+
+        复制前加锁重新确认条件，期间被重新打开的工单跳过。INSERT ... SELECT 对源消息加锁，
+        归档提交前同一工单的新消息写入会等待，不会在复制和删除之间丢失
+
+        Returns:
+            dict: tickets、messages 归档数量
+        """
+        if not ticket_ids:
+            return {'tickets': 0, 'messages': 0}
+        now = datetime.now().strftime(DATETIME_FORMAT)
+        with db_connection('case') as conn:
+            cursor = conn.cursor()
+            placeholders = ', '.join(['%s'] * len(ticket_ids))
+            cursor.execute(
+                f"""
+                SELECT ticket_id FROM tickets
+                WHERE ticket_id IN ({placeholders}) AND status = 'closed' AND update_time < %s
+                ORDER BY ticket_id FOR UPDATE
+                """,
+                list(ticket_ids) + [cutoff]
+            )
+            ids = [row['ticket_id'] for row in cursor.fetchall()]
+            if not ids:
+                conn.rollback()
+                return {'tickets': 0, 'messages': 0}
+
+            placeholders = ', '.join(['%s'] * len(ids))
+            cursor.execute(
+                f"""
+                INSERT INTO tickets_archive ({TICKET_COLUMNS}, archived_at)
+                SELECT {TICKET_COLUMNS}, %s FROM tickets WHERE ticket_id IN ({placeholders})
+                """,
+                [now] + ids
+            )
+            archived_tickets = cursor.rowcount
+            cursor.execute(
+                f"""
+                INSERT INTO messages_archive ({MESSAGE_COLUMNS})
+                SELECT {MESSAGE_COLUMNS} FROM messages WHERE ticket_id IN ({placeholders})
+                """,
+                ids
+            )
+            archived_messages = cursor.rowcount
+            cursor.execute(f"DELETE FROM messages WHERE ticket_id IN ({placeholders})", ids)
+            cursor.execute(f"DELETE FROM ticket_read_cursors WHERE ticket_id IN ({placeholders})", ids)
+            cursor.execute(f"DELETE FROM tickets WHERE ticket_id IN ({placeholders})", ids)
+            conn.commit()
+
+        return {'tickets': archived_tickets, 'messages': archived_messages}
+
+    @staticmethod
+    def run(days: Optional[int] = None, limit: Optional[int] = None, dry_run: bool = False) -> Dict[str, Any]:
+        """
+        执行归档
+
+        Args:
+            days: 关闭超过多少天的工单归档，默认 TICKET_ARCHIVE_AFTER_DAYS
+            limit: 本次最多归档的工单数，默认不限
+            dry_run: 只统计待归档的工单
+
+        Returns:
+            dict: cutoff、candidates（dry_run 时）、tickets、messages、batches、skipped（其他任务正在执行）
+        """
+        cutoff = TicketArchiveService.cutoff(days)
+        batch_size = config.TICKET_ARCHIVE_BATCH_SIZE
+        result = {'cutoff': cutoff, 'tickets': 0, 'messages': 0, 'batches': 0, 'skipped': False}
+
+        if dry_run:
+            candidates = TicketArchiveService.count_candidates(cutoff)
+            result['candidates'] = candidates if limit is None else min(candidates, limit)
+            return result
+
+        # 命名锁绑定在连接上，整个归档过程保持这个连接
+        with db_connection('case') as lock_conn:
+            lock_cursor = lock_conn.cursor()
+            lock_cursor.execute("SELECT GET_LOCK(%s, 0) AS locked", (ARCHIVE_LOCK_NAME,))
+            if not (lock_cursor.fetchone() or {}).get('locked'):
+                logger.info("工单归档任务正在其他进程中执行，跳过")
+                result['skipped'] = True
+                return result
+            try:
+                started = time.time()
+                while limit is None or result['tickets'] < limit:
+                    size = batch_size if limit is None else min(batch_size, limit - result['tickets'])
+                    ticket_ids = TicketArchiveService.find_candidates(cutoff, size)
+                    if not ticket_ids:
+                        break
+                    archived = TicketArchiveService.archive_batch(ticket_ids, cutoff)
+                    result['batches'] += 1
+                    result['tickets'] += archived['tickets']
+                    result['messages'] += archived['messages']
+                    if archived['tickets'] == 0:
+                        break
+            finally:
+                lock_cursor.execute("SELECT RELEASE_LOCK(%s)", (ARCHIVE_LOCK_NAME,))
+
+        if result['tickets']:
+            logger.info(f"工单归档完成: {result['tickets']} 个工单、{result['messages']} 条消息，"
+                        f"{result['batches']} 批，耗时 {time.time() - started:.1f}s（截止 {cutoff}）")
+        return result
+
+    @staticmethod
+    def restore_ticket(ticket_id: str) -> bool:
+        """
+        将归档工单恢复到活跃表（需要重新打开或补充处理时使用）
+
+        工单和消息在活跃表中重新分配 id（原 id 可能已被新记录占用）
+
+        Returns:
+            bool: 是否恢复
+        """
+        with db_connection('case') as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT ticket_id FROM tickets_archive WHERE ticket_id = %s FOR UPDATE", (ticket_id,))
+            if not cursor.fetchone():
+                conn.rollback()
+                return False
+            cursor.execute(
+                f"INSERT INTO tickets ({TICKET_DATA_COLUMNS}) "
+                f"SELECT {TICKET_DATA_COLUMNS} FROM tickets_archive WHERE ticket_id = %s",
+                (ticket_id,)
+            )
+            # 按原 id 顺序重新分配自增 id，消息先后顺序不变
+            cursor.execute(
+                f"INSERT INTO messages ({MESSAGE_DATA_COLUMNS}) "
+                f"SELECT {MESSAGE_DATA_COLUMNS} FROM messages_archive WHERE ticket_id = %s ORDER BY id",
+                (ticket_id,)
+            )
+            cursor.execute("DELETE FROM messages_archive WHERE ticket_id = %s", (ticket_id,))
+            cursor.execute("DELETE FROM tickets_archive WHERE ticket_id = %s", (ticket_id,))
+            conn.commit()
+        logger.info(f"归档工单已恢复: {ticket_id}")
+        return True
+
+    @staticmethod
+    def _schedule_loop(interval: int):
+        while True:
+            try:
+                TicketArchiveService.run()
+            except Exception as e:
+                logger.error(f"工单归档失败：{e}")
+            time.sleep(interval)
+
+    @staticmethod
+    def start_scheduler():
+        """
+        启动后台定期归档线程（工单库连接池就绪后调用）
+        TICKET_ARCHIVE_INTERVAL 为 0 时不启动，可改用 scripts/archive_tickets.py 定时执行
+        """
+        global _scheduler_thread
+        interval = config.TICKET_ARCHIVE_INTERVAL
+        if interval <= 0:
+            return
+        with _scheduler_lock:
+            if _scheduler_thread is not None:
+                return
+            _scheduler_thread = threading.Thread(target=TicketArchiveService._schedule_loop, args=(interval,),
+                                                 name='ticket-archive', daemon=True)
+            _scheduler_thread.start()
@@ -0,0 +1,178 @@
+"""
+工单附件服务类
+统一管理工单附件的保存、元数据登记和查询
+
+- 文件内容交给 common.file_storage 的存储后端，按 SHA-256 寻址，相同内容只存一份
+- 附件元数据登记在 attachments 表中，列表按 (ticket_id, id) 索引查询，不再扫描上传目录
+- 下载统一经过 /case/api/attachment/<id>/download 校验权限；
+  storage 为 static 的旧附件仍保存在 static/uploads/case 下
+"""
+import json
+import mimetypes
+import os
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+from werkzeug.utils import secure_filename
+from common.database_context import db_connection
+from common.file_storage import get_storage
+import config
+
+
+LEGACY_STORAGE = 'static'
+LEGACY_ROOT = 'static'
+
+# 上传后在后台生成 WebP 缩略图和响应式尺寸的图片类型（Pillow 可解码的位图）
+PREVIEW_MIME_TYPES = {'image/png', 'image/jpeg', 'image/gif', 'image/bmp', 'image/webp'}
+
+ALLOWED_EXTENSIONS = {'txt', 'pdf', 'png', 'jpg', 'jpeg', 'gif', 'doc', 'docx', 'xls', 'xlsx', 'zip', 'rar'}
+
+DATETIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+ATTACHMENT_COLUMNS = ('id, ticket_id, filename, stored_path, storage, file_size, mime_type, sha256, '
+                      'uploaded_by, upload_time, preview_status, variants')
+
+
+class AttachmentService:
+    """工单附件服务类"""
+
+    @staticmethod
+    def allowed_file(filename: str, extensions=ALLOWED_EXTENSIONS) -> bool:
+        return '.' in filename and filename.rsplit('.', 1)[1].lower() in extensions
+
+    @staticmethod
+    def download_url(attachment_id: int, variant: Optional[str] = None) -> str:
+        """附件下载地址，variant 为缩略图/预览尺寸名称"""
+        url = f'/case/api/attachment/{attachment_id}/download'
+        return f'{url}?variant={variant}' if variant else url
+
+    @staticmethod
+    def needs_preview(mime_type: Optional[str]) -> bool:
+        """是否需要生成图片预览"""
+        return (config.IMAGE_ENABLE_WEBP and config.IMAGE_AUTO_COMPRESS
+                and (mime_type or '').lower() in PREVIEW_MIME_TYPES)
+
+    @staticmethod
+    def save_file(file) -> Dict[str, Any]:
+        """
+        保存上传文件到存储后端（边写边计算哈希，相同内容去重）
+
+        Args:
+            file: werkzeug FileStorage
+
+        Returns:
+            dict: filename, stored_path（存储键）, storage, file_size, mime_type, sha256, deduplicated
+        """
+        return AttachmentService.save_stream(file.stream, file.filename, file.mimetype)
+
+    @staticmethod
+    def save_stream(stream, filename: str, mime_type: Optional[str] = None) -> Dict[str, Any]:
+        """
+        保存数据流到存储后端（分片上传合并时使用）
+
+        Returns:
+            dict: 同 save_file
+        """
+        filename = secure_filename(filename)
+        storage = get_storage()
+        stored = storage.save(stream)
+        return {
+            'filename': filename,
+            'stored_path': stored['key'],
+            'storage': storage.name,
+            'file_size': stored['size'],
+            'mime_type': mime_type or mimetypes.guess_type(filename)[0],
+            'sha256': stored['sha256'],
+            'deduplicated': stored['deduplicated']
+        }
+
+    @staticmethod
+    def add_attachment(cursor, ticket_id: str, info: Dict[str, Any], uploaded_by: Optional[str],
+                       upload_time: Optional[str] = None) -> int:
+        """
+        在调用方事务内登记附件元数据
+
+        Returns:
+            int: 附件ID
+        """
+        cursor.execute(
+            """
+            INSERT INTO attachments (ticket_id, filename, stored_path, storage, file_size, mime_type, sha256,
+                                     uploaded_by, upload_time, preview_status)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+            """,
+            (ticket_id, info['filename'], info['stored_path'], info.get('storage', LEGACY_STORAGE),
+             info['file_size'], info.get('mime_type'), info.get('sha256'), uploaded_by,
+             upload_time or datetime.now().strftime(DATETIME_FORMAT),
+             'pending' if AttachmentService.needs_preview(info.get('mime_type')) else None)
+        )
+        return cursor.lastrowid
+
+    @staticmethod
+    def variants(attachment: Dict[str, Any]) -> Dict[str, Any]:
+        """已生成的预览 {名称: {key, width, height, size}}"""
+        try:
+            return json.loads(attachment.get('variants') or '{}')
+        except ValueError:
+            return {}
+
+    @staticmethod
+    def _format(row: Dict[str, Any]) -> Dict[str, Any]:
+        upload_time = row.get('upload_time')
+        previews = {
+            name: {
+                'url': AttachmentService.download_url(row['id'], name),
+                'width': variant['width'],
+                'height': variant['height'],
+                'size': variant['size']
+            }
+            for name, variant in AttachmentService.variants(row).items()
+        }
+        # 列表优先使用最小的缩略图（小图不会生成比原图更大的尺寸）
+        thumbnail = next((previews[name] for name in ('sm', 'md', 'lg', 'webp') if name in previews), None)
+        return {
+            'id': row['id'],
+            'ticket_id': row['ticket_id'],
+            'filename': row['filename'],
+            'url': AttachmentService.download_url(row['id']),
+            'size': row['file_size'],
+            'mime_type': row['mime_type'],
+            'sha256': row['sha256'],
+            'uploaded_by': row['uploaded_by'],
+            'upload_time': upload_time.strftime(DATETIME_FORMAT) if isinstance(upload_time, datetime) else upload_time,
+            'preview_status': row.get('preview_status'),
+            'previews': previews,
+            'thumbnail_url': thumbnail['url'] if thumbnail else None
+        }
+
+    @staticmethod
+    def list_attachments(ticket_id: str) -> List[Dict[str, Any]]:
+        """按上传顺序返回工单的附件列表"""
+        with db_connection('case') as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                f"SELECT {ATTACHMENT_COLUMNS} FROM attachments WHERE ticket_id = %s ORDER BY id",
+                (ticket_id,)
+            )
+            rows = cursor.fetchall()
+        return [AttachmentService._format(row) for row in rows]
+
+    @staticmethod
+    def get_attachment(attachment_id: int) -> Optional[Dict[str, Any]]:
+        """查询附件元数据（含存储位置）"""
+        with db_connection('case') as conn:
+            cursor = conn.cursor()
+            cursor.execute(f"SELECT {ATTACHMENT_COLUMNS} FROM attachments WHERE id = %s", (attachment_id,))
+            return cursor.fetchone()
+
+    @staticmethod
+    def local_path(attachment: Dict[str, Any], key: Optional[str] = None) -> Optional[str]:
+        """
+        附件（或其预览 key）在本机的文件路径，存储在对象存储中时返回 None
+        """
+        key = key or attachment['stored_path']
+        if attachment['storage'] == LEGACY_STORAGE:
+            return os.path.join(LEGACY_ROOT, *key.split('/'))
+        storage = get_storage(attachment['storage'])
+        if hasattr(storage, 'path'):
+            return storage.path(key)
+        return None
@@ -0,0 +1,366 @@
+"""
+官网留言服务类
+留言写入 clouddoors_db.messages，管理页面按 (created_at, id) 键集分页：
+
+- 提交时只放入内存队列（write-behind），后台线程按批次在一个事务内写入、提交一次，
+  营销活动带来的突发提交不会逐条占用官网库连接；队列满时退化为同步写入
+- 写入时记录每条留言分配到的自增 id；重试和重放前按 id 确认上次是否已提交，
+  只跳过确实已提交的留言（同一秒内内容相同的两条留言都会保留）
+- 重试耗尽或进程退出时未写入的留言（包括后台线程正在写入的批次）落盘到暂存文件，
+  启动时（官网库连接池就绪后）重放
+- 每批留言合并为一封通知邮件写入发件箱，突发提交不会占满邮件限速
+- 列表按 created_at DESC, id DESC 排序，状态过滤使用 (status, created_at, id) 复合索引
+"""
+import atexit
+import json
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+import config
+from common.database_context import db_connection
+from common.logger import logger
+from services.ticket_service import TicketService
+
+
+CONTACT_STATUSES = ('pending', 'processed')
+CONTACT_STATUS_LABELS = {'pending': '待处理', 'processed': '已处理'}
+
+CONTACT_FIELDS = ('name', 'email', 'message', 'created_at', 'status')
+CONTACT_LIST_COLUMNS = 'id, name, email, message, created_at, status'
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+MAX_BULK_MESSAGES = 200
+
+DATETIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# 进程退出时等待后台线程写完当前批次的最长时间（秒）
+DRAIN_TIMEOUT = 5
+
+
+class ContactWriteBehind:
+    """官网留言批量写入队列"""
+
+    def __init__(self):
+        self._queue: queue.Queue = queue.Queue(maxsize=config.CONTACT_WRITE_QUEUE_SIZE)
+        self._thread: Optional[threading.Thread] = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._inflight: List[Dict[str, Any]] = []
+        self._stats = {'queued': 0, 'flushed': 0, 'batches': 0, 'retries': 0, 'spooled': 0}
+
+    def _ensure_started(self):
+        pid = os.getpid()
+        if self._thread is not None and self._pid == pid:
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == pid:
+                return
+            if self._pid is not None and self._pid != pid:
+                # fork 后父进程的队列不能沿用
+                self._queue = queue.Queue(maxsize=config.CONTACT_WRITE_QUEUE_SIZE)
+                self._inflight = []
+            self._pid = pid
+            self._thread = threading.Thread(target=self._run, name='contact-write-behind', daemon=True)
+            self._thread.start()
+            self._replay_spool()
+
+    def submit(self, item: Dict[str, Any]):
+        """提交待写入的留言（已带 created_at、status）"""
+        self._ensure_started()
+        try:
+            self._queue.put(item, timeout=1)
+            self._stats['queued'] += 1
+        except queue.Full:
+            # 队列积压时退化为同步写入，形成背压
+            logger.warning("留言写入队列已满，同步写入")
+            self._flush_with_retry([item])
+
+    def _run(self):
+        batch_size = config.CONTACT_WRITE_BATCH_SIZE
+        interval = config.CONTACT_WRITE_FLUSH_INTERVAL
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + interval
+            while len(batch) < batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            # 记录正在写入的批次，进程退出时由 drain 落盘
+            self._inflight = batch
+            self._flush_with_retry(batch)
+            self._inflight = []
+
+    def _flush_with_retry(self, batch: List[Dict[str, Any]]) -> bool:
+        for attempt in range(config.CONTACT_WRITE_MAX_RETRIES + 1):
+            try:
+                self._flush(batch)
+                return True
+            except Exception as e:
+                if attempt >= config.CONTACT_WRITE_MAX_RETRIES:
+                    logger.error(f"批量写入 {len(batch)} 条留言失败，已达重试上限: {e}")
+                    break
+                self._stats['retries'] += 1
+                delay = min(0.1 * (2 ** attempt), 5)
+                logger.warning(f"批量写入 {len(batch)} 条留言失败，{delay:.1f}s 后重试: {e}")
+                time.sleep(delay)
+        self._spool(batch)
+        return False
+
+    def _flush(self, batch: List[Dict[str, Any]]):
+        with db_connection('home') as conn:
+            cursor = conn.cursor()
+            # 上次尝试已分配 id 的留言：id 存在说明事务已提交（提交时连接中断），否则已回滚需重新写入
+            assigned = [item['id'] for item in batch if item.get('id') is not None]
+            committed = set()
+            if assigned:
+                cursor.execute(
+                    f"SELECT id FROM messages WHERE id IN ({', '.join(['%s'] * len(assigned))})", assigned)
+                committed = {row['id'] for row in cursor.fetchall()}
+            pending = []
+            for item in batch:
+                if item.get('id') not in committed:
+                    item['id'] = None
+                    pending.append(item)
+            # 逐条写入以取得每条留言的 id（多行 INSERT 的自增 id 在 innodb_autoinc_lock_mode=2 下不保证连续）
+            for item in pending:
+                cursor.execute(
+                    f"INSERT INTO messages ({', '.join(CONTACT_FIELDS)}) VALUES (%s, %s, %s, %s, %s)",
+                    tuple(item[field] for field in CONTACT_FIELDS)
+                )
+                item['id'] = cursor.lastrowid
+            conn.commit()
+
+        self._stats['flushed'] += len(pending)
+        self._stats['batches'] += 1
+        # 上次已提交但未发通知的留言一并通知
+        ContactMessageService.notify(batch)
+
+    def _spool(self, batch: List[Dict[str, Any]]):
+        """写库失败的留言落盘，启动时重放"""
+        path = config.CONTACT_WRITE_SPOOL_FILE
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            with open(path, 'a', encoding='utf-8') as f:
+                for item in batch:
+                    f.write(json.dumps(item, ensure_ascii=False) + '\n')
+            self._stats['spooled'] += len(batch)
+            logger.error(f"{len(batch)} 条留言已写入暂存文件 {path}，将在下次启动时重放")
+        except Exception as e:
+            logger.critical(f"留言暂存失败，{len(batch)} 条留言丢失: {e} "
+                            f"emails={[item['email'] for item in batch]}")
+
+    def _replay_spool(self):
+        path = config.CONTACT_WRITE_SPOOL_FILE
+        if not os.path.exists(path):
+            return
+        replay_path = f"{path}.{os.getpid()}.replay"
+        try:
+            os.replace(path, replay_path)
+        except OSError:
+            return  # 其他进程正在重放
+        with open(replay_path, encoding='utf-8') as f:
+            items = [json.loads(line) for line in f if line.strip()]
+        for item in items:
+            self._queue.put(item)
+        os.remove(replay_path)
+        logger.info(f"重放暂存留言 {len(items)} 条")
+
+    def drain(self):
+        """同步写入队列中剩余的留言，后台线程正在写入的批次落盘（进程退出时调用）"""
+        # 先等后台线程写完当前批次；仍在重试的批次落盘，已提交的留言重放时按 id 跳过
+        deadline = time.monotonic() + DRAIN_TIMEOUT
+        while self._inflight and time.monotonic() < deadline:
+            time.sleep(0.05)
+        inflight = self._inflight
+        if inflight:
+            self._spool(inflight)
+        batch = []
+        while True:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        for start in range(0, len(batch), config.CONTACT_WRITE_BATCH_SIZE):
+            self._flush_with_retry(batch[start:start + config.CONTACT_WRITE_BATCH_SIZE])
+
+    def get_stats(self) -> Dict[str, Any]:
+        return dict(self._stats, pending=self._queue.qsize() + len(self._inflight))
+
+
+_writer: Optional[ContactWriteBehind] = None
+_writer_lock = threading.Lock()
+
+
+def get_writer() -> ContactWriteBehind:
+    """获取当前进程的留言写入队列"""
+    global _writer
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                _writer = ContactWriteBehind()
+                atexit.register(_writer.drain)
+    return _writer
+
+
+def start_contact_writer():
+    """启动时重放暂存的留言（官网库连接池就绪回调）"""
+    if os.path.exists(config.CONTACT_WRITE_SPOOL_FILE):
+        get_writer()._ensure_started()
+
+
+def get_writer_stats() -> Optional[Dict[str, Any]]:
+    """留言写入队列统计（本进程尚未提交过留言时返回 None）"""
+    return _writer.get_stats() if _writer is not None else None
+
+
+class ContactMessageService:
+    """官网留言服务类"""
+
+    @staticmethod
+    def submit(name: str, email: str, message: str):
+        """提交留言（放入写入队列，由后台线程写库）"""
+        get_writer().submit({
+            'name': name,
+            'email': email,
+            'message': message,
+            'created_at': datetime.now().strftime(DATETIME_FORMAT),
+            'status': 'pending'
+        })
+
+    @staticmethod
+    def notify(items: List[Dict[str, Any]]):
+        """一批留言合并为一封通知邮件写入发件箱"""
+        from services.mail_service import MailService
+
+        if not config.CONTACT_EMAIL:
+            return
+        if len(items) == 1:
+            subject = f"[官网留言] {items[0]['name']}"
+        else:
+            subject = f"[官网留言] {len(items)} 条新留言"
+        body = '\n\n----------------------------------------\n\n'.join(
+            f"姓名: {item['name']}\n邮箱: {item['email']}\n时间: {item['created_at']}\n\n{item['message']}"
+            for item in items)
+        try:
+            MailService.enqueue(config.CONTACT_EMAIL, subject, body, category='contact')
+        except Exception as e:
+            logger.error(f"留言通知邮件写入发件箱失败：{e}")
+
+    @staticmethod
+    def build_list_query(status: Optional[str], cursor: Optional[Tuple[datetime, int]],
+                         limit: int) -> Tuple[str, tuple]:
+        """
+        组装留言列表查询
+
+        Returns:
+            (sql, params)
+        """
+        conditions = []
+        params: List[Any] = []
+        if status:
+            conditions.append('status = %s')
+            params.append(status)
+        if cursor:
+            cursor_time, cursor_id = cursor
+            conditions.append('(created_at < %s OR (created_at = %s AND id < %s))')
+            params.extend([cursor_time, cursor_time, cursor_id])
+
+        sql = f"SELECT {CONTACT_LIST_COLUMNS} FROM messages"
+        if conditions:
+            sql += ' WHERE ' + ' AND '.join(conditions)
+        sql += ' ORDER BY created_at DESC, id DESC LIMIT %s'
+        params.append(limit + 1)
+        return sql, tuple(params)
+
+    @staticmethod
+    def list_messages(status: Optional[str] = None, cursor: Optional[str] = None,
+                      limit: int = DEFAULT_PAGE_SIZE) -> Dict[str, Any]:
+        """
+        查询留言列表（键集分页）
+
+        Args:
+            status: 状态过滤（pending / processed），为空时返回全部
+            cursor: 上一页返回的 next_cursor
+            limit: 每页数量
+
+        Returns:
+            {'messages': [...], 'next_cursor': str | None, 'has_more': bool, 'limit': int, 'counts': {状态: 数量}}
+
+        Raises:
+            ValueError: 参数不合法
+        """
+        if status and status not in CONTACT_STATUSES:
+            raise ValueError('留言状态值不合法')
+        limit = max(1, min(int(limit or DEFAULT_PAGE_SIZE), MAX_PAGE_SIZE))
+        decoded = TicketService.decode_cursor(cursor) if cursor else None
+        sql, params = ContactMessageService.build_list_query(status, decoded, limit)
+
+        with db_connection('home') as conn:
+            db_cursor = conn.cursor()
+            db_cursor.execute(sql, params)
+            rows = db_cursor.fetchall()
+            db_cursor.execute("SELECT status, COUNT(*) AS total FROM messages GROUP BY status")
+            counts = {row['status']: row['total'] for row in db_cursor.fetchall()}
+
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        next_cursor = None
+        if has_more and rows:
+            last = rows[-1]
+            next_cursor = TicketService.encode_cursor(last['created_at'], last['id'])
+
+        for row in rows:
+            row['created_at'] = row['created_at'].strftime(DATETIME_FORMAT)
+
+        return {
+            'messages': rows,
+            'next_cursor': next_cursor,
+            'has_more': has_more,
+            'limit': limit,
+            'counts': {status: counts.get(status, 0) for status in CONTACT_STATUSES}
+        }
+
+    @staticmethod
+    def bulk_update_status(message_ids: List[int], status: str) -> Dict[str, Any]:
+        """
+        批量修改留言状态
+
+        Returns:
+            dict: updated（已修改数）、not_found（不存在的留言ID）
+
+        Raises:
+            ValueError: 参数不合法
+        """
+        if status not in CONTACT_STATUSES:
+            raise ValueError('留言状态值不合法')
+        if not isinstance(message_ids, list) or not message_ids:
+            raise ValueError('请选择留言')
+        try:
+            ids = sorted({int(message_id) for message_id in message_ids})
+        except (TypeError, ValueError):
+            raise ValueError('留言ID不合法')
+        if len(ids) > MAX_BULK_MESSAGES:
+            raise ValueError(f'单次最多处理 {MAX_BULK_MESSAGES} 条留言')
+
+        placeholders = ', '.join(['%s'] * len(ids))
+        with db_connection('home') as conn:
+            cursor = conn.cursor()
+            cursor.execute(f"SELECT id FROM messages WHERE id IN ({placeholders})", ids)
+            found = {row['id'] for row in cursor.fetchall()}
+            cursor.execute(
+                f"UPDATE messages SET status = %s WHERE id IN ({placeholders}) AND status <> %s",
+                [status] + ids + [status]
+            )
+            updated = cursor.rowcount
+            conn.commit()
+
+        logger.info(f"批量修改留言状态 -> {status}: 共 {len(ids)} 条，修改 {updated} 条")
+        return {'updated': updated, 'not_found': [message_id for message_id in ids if message_id not in found]}
@@ -0,0 +1,103 @@
+"""
+SocketIO 出站事件合并
+
+SOCKETIO_BATCH_WINDOW_MS > 0 时启用：发往同一房间的事件在时间窗口内合并为一个 batch 事件，
+一个 WebSocket 帧（一次系统调用）送达，日志粘贴、批量上传附件等突发场景下帧数大幅减少：
+- 按 (room, skip_sid) 合并，保证跳过发送者的事件不会发给发送者
+- 窗口内只有一个事件时按原事件名发送，客户端无需区分
+- 单房间积压达到 SOCKETIO_BATCH_MAX_EVENTS 时立即发送，不等窗口结束
+- 不做出站确认和重发：连接中断期间丢失的消息由客户端重连后按 after_id 增量同步补齐
+
+合并只减少帧数，不改变压缩：HTTP 长轮询压缩沿用 Engine.IO 默认行为（阈值见 SOCKETIO_COMPRESSION_THRESHOLD），
+WebSocket 帧压缩取决于 WebSocket 服务是否支持 permessage-deflate
+"""
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+import config
+from common.logger import logger
+
+
+BATCH_EVENT = 'batch'
+
+
+class RoomEventBatcher:
+    """按房间合并出站事件"""
+
+    def __init__(self, socketio, window_ms: Optional[float] = None, max_events: Optional[int] = None):
+        self.socketio = socketio
+        self.window = (window_ms if window_ms is not None else config.SOCKETIO_BATCH_WINDOW_MS) / 1000.0
+        self.max_events = max_events or config.SOCKETIO_BATCH_MAX_EVENTS
+        # (room, skip_sid) -> [{'event': ..., 'data': ...}]
+        self._pending: Dict[Tuple[str, Optional[str]], List[Dict[str, Any]]] = {}
+        self._lock = threading.Lock()
+        self._wakeup = None
+        self._started = False
+        self._stats = {'events': 0, 'frames': 0, 'batches': 0}
+
+    @property
+    def enabled(self) -> bool:
+        return self.window > 0
+
+    def _ensure_started(self):
+        if self._started:
+            return
+        with self._lock:
+            if self._started:
+                return
+            # 使用 Engine.IO 按 async_mode 创建的事件对象，eventlet/gevent 下不会阻塞事件循环
+            self._wakeup = self.socketio.server.eio.create_event()
+            self.socketio.start_background_task(self._run)
+            self._started = True
+
+    def emit(self, event: str, data: Any, room: str, skip_sid: Optional[str] = None):
+        """提交事件，窗口结束时合并发送；未启用时直接发送"""
+        if not self.enabled:
+            self.socketio.emit(event, data, to=room, skip_sid=skip_sid)
+            return
+
+        self._ensure_started()
+        key = (room, skip_sid)
+        with self._lock:
+            events = self._pending.setdefault(key, [])
+            events.append({'event': event, 'data': data})
+            self._stats['events'] += 1
+            if len(events) >= self.max_events:
+                ready = self._pending.pop(key)
+            else:
+                ready = None
+        if ready is not None:
+            self._send(key, ready)
+        else:
+            self._wakeup.set()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait()
+            self._wakeup.clear()
+            # 第一个事件到达后再等一个窗口，收集同一窗口内的后续事件
+            self.socketio.sleep(self.window)
+            self.flush()
+
+    def flush(self):
+        """发送所有待合并的事件"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        for key, events in pending.items():
+            self._send(key, events)
+
+    def _send(self, key: Tuple[str, Optional[str]], events: List[Dict[str, Any]]):
+        room, skip_sid = key
+        try:
+            if len(events) == 1:
+                self.socketio.emit(events[0]['event'], events[0]['data'], to=room, skip_sid=skip_sid)
+            else:
+                self.socketio.emit(BATCH_EVENT, {'events': events},
+                                   to=room, skip_sid=skip_sid)
+                self._stats['batches'] += 1
+            self._stats['frames'] += 1
+        except Exception as e:
+            logger.error(f"发送房间 {room} 的 {len(events)} 个事件失败：{e}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self._stats, window_ms=self.window * 1000, pending=sum(len(e) for e in self._pending.values()))
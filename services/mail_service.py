@@ -0,0 +1,477 @@
+"""
+邮件发送服务类
+所有邮件先写入 mail_outbox 表，由后台线程发送，请求处理不等待 SMTP：
+
+- 工单事件的邮件使用业务事务的游标写入，与工单修改一起提交或回滚（事务性发件箱）
+- 同一收件人的通知类邮件（digest）延迟 MAIL_DIGEST_WINDOW 秒，期间的多条通知合并为一封摘要邮件
+- 发送线程复用一个 SMTP 连接（空闲超时后关闭，断开时自动重连），按 MAIL_RATE_LIMIT_PER_MINUTE 限速
+- 发送失败按指数退避重试，超过 MAIL_MAX_ATTEMPTS 次或邮件本身被拒绝（5xx）时标记为 failed
+- 连接、登录 SMTP 失败（服务不可用、密码错误等）与邮件无关：邮件保持 pending、不计入尝试次数，
+  发送线程按指数退避暂停
+- 多 worker 部署时通过 MySQL 命名锁保证同一时间只有一个进程在发送
+
+开发环境可运行 python scripts/mail_debug_server.py 作为本地 SMTP 替身
+"""
+import smtplib
+import threading
+import time
+from datetime import datetime, timedelta
+from email.mime.text import MIMEText
+from email.utils import formataddr
+from typing import Any, Dict, List, Optional
+import config
+from common.database_context import db_connection
+from common.logger import logger
+
+
+DATETIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+SENDER_LOCK_NAME = 'casedb.mail_sender'
+
+MAX_ERROR_LENGTH = 500
+
+# 已发送邮件的保留清理间隔（秒）
+PURGE_INTERVAL = 3600
+
+_sender = None
+_sender_lock = threading.Lock()
+
+
+def _split_recipients(recipients) -> List[str]:
+    if isinstance(recipients, str):
+        recipients = recipients.split(',')
+    return list(dict.fromkeys(r.strip() for r in recipients or () if r and r.strip()))
+
+
+def _from_address() -> str:
+    return config.EMAIL_SENDER or config.SMTP_USERNAME or config.MAIL_DEFAULT_SENDER
+
+
+class MailService:
+    """邮件发送服务类"""
+
+    @staticmethod
+    def enqueue(recipients, subject: str, body: str, category: str = 'general',
+                digest: bool = False, cursor=None) -> int:
+        """
+        写入发件箱
+
+        Args:
+            recipients: 收件人（列表或逗号分隔的字符串），每个收件人一行
+            subject: 主题
+            body: 纯文本正文
+            category: 分类（contact / ticket / sla 等），用于统计和排查
+            digest: 是否合并为摘要邮件（同一收件人在 MAIL_DIGEST_WINDOW 内的通知合并发送）
+            cursor: 业务事务的游标（工单库），传入时随业务事务提交；否则单独提交
+
+        Returns:
+            写入的邮件数
+        """
+        recipients = _split_recipients(recipients)
+        if not recipients:
+            return 0
+        now = datetime.now()
+        send_at = now + timedelta(seconds=config.MAIL_DIGEST_WINDOW) if digest else now
+        rows = [(category, recipient, subject[:255], body, recipient if digest else None,
+                 now.strftime(DATETIME_FORMAT), send_at.strftime(DATETIME_FORMAT))
+                for recipient in recipients]
+        sql = """
+            INSERT INTO mail_outbox (category, recipient, subject, body, digest_key, created_at, next_attempt_at)
+            VALUES (%s, %s, %s, %s, %s, %s, %s)
+        """
+        if cursor is not None:
+            cursor.executemany(sql, rows)
+        else:
+            with db_connection('case') as conn:
+                conn.cursor().executemany(sql, rows)
+                conn.commit()
+        if not digest and _sender is not None:
+            _sender.wake()
+        return len(rows)
+
+    @staticmethod
+    def ticket_url(ticket_id: str) -> str:
+        return f"{config.SITE_URL}/case/ticket/{ticket_id}"
+
+    @staticmethod
+    def notify_ticket_created(cursor, ticket_id: str, title: str, customer_email: str):
+        """工单创建确认（发给客户）"""
+        if not config.MAIL_TICKET_NOTIFICATIONS:
+            return
+        MailService.enqueue(
+            customer_email, f"[工单已受理] {ticket_id} {title}",
+            f"您提交的工单《{title}》已受理，工单编号 {ticket_id}。\n"
+            f"处理进展会通过邮件通知您，也可以随时查看: {MailService.ticket_url(ticket_id)}",
+            category='ticket', cursor=cursor
+        )
+
+    @staticmethod
+    def notify_status_changed(cursor, ticket_ids: List[str], status: str):
+        """工单状态变更通知（发给客户，合并为摘要）"""
+        if not config.MAIL_TICKET_NOTIFICATIONS or not ticket_ids:
+            return
+        from services.ticket_service import STATUS_LABELS
+
+        placeholders = ', '.join(['%s'] * len(ticket_ids))
+        cursor.execute(
+            f"SELECT ticket_id, title, customer_email FROM tickets WHERE ticket_id IN ({placeholders})",
+            list(ticket_ids)
+        )
+        label = STATUS_LABELS.get(status, status)
+        for ticket in cursor.fetchall():
+            MailService.enqueue(
+                ticket['customer_email'], f"[工单{label}] {ticket['ticket_id']} {ticket['title']}",
+                f"您的工单《{ticket['title']}》（{ticket['ticket_id']}）状态已更新为: {label}。\n"
+                f"查看详情: {MailService.ticket_url(ticket['ticket_id'])}",
+                category='ticket', digest=True, cursor=cursor
+            )
+
+    @staticmethod
+    def notify_assigned(cursor, ticket_ids: List[str], assignee: str):
+        """工单分配通知（发给处理人，合并为摘要）"""
+        if not config.MAIL_TICKET_NOTIFICATIONS or not ticket_ids or not assignee:
+            return
+        email = MailService.user_email(assignee)
+        if not email:
+            return
+        placeholders = ', '.join(['%s'] * len(ticket_ids))
+        cursor.execute(
+            f"SELECT ticket_id, title, priority FROM tickets WHERE ticket_id IN ({placeholders})",
+            list(ticket_ids)
+        )
+        for ticket in cursor.fetchall():
+            MailService.enqueue(
+                email, f"[工单分配] {ticket['ticket_id']} {ticket['title']}",
+                f"工单《{ticket['title']}》（{ticket['ticket_id']}，优先级 {ticket['priority']}）已分配给您。\n"
+                f"查看详情: {MailService.ticket_url(ticket['ticket_id'])}",
+                category='ticket', digest=True, cursor=cursor
+            )
+
+    @staticmethod
+    def user_email(username: str) -> Optional[str]:
+        """查询统一用户表中的邮箱"""
+        with db_connection('kb') as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT email FROM `users` WHERE username = %s AND status = 'active'", (username,))
+            row = cursor.fetchone()
+        return (row or {}).get('email') or None
+
+    @staticmethod
+    def get_stats() -> Dict[str, Any]:
+        """发件箱各状态的邮件数及最早待发送时间"""
+        with db_connection('case') as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT status, COUNT(*) AS total FROM mail_outbox GROUP BY status")
+            by_status = {row['status']: row['total'] for row in cursor.fetchall()}
+            cursor.execute("SELECT MIN(next_attempt_at) AS next_attempt_at FROM mail_outbox WHERE status = 'pending'")
+            next_attempt = (cursor.fetchone() or {}).get('next_attempt_at')
+        return {
+            'by_status': by_status,
+            'next_attempt_at': next_attempt.strftime(DATETIME_FORMAT) if isinstance(next_attempt, datetime) else None,
+            'sender': _sender.stats() if _sender is not None else None
+        }
+
+    @staticmethod
+    def retry_failed() -> int:
+        """将发送失败的邮件重新加入队列"""
+        with db_connection('case') as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                "UPDATE mail_outbox SET status = 'pending', attempts = 0, next_attempt_at = %s WHERE status = 'failed'",
+                (datetime.now().strftime(DATETIME_FORMAT),)
+            )
+            count = cursor.rowcount
+            conn.commit()
+        return count
+
+
+class RateLimiter:
+    """令牌桶限速（每分钟 rate 封，允许 rate 封的突发）"""
+
+    def __init__(self, rate_per_minute: int):
+        self.capacity = max(1, rate_per_minute)
+        self.rate = self.capacity / 60.0
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+
+    def wait_time(self) -> float:
+        """取得一个令牌需要等待的秒数（0 表示已取得）"""
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return 0.0
+        return (1 - self._tokens) / self.rate
+
+
+class SmtpUnavailableError(Exception):
+    """连接或登录 SMTP 服务器失败（与具体邮件无关）"""
+
+
+class SmtpConnection:
+    """
+    复用的 SMTP 连接
+
+    465 端口使用 SSL，其他端口在服务器支持时 STARTTLS；未配置 SMTP_USERNAME 时不登录（本地 SMTP 替身）
+    """
+
+    def __init__(self):
+        self._smtp: Optional[smtplib.SMTP] = None
+        self._last_used = 0.0
+
+    def _connect(self) -> smtplib.SMTP:
+        timeout = config.MAIL_SMTP_TIMEOUT
+        if config.SMTP_PORT == 465:
+            smtp = smtplib.SMTP_SSL(config.SMTP_SERVER, config.SMTP_PORT, timeout=timeout)
+        else:
+            smtp = smtplib.SMTP(config.SMTP_SERVER, config.SMTP_PORT, timeout=timeout)
+            smtp.ehlo()
+            if smtp.has_extn('starttls'):
+                smtp.starttls()
+                smtp.ehlo()
+        if config.SMTP_USERNAME:
+            smtp.login(config.SMTP_USERNAME, config.SMTP_PASSWORD)
+        logger.debug(f"SMTP 连接已建立: {config.SMTP_SERVER}:{config.SMTP_PORT}")
+        return smtp
+
+    def send(self, sender: str, recipient: str, message: str):
+        """发送一封邮件，连接已断开时重连一次"""
+        for attempt in range(2):
+            if self._smtp is None:
+                try:
+                    self._smtp = self._connect()
+                except Exception as e:
+                    raise SmtpUnavailableError(f"SMTP 连接失败 {config.SMTP_SERVER}:{config.SMTP_PORT}: {e}") from e
+            try:
+                self._smtp.sendmail(sender, [recipient], message)
+                self._last_used = time.monotonic()
+                return
+            except (smtplib.SMTPServerDisconnected, ConnectionError):
+                self.close()
+                if attempt:
+                    raise
+
+    def close_if_idle(self):
+        if self._smtp is not None and time.monotonic() - self._last_used > config.MAIL_SMTP_IDLE_TIMEOUT:
+            self.close()
+
+    def close(self):
+        if self._smtp is None:
+            return
+        try:
+            self._smtp.quit()
+        except Exception:
+            pass
+        self._smtp = None
+
+
+def _is_permanent(error: Exception) -> bool:
+    """
+    邮件本身被拒绝（收件人被拒绝，或发件人、正文被 5xx 拒绝）时不再重试
+
+    连接、登录阶段的错误（包括 535 认证失败、5xx 欢迎语）在 SmtpConnection.send 中转换为
+    SmtpUnavailableError，不在此列
+    """
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return True
+    if isinstance(error, (smtplib.SMTPSenderRefused, smtplib.SMTPDataError)):
+        return 500 <= error.smtp_code < 600
+    return False
+
+
+class MailSender:
+    """发件箱后台发送"""
+
+    def __init__(self):
+        self._connection = SmtpConnection()
+        self._limiter = RateLimiter(config.MAIL_RATE_LIMIT_PER_MINUTE)
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._last_purge = 0.0
+        # 连续连接 SMTP 失败次数，决定发送线程暂停多久
+        self._unavailable_count = 0
+        self._stats = {'sent': 0, 'retried': 0, 'failed': 0, 'digests': 0, 'unavailable': 0}
+
+    def wake(self):
+        self._wake.set()
+
+    def stats(self) -> Dict[str, int]:
+        return dict(self._stats)
+
+    def _claim(self, cursor, now: str) -> List[Dict[str, Any]]:
+        """取出到期的邮件，摘要邮件连同同一收件人尚未到期的通知一起取出"""
+        cursor.execute(
+            """
+            SELECT id, recipient, subject, body, digest_key, attempts FROM mail_outbox
+            WHERE status = 'pending' AND next_attempt_at <= %s
+            ORDER BY next_attempt_at, id LIMIT %s
+            """,
+            (now, config.MAIL_BATCH_SIZE)
+        )
+        rows = cursor.fetchall()
+        digest_keys = list({row['digest_key'] for row in rows if row['digest_key']})
+        if digest_keys:
+            placeholders = ', '.join(['%s'] * len(digest_keys))
+            seen = {row['id'] for row in rows}
+            cursor.execute(
+                f"""
+                SELECT id, recipient, subject, body, digest_key, attempts FROM mail_outbox
+                WHERE status = 'pending' AND digest_key IN ({placeholders}) ORDER BY id
+                """,
+                digest_keys
+            )
+            rows.extend(row for row in cursor.fetchall() if row['id'] not in seen)
+        return rows
+
+    @staticmethod
+    def _group(rows: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+        groups: Dict[Any, List[Dict[str, Any]]] = {}
+        for row in rows:
+            groups.setdefault(row['digest_key'] or ('single', row['id']), []).append(row)
+        return list(groups.values())
+
+    @staticmethod
+    def _compose(group: List[Dict[str, Any]]) -> MIMEText:
+        if len(group) == 1:
+            subject, body = group[0]['subject'], group[0]['body']
+        else:
+            subject = f"[通知摘要] 您有 {len(group)} 条新通知"
+            body = '\n\n----------------------------------------\n\n'.join(
+                f"{row['subject']}\n\n{row['body']}" for row in group)
+        message = MIMEText(body, 'plain', 'utf-8')
+        message['Subject'] = subject
+        message['From'] = formataddr(('云户科技', _from_address()))
+        message['To'] = group[0]['recipient']
+        return message
+
+    def _mark(self, cursor, ids: List[int], status: str, now: str, attempts: int = 0, error: str = None):
+        placeholders = ', '.join(['%s'] * len(ids))
+        if status == 'sent':
+            cursor.execute(
+                f"UPDATE mail_outbox SET status = 'sent', sent_at = %s, last_error = NULL WHERE id IN ({placeholders})",
+                [now] + ids
+            )
+            return
+        delay = min(config.MAIL_RETRY_BASE_DELAY * (2 ** (attempts - 1)), config.MAIL_RETRY_MAX_DELAY)
+        next_attempt = (datetime.now() + timedelta(seconds=delay)).strftime(DATETIME_FORMAT)
+        cursor.execute(
+            f"""
+            UPDATE mail_outbox SET status = %s, attempts = %s, next_attempt_at = %s, last_error = %s
+            WHERE id IN ({placeholders})
+            """,
+            [status, attempts, next_attempt, (error or '')[:MAX_ERROR_LENGTH]] + ids
+        )
+
+    def send_pending(self) -> Dict[str, int]:
+        """
+        发送一批到期的邮件（持有发送锁时执行）
+
+        Returns:
+            dict: sent、retried、failed 邮件行数，skipped 表示其他进程正在发送，
+            unavailable 表示 SMTP 连接或登录失败（本批未发送的邮件保持 pending）
+        """
+        result = {'sent': 0, 'retried': 0, 'failed': 0, 'skipped': 0, 'unavailable': 0}
+        with db_connection('case') as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT GET_LOCK(%s, 0) AS locked", (SENDER_LOCK_NAME,))
+            if not (cursor.fetchone() or {}).get('locked'):
+                result['skipped'] = 1
+                return result
+            try:
+                now = datetime.now().strftime(DATETIME_FORMAT)
+                rows = self._claim(cursor, now)
+                conn.commit()
+                for group in self._group(rows):
+                    delay = self._limiter.wait_time()
+                    if delay:
+                        # 超出限速，剩余邮件留到下一轮
+                        logger.debug(f"邮件发送达到限速，{delay:.1f}s 后继续")
+                        break
+                    ids = [row['id'] for row in group]
+                    now = datetime.now().strftime(DATETIME_FORMAT)
+                    try:
+                        message = self._compose(group)
+                        self._connection.send(_from_address(), group[0]['recipient'], message.as_string())
+                    except SmtpUnavailableError as e:
+                        # 与邮件无关，剩余邮件保持 pending、不计尝试次数，由发送线程退避后重试
+                        self._connection.close()
+                        result['unavailable'] = 1
+                        logger.warning(f"邮件发送暂停: {e}")
+                        break
+                    except Exception as e:
+                        self._connection.close()
+                        attempts = max(row['attempts'] for row in group) + 1
+                        failed = _is_permanent(e) or attempts >= config.MAIL_MAX_ATTEMPTS
+                        self._mark(cursor, ids, 'failed' if failed else 'pending', now, attempts, str(e))
+                        result['failed' if failed else 'retried'] += len(ids)
+                        logger.warning(f"邮件发送{'失败' if failed else '失败，稍后重试'}: "
+                                       f"{group[0]['recipient']}（第 {attempts} 次）: {e}")
+                    else:
+                        self._mark(cursor, ids, 'sent', now)
+                        result['sent'] += len(ids)
+                        if len(group) > 1:
+                            self._stats['digests'] += 1
+                    conn.commit()
+
+                if time.monotonic() - self._last_purge > PURGE_INTERVAL:
+                    self._last_purge = time.monotonic()
+                    cutoff = datetime.now() - timedelta(days=config.MAIL_OUTBOX_RETENTION_DAYS)
+                    cursor.execute("DELETE FROM mail_outbox WHERE status = 'sent' AND sent_at < %s",
+                                   (cutoff.strftime(DATETIME_FORMAT),))
+                    conn.commit()
+            finally:
+                cursor.execute("SELECT RELEASE_LOCK(%s)", (SENDER_LOCK_NAME,))
+
+        for key in ('sent', 'retried', 'failed', 'unavailable'):
+            self._stats[key] += result[key]
+        if result['sent'] or result['failed']:
+            logger.info(f"邮件发送: 成功 {result['sent']}，重试 {result['retried']}，失败 {result['failed']}")
+        return result
+
+    def _run(self):
+        while True:
+            try:
+                result = self.send_pending()
+            except Exception as e:
+                logger.error(f"发送邮件失败：{e}")
+                result = {}
+            self._connection.close_if_idle()
+            if result.get('unavailable'):
+                # SMTP 不可用时按指数退避暂停，新邮件的唤醒不缩短等待，避免反复连接
+                self._unavailable_count += 1
+                delay = min(config.MAIL_RETRY_BASE_DELAY * (2 ** (self._unavailable_count - 1)),
+                            config.MAIL_RETRY_MAX_DELAY)
+                logger.warning(f"SMTP 不可用（连续 {self._unavailable_count} 次），{delay}s 后重试")
+                time.sleep(delay)
+                continue
+            self._unavailable_count = 0
+            if result.get('sent') or result.get('retried') or result.get('failed'):
+                continue
+            self._wake.wait(config.MAIL_SEND_INTERVAL)
+            self._wake.clear()
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name='mail-sender', daemon=True)
+        self._thread.start()
+
+
+def get_sender() -> MailSender:
+    global _sender
+    if _sender is None:
+        with _sender_lock:
+            if _sender is None:
+                _sender = MailSender()
+    return _sender
+
+
+def start_mail_sender():
+    """
+    启动后台邮件发送线程（工单库连接池就绪后调用）
+    MAIL_OUTBOX_ENABLED 为 false 时不启动，邮件保留在发件箱中
+    """
+    if not config.MAIL_OUTBOX_ENABLED:
+        return
+    get_sender().start()
@@ -0,0 +1,460 @@
+"""
+工单消息服务类
+统一管理工单聊天消息查询相关的业务逻辑
+
+消息按自增 id 做键集分页：
+- 首次加载返回最新的 N 条，向上滚动时用 before_id 继续加载更早的消息
+- 轮询/重连时用 after_id 只拉取新增消息
+- InnoDB 二级索引隐含主键，idx_ticket_id 即可覆盖 (ticket_id, id) 的范围扫描和排序
+
+未读数按用户维护在 ticket_read_cursors 表中：
+- 新消息写入时在同一事务内为其他已有游标的用户 unread_count + 1，
+  发送者游标推进到新消息，工单提交人和处理人首次出现时补建游标
+- 列表页一次查询取回可见工单的未读数，不再逐个拉取消息
+
+已归档工单的消息在 messages_archive 中，只读，不能再写入新消息
+"""
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+from common.statement_cache import register_statement, fetch_all, fetch_one
+from common.database_context import db_connection
+from common.logger import logger
+from services.message_writer import batched_enabled, get_writer
+from services.search_service import TicketSearchService
+from services.sla_service import TicketSlaService
+
+
+DEFAULT_MESSAGE_LIMIT = 50
+MAX_MESSAGE_LIMIT = 200
+
+MESSAGE_COLUMNS = 'id, ticket_id, sender, sender_name, content, send_time'
+
+DATETIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# 单次查询未读数的工单数量上限
+MAX_UNREAD_TICKETS = 200
+
+
+# 热点查询（服务端预编译）
+STMT_MESSAGES_LATEST = register_statement(
+    'case.messages_latest', 'case',
+    f"SELECT {MESSAGE_COLUMNS} FROM messages WHERE ticket_id = %s ORDER BY id DESC LIMIT %s"
+)
+STMT_MESSAGES_BEFORE = register_statement(
+    'case.messages_before', 'case',
+    f"SELECT {MESSAGE_COLUMNS} FROM messages WHERE ticket_id = %s AND id < %s ORDER BY id DESC LIMIT %s"
+)
+STMT_MESSAGES_AFTER = register_statement(
+    'case.messages_after', 'case',
+    f"SELECT {MESSAGE_COLUMNS} FROM messages WHERE ticket_id = %s AND id > %s ORDER BY id ASC LIMIT %s"
+)
+STMT_MESSAGES_SUMMARY = register_statement(
+    'case.messages_summary', 'case',
+    "SELECT COUNT(*) AS message_count, MAX(id) AS last_id FROM messages WHERE ticket_id = %s"
+)
+STMT_ARCHIVED_MESSAGES_LATEST = register_statement(
+    'case.archived_messages_latest', 'case',
+    f"SELECT {MESSAGE_COLUMNS} FROM messages_archive WHERE ticket_id = %s ORDER BY id DESC LIMIT %s"
+)
+STMT_ARCHIVED_MESSAGES_BEFORE = register_statement(
+    'case.archived_messages_before', 'case',
+    f"SELECT {MESSAGE_COLUMNS} FROM messages_archive WHERE ticket_id = %s AND id < %s ORDER BY id DESC LIMIT %s"
+)
+STMT_ARCHIVED_MESSAGES_AFTER = register_statement(
+    'case.archived_messages_after', 'case',
+    f"SELECT {MESSAGE_COLUMNS} FROM messages_archive WHERE ticket_id = %s AND id > %s ORDER BY id ASC LIMIT %s"
+)
+STMT_ARCHIVED_MESSAGES_SUMMARY = register_statement(
+    'case.archived_messages_summary', 'case',
+    "SELECT COUNT(*) AS message_count, MAX(id) AS last_id FROM messages_archive WHERE ticket_id = %s"
+)
+
+
+class MessageService:
+    """工单消息服务类"""
+
+    @staticmethod
+    def parse_id(value: Optional[str], field: str) -> Optional[int]:
+        """
+        解析消息 id 参数（为空时返回 None）
+
+        Raises:
+            ValueError: 不是非负整数
+        """
+        if value is None or str(value).strip() == '':
+            return None
+        try:
+            parsed = int(value)
+        except (TypeError, ValueError):
+            raise ValueError(f'{field} 必须为整数')
+        if parsed < 0:
+            raise ValueError(f'{field} 不能为负数')
+        return parsed
+
+    @staticmethod
+    def parse_page_args(args) -> Dict[str, Any]:
+        """
+        从请求参数解析消息分页参数
+
+        Args:
+            args: request.args
+
+        Returns:
+            {'after_id': int | None, 'before_id': int | None, 'limit': int}
+
+        Raises:
+            ValueError: 参数不合法
+        """
+        after_id = MessageService.parse_id(args.get('after_id'), 'after_id')
+        before_id = MessageService.parse_id(args.get('before_id'), 'before_id')
+        if after_id is not None and before_id is not None:
+            raise ValueError('after_id 与 before_id 不能同时指定')
+
+        try:
+            limit = int(args.get('limit', DEFAULT_MESSAGE_LIMIT))
+        except (TypeError, ValueError):
+            raise ValueError('limit 必须为整数')
+        limit = max(1, min(limit, MAX_MESSAGE_LIMIT))
+
+        return {'after_id': after_id, 'before_id': before_id, 'limit': limit}
+
+    @staticmethod
+    def get_summary(ticket_id: str) -> Dict[str, Any]:
+        """
+        获取工单消息摘要
+
+        活跃表中没有消息时再查询归档表，archived 表示消息在归档表中
+
+        Returns:
+            {'ticket_id': str, 'message_count': int, 'last_id': int | None, 'archived': bool}
+        """
+        row = fetch_one(STMT_MESSAGES_SUMMARY, (ticket_id,)) or {}
+        archived = False
+        if not row.get('message_count'):
+            archived_row = fetch_one(STMT_ARCHIVED_MESSAGES_SUMMARY, (ticket_id,)) or {}
+            if archived_row.get('message_count'):
+                row, archived = archived_row, True
+        return {
+            'ticket_id': ticket_id,
+            'message_count': int(row.get('message_count') or 0),
+            'last_id': row.get('last_id'),
+            'archived': archived
+        }
+
+    @staticmethod
+    def summary_etag(summary: Dict[str, Any], page: Dict[str, Any]) -> str:
+        """
+        根据消息摘要和分页参数生成 ETag
+
+        消息只追加不修改，消息数与最大 id 不变即说明线程未变化
+        """
+        return (f"msg-{summary['ticket_id']}-{summary['message_count']}-{summary['last_id'] or 0}"
+                f"-{page['after_id']}-{page['before_id']}-{page['limit']}")
+
+    @staticmethod
+    def _format(rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        for row in rows:
+            if row.get('send_time') is not None:
+                row['send_time'] = row['send_time'].strftime(DATETIME_FORMAT)
+        return rows
+
+    @staticmethod
+    def list_messages(ticket_id: str, after_id: Optional[int] = None, before_id: Optional[int] = None,
+                      limit: int = DEFAULT_MESSAGE_LIMIT, archived: bool = False) -> Dict[str, Any]:
+        """
+        查询工单消息（键集分页）
+
+        Args:
+            ticket_id: 工单ID
+            after_id: 只返回 id 大于该值的消息（增量同步）
+            before_id: 只返回 id 小于该值的最新消息（向上翻页）
+            limit: 返回数量
+            archived: 从归档表查询（见 get_summary）
+
+        Returns:
+            {'messages': [...], 'has_more': bool, 'first_id': int | None, 'last_id': int | None}
+            messages 始终按 id 升序排列；has_more 在增量同步时表示还有更新的消息，
+            其余情况表示还有更早的消息
+        """
+        if archived:
+            stmt_after, stmt_before, stmt_latest = (
+                STMT_ARCHIVED_MESSAGES_AFTER, STMT_ARCHIVED_MESSAGES_BEFORE, STMT_ARCHIVED_MESSAGES_LATEST)
+        else:
+            stmt_after, stmt_before, stmt_latest = STMT_MESSAGES_AFTER, STMT_MESSAGES_BEFORE, STMT_MESSAGES_LATEST
+
+        if after_id is not None:
+            rows = fetch_all(stmt_after, (ticket_id, after_id, limit + 1))
+            has_more = len(rows) > limit
+            rows = rows[:limit]
+        else:
+            if before_id is not None:
+                rows = fetch_all(stmt_before, (ticket_id, before_id, limit + 1))
+            else:
+                rows = fetch_all(stmt_latest, (ticket_id, limit + 1))
+            has_more = len(rows) > limit
+            rows = rows[:limit]
+            rows.reverse()
+
+        logger.debug(f"工单 {ticket_id} 消息查询: after_id={after_id}, before_id={before_id}, "
+                     f"{len(rows)} 条, has_more={has_more}")
+        return {
+            'messages': MessageService._format(rows),
+            'has_more': has_more,
+            'first_id': rows[0]['id'] if rows else None,
+            'last_id': rows[-1]['id'] if rows else None
+        }
+
+    @staticmethod
+    def insert_message(ticket_id: str, sender: str, sender_name: str, content: str,
+                       username: Optional[str] = None) -> Dict[str, Any]:
+        """
+        写入工单消息并维护未读数
+
+        HTTP 接口和 SocketIO 事件发送消息都应调用此方法。
+        CHAT_MESSAGE_DURABILITY=batched 时只加入写入队列，返回的消息 id 为 None，
+        由后台写库提交后推送 new_message（调用方只在 id 不为空时推送）
+
+        Args:
+            ticket_id: 工单ID
+            sender: 发送者角色
+            sender_name: 发送者显示名称
+            content: 消息内容
+            username: 发送者用户名，用于推进发送者自己的已读游标
+
+        Returns:
+            写入的消息字典（send_time 已格式化）
+
+        Raises:
+            ValueError: 工单不存在或已归档
+        """
+        now = datetime.now().strftime(DATETIME_FORMAT)
+        message = {
+            'id': None,
+            'ticket_id': ticket_id,
+            'sender': sender,
+            'sender_name': sender_name,
+            'content': content,
+            'send_time': now
+        }
+
+        # 批量模式: 校验工单后加入写入队列立即返回，id 在后台写库时分配，提交后推送
+        if batched_enabled():
+            with db_connection('case') as conn:
+                cursor = conn.cursor()
+                cursor.execute("SELECT 1 FROM tickets WHERE ticket_id = %s", (ticket_id,))
+                if not cursor.fetchone():
+                    raise ValueError('工单不存在或已归档')
+            get_writer().submit(dict(message), username)
+            return message
+
+        with db_connection('case') as conn:
+            cursor = conn.cursor()
+            # 工单行排他锁：同一工单的消息串行写入，自增 id 顺序与提交顺序一致（after_id 同步不会漏消息）；
+            # 同时与归档事务互斥，消息不会写入正在归档的工单
+            cursor.execute(
+                "SELECT submit_user, assignee FROM tickets WHERE ticket_id = %s FOR UPDATE", (ticket_id,))
+            ticket = cursor.fetchone()
+            if not ticket:
+                raise ValueError('工单不存在或已归档')
+            message['id'] = MessageService.add_message(cursor, ticket_id, sender, sender_name, content, now)
+            MessageService._bump_unread(cursor, ticket_id, message['id'], username,
+                                        (ticket.get('submit_user'), ticket.get('assignee')))
+            TicketSlaService.on_message(cursor, ticket_id, sender, now)
+            conn.commit()
+
+        return message
+
+    @staticmethod
+    def add_message(cursor, ticket_id: str, sender: str, sender_name: str, content: str, send_time: str) -> int:
+        """
+        在调用方事务内写入一条消息（如创建工单时的附件系统消息）并更新检索索引，不维护未读数
+
+        调用方须已持有该工单行的排他锁（新建工单或 SELECT ... FOR UPDATE），保证 id 顺序与提交顺序一致
+
+        Returns:
+            消息 id
+        """
+        cursor.execute(
+            """
+            INSERT INTO messages (ticket_id, sender, sender_name, content, send_time)
+            VALUES (%s, %s, %s, %s, %s)
+            """,
+            (ticket_id, sender, sender_name, content, send_time)
+        )
+        message_id = cursor.lastrowid
+
+        TicketSearchService.index_messages(cursor, [(ticket_id, content)])
+        return message_id
+
+    @staticmethod
+    def _bump_unread(cursor, ticket_id: str, message_id: int, username: Optional[str],
+                     participants: Tuple[Optional[str], ...] = ()):
+        """
+        新消息写入后更新已读游标（与消息写入同一事务）
+
+        Args:
+            participants: 工单提交人和处理人，由调用方从已查询的工单行传入
+        """
+        cursor.execute(
+            """
+            UPDATE ticket_read_cursors SET unread_count = unread_count + 1
+            WHERE ticket_id = %s AND username <> %s
+            """,
+            (ticket_id, username or '')
+        )
+
+        # 提交人/处理人首次出现时补建游标，未读数为当前全部消息
+        for participant in set(participants):
+            if participant and participant != username:
+                cursor.execute(
+                    """
+                    INSERT IGNORE INTO ticket_read_cursors (username, ticket_id, last_read_message_id, unread_count)
+                    SELECT %s, %s, 0, COUNT(*) FROM messages WHERE ticket_id = %s
+                    """,
+                    (participant, ticket_id, ticket_id)
+                )
+
+        if username:
+            cursor.execute(
+                """
+                INSERT INTO ticket_read_cursors (username, ticket_id, last_read_message_id, unread_count)
+                VALUES (%s, %s, %s, 0)
+                ON DUPLICATE KEY UPDATE
+                    last_read_message_id = GREATEST(last_read_message_id, VALUES(last_read_message_id)),
+                    unread_count = 0
+                """,
+                (username, ticket_id, message_id)
+            )
+
+    @staticmethod
+    def mark_read(username: str, ticket_id: str, message_id: Optional[int] = None) -> Dict[str, Any]:
+        """
+        将工单消息标记为已读
+
+        Args:
+            username: 用户名
+            ticket_id: 工单ID
+            message_id: 已读到的消息 id，为空时标记全部已读
+
+        Returns:
+            {'ticket_id', 'last_read_message_id', 'unread_count'}
+        """
+        with db_connection('case') as conn:
+            cursor = conn.cursor()
+            if message_id is None:
+                cursor.execute("SELECT MAX(id) AS last_id FROM messages WHERE ticket_id = %s", (ticket_id,))
+                message_id = (cursor.fetchone() or {}).get('last_id') or 0
+
+            cursor.execute(
+                "SELECT COUNT(*) AS unread FROM messages WHERE ticket_id = %s AND id > %s",
+                (ticket_id, message_id)
+            )
+            unread = (cursor.fetchone() or {}).get('unread') or 0
+
+            # 游标只前进不后退
+            cursor.execute(
+                """
+                INSERT INTO ticket_read_cursors (username, ticket_id, last_read_message_id, unread_count)
+                VALUES (%s, %s, %s, %s)
+                ON DUPLICATE KEY UPDATE
+                    unread_count = IF(VALUES(last_read_message_id) > last_read_message_id,
+                                      VALUES(unread_count), unread_count),
+                    last_read_message_id = GREATEST(last_read_message_id, VALUES(last_read_message_id))
+                """,
+                (username, ticket_id, message_id, unread)
+            )
+            cursor.execute(
+                """
+                SELECT last_read_message_id, unread_count FROM ticket_read_cursors
+                WHERE username = %s AND ticket_id = %s
+                """,
+                (username, ticket_id)
+            )
+            row = cursor.fetchone() or {}
+            conn.commit()
+
+        return {
+            'ticket_id': ticket_id,
+            'last_read_message_id': row.get('last_read_message_id', message_id),
+            'unread_count': row.get('unread_count', unread)
+        }
+
+    @staticmethod
+    def get_unread_counts(username: str, user_role: str, ticket_ids: Optional[List[str]] = None) -> Dict[str, Any]:
+        """
+        查询用户的工单未读数
+
+        Args:
+            username: 用户名
+            user_role: 用户角色，customer 只能查询自己提交的工单
+            ticket_ids: 工单ID列表；为空时返回所有有未读消息的工单（活动摘要）
+
+        Returns:
+            {'tickets': {ticket_id: {'unread_count', 'last_read_message_id'}}, 'total_unread': int}
+        """
+        counts: Dict[str, Dict[str, Any]] = {}
+
+        with db_connection('case') as conn:
+            cursor = conn.cursor()
+            if not ticket_ids:
+                sql = """
+                    SELECT c.ticket_id, c.unread_count, c.last_read_message_id
+                    FROM ticket_read_cursors c
+                """
+                params: List[Any] = [username]
+                if user_role == 'customer':
+                    sql += " JOIN tickets t ON t.ticket_id = c.ticket_id AND t.submit_user = %s"
+                    params.insert(0, username)
+                sql += " WHERE c.username = %s AND c.unread_count > 0"
+                cursor.execute(sql, params)
+                for row in cursor.fetchall():
+                    counts[row['ticket_id']] = {
+                        'unread_count': row['unread_count'],
+                        'last_read_message_id': row['last_read_message_id']
+                    }
+            else:
+                ticket_ids = list(dict.fromkeys(ticket_ids))[:MAX_UNREAD_TICKETS]
+                placeholders = ', '.join(['%s'] * len(ticket_ids))
+                sql = f"""
+                    SELECT t.ticket_id, c.unread_count, c.last_read_message_id
+                    FROM tickets t
+                    LEFT JOIN ticket_read_cursors c ON c.ticket_id = t.ticket_id AND c.username = %s
+                    WHERE t.ticket_id IN ({placeholders})
+                """
+                params = [username, *ticket_ids]
+                if user_role == 'customer':
+                    sql += " AND t.submit_user = %s"
+                    params.append(username)
+                cursor.execute(sql, params)
+
+                missing = []
+                for row in cursor.fetchall():
+                    if row['unread_count'] is None:
+                        missing.append(row['ticket_id'])
+                    else:
+                        counts[row['ticket_id']] = {
+                            'unread_count': row['unread_count'],
+                            'last_read_message_id': row['last_read_message_id']
+                        }
+
+                # 从未打开过的工单没有游标，全部消息视为未读，一次分组统计
+                if missing:
+                    placeholders = ', '.join(['%s'] * len(missing))
+                    cursor.execute(
+                        f"""
+                        SELECT ticket_id, COUNT(*) AS unread_count FROM messages
+                        WHERE ticket_id IN ({placeholders}) GROUP BY ticket_id
+                        """,
+                        missing
+                    )
+                    grouped = {row['ticket_id']: row['unread_count'] for row in cursor.fetchall()}
+                    for ticket_id in missing:
+                        counts[ticket_id] = {
+                            'unread_count': grouped.get(ticket_id, 0),
+                            'last_read_message_id': 0
+                        }
+
+        return {
+            'tickets': counts,
+            'total_unread': sum(item['unread_count'] for item in counts.values())
+        }
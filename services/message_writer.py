@@ -0,0 +1,261 @@
+"""
+工单消息批量写入（write-behind）
+
+CHAT_MESSAGE_DURABILITY=batched 时使用：
+- 发送时只校验工单并加入队列，立即返回；消息 id 在后台写库时由自增列分配
+- 后台线程（eventlet/gevent 下为协程）按批次在一个事务内写入并提交，提交后再推送 new_message
+- 写入时按 ticket_id 顺序对工单行加排他锁，与同步写入一致：同一工单的消息 id 顺序即提交顺序，
+  after_id 增量同步和摘要 ETag 不会跳过晚提交的小 id
+- 写入失败按指数退避重试；重试前按上次分配的 id 确认是否已提交，不会产生重复消息（至少一次）
+- 重试耗尽或进程退出时未写入的消息落盘到暂存文件，启动时（数据库连接池就绪后）重放
+
+取舍：批量模式换取的是写库吞吐（多条消息共用一次事务提交），释放的只是发送请求所在的线程；
+new_message 推送要等批次提交，相比 sync 模式最多多出 CHAT_WRITE_FLUSH_INTERVAL 的送达延迟
+（加上批次写库耗时）。低并发时 sync 的端到端延迟更低
+"""
+import atexit
+import json
+import os
+import queue
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+import config
+from common.database_context import db_connection
+from common.logger import logger
+
+
+MESSAGE_FIELDS = ('ticket_id', 'sender', 'sender_name', 'content', 'send_time')
+
+# 进程退出时等待后台线程写完当前批次的最长时间（秒）
+DRAIN_TIMEOUT = 5
+
+
+class MessageWriteBehind:
+    """工单消息批量写入队列"""
+
+    def __init__(self):
+        self._queue: queue.Queue = queue.Queue(maxsize=config.CHAT_WRITE_QUEUE_SIZE)
+        self._thread: Optional[threading.Thread] = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._inflight: List[Tuple[Dict[str, Any], Optional[str]]] = []
+        self._stats = {'queued': 0, 'flushed': 0, 'batches': 0, 'retries': 0, 'spooled': 0, 'dropped': 0}
+
+    def _ensure_started(self):
+        pid = os.getpid()
+        if self._thread is not None and self._pid == pid:
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == pid:
+                return
+            if self._pid is not None and self._pid != pid:
+                # fork 后父进程的队列不能沿用
+                self._queue = queue.Queue(maxsize=config.CHAT_WRITE_QUEUE_SIZE)
+                self._inflight = []
+            self._pid = pid
+            self._thread = threading.Thread(target=self._run, name='chat-write-behind', daemon=True)
+            self._thread.start()
+            self._replay_spool()
+
+    def submit(self, message: Dict[str, Any], username: Optional[str]):
+        """
+        提交待写入的消息
+
+        Args:
+            message: 已确定 send_time 的消息字典（id 为 None，写库时分配）
+            username: 发送者用户名（用于维护已读游标）
+        """
+        self._ensure_started()
+        try:
+            self._queue.put((message, username), timeout=1)
+            self._stats['queued'] += 1
+        except queue.Full:
+            # 队列积压时退化为同步写入，形成背压
+            logger.warning("消息写入队列已满，同步写入")
+            self._flush_with_retry([(message, username)])
+
+    def _run(self):
+        batch_size = config.CHAT_WRITE_BATCH_SIZE
+        interval = config.CHAT_WRITE_FLUSH_INTERVAL
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + interval
+            while len(batch) < batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            # 记录正在写入的批次，进程退出时由 drain 落盘
+            self._inflight = batch
+            self._flush_with_retry(batch)
+            self._inflight = []
+
+    def _flush_with_retry(self, batch: List[Tuple[Dict[str, Any], Optional[str]]]) -> bool:
+        for attempt in range(config.CHAT_WRITE_MAX_RETRIES + 1):
+            try:
+                self._flush(batch)
+                return True
+            except Exception as e:
+                if attempt >= config.CHAT_WRITE_MAX_RETRIES:
+                    logger.error(f"批量写入 {len(batch)} 条消息失败，已达重试上限: {e}")
+                    break
+                self._stats['retries'] += 1
+                delay = min(0.1 * (2 ** attempt), 5)
+                logger.warning(f"批量写入 {len(batch)} 条消息失败，{delay:.1f}s 后重试: {e}")
+                time.sleep(delay)
+        self._spool(batch)
+        return False
+
+    def _flush(self, batch: List[Tuple[Dict[str, Any], Optional[str]]]):
+        from services.message_service import MessageService
+        from services.search_service import TicketSearchService
+        from services.sla_service import TicketSlaService
+
+        with db_connection('case') as conn:
+            cursor = conn.cursor()
+            # 上次尝试已分配 id 的消息：id 存在说明事务已提交（提交时连接中断），否则已回滚需重新写入
+            assigned = [message['id'] for message, _ in batch if message.get('id') is not None]
+            committed = set()
+            if assigned:
+                cursor.execute(
+                    f"SELECT id FROM messages WHERE id IN ({', '.join(['%s'] * len(assigned))})", assigned)
+                committed = {row['id'] for row in cursor.fetchall()}
+            pending = []
+            for message, username in batch:
+                if message.get('id') not in committed:
+                    message['id'] = None
+                    pending.append((message, username))
+
+            written, dropped = [], []
+            if pending:
+                # 按固定顺序加排他锁，避免与其他进程的批次死锁；同时与归档事务互斥
+                ticket_ids = sorted({message['ticket_id'] for message, _ in pending})
+                cursor.execute(
+                    f"SELECT ticket_id, submit_user, assignee FROM tickets "
+                    f"WHERE ticket_id IN ({', '.join(['%s'] * len(ticket_ids))}) "
+                    f"ORDER BY ticket_id FOR UPDATE",
+                    ticket_ids
+                )
+                participants = {row['ticket_id']: (row['submit_user'], row['assignee']) for row in cursor.fetchall()}
+                for message, username in pending:
+                    if message['ticket_id'] not in participants:
+                        dropped.append(message)  # 入队后工单被归档或删除
+                        continue
+                    cursor.execute(
+                        f"INSERT INTO messages ({', '.join(MESSAGE_FIELDS)}) "
+                        f"VALUES ({', '.join(['%s'] * len(MESSAGE_FIELDS))})",
+                        [message[field] for field in MESSAGE_FIELDS]
+                    )
+                    message['id'] = cursor.lastrowid
+                    MessageService._bump_unread(cursor, message['ticket_id'], message['id'], username,
+                                                participants[message['ticket_id']])
+                    TicketSlaService.on_message(cursor, message['ticket_id'], message['sender'], message['send_time'])
+                    written.append(message)
+                if written:
+                    TicketSearchService.index_messages(
+                        cursor, [(message['ticket_id'], message['content']) for message in written])
+            conn.commit()
+
+        for message in dropped:
+            logger.warning(f"工单 {message['ticket_id']} 不存在或已归档，丢弃消息: {message['content'][:50]}")
+        self._stats['flushed'] += len(written)
+        self._stats['dropped'] += len(dropped)
+        self._stats['batches'] += 1
+        self._emit([message for message, _ in batch if message.get('id') is not None])
+
+    @staticmethod
+    def _emit(messages: List[Dict[str, Any]]):
+        """提交后推送新消息（推送失败不影响写库结果，客户端重连时按 after_id 补齐）"""
+        if not messages:
+            return
+        try:
+            from services.socketio_service import emit_new_message
+            for message in messages:
+                emit_new_message(message)
+        except Exception as e:
+            logger.warning(f"推送 {len(messages)} 条新消息失败: {e}")
+
+    def _spool(self, batch: List[Tuple[Dict[str, Any], Optional[str]]]):
+        """写库失败的消息落盘，启动时重放"""
+        path = config.CHAT_WRITE_SPOOL_FILE
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            with open(path, 'a', encoding='utf-8') as f:
+                for message, username in batch:
+                    f.write(json.dumps({'message': message, 'username': username}, ensure_ascii=False) + '\n')
+            self._stats['spooled'] += len(batch)
+            logger.error(f"{len(batch)} 条消息已写入暂存文件 {path}，将在下次启动时重放")
+        except Exception as e:
+            logger.critical(f"消息暂存失败，{len(batch)} 条消息丢失: {e} "
+                            f"tickets={[m['ticket_id'] for m, _ in batch]}")
+
+    def _replay_spool(self):
+        path = config.CHAT_WRITE_SPOOL_FILE
+        if not os.path.exists(path):
+            return
+        replay_path = f"{path}.{os.getpid()}.replay"
+        try:
+            os.replace(path, replay_path)
+        except OSError:
+            return  # 其他进程正在重放
+        with open(replay_path, encoding='utf-8') as f:
+            items = [json.loads(line) for line in f if line.strip()]
+        for item in items:
+            self._queue.put((item['message'], item.get('username')))
+        os.remove(replay_path)
+        logger.info(f"重放暂存消息 {len(items)} 条")
+
+    def drain(self):
+        """同步写入队列中剩余的消息，后台线程正在写入的批次落盘（进程退出时调用）"""
+        # 先等后台线程写完当前批次；仍在重试的批次落盘，已提交的消息重放时按 id 跳过（至少一次）
+        deadline = time.monotonic() + DRAIN_TIMEOUT
+        while self._inflight and time.monotonic() < deadline:
+            time.sleep(0.05)
+        inflight = self._inflight
+        if inflight:
+            self._spool(inflight)
+        batch = []
+        while True:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        for start in range(0, len(batch), config.CHAT_WRITE_BATCH_SIZE):
+            self._flush_with_retry(batch[start:start + config.CHAT_WRITE_BATCH_SIZE])
+
+    def get_stats(self) -> Dict[str, Any]:
+        return dict(self._stats, pending=self._queue.qsize() + len(self._inflight))
+
+
+_writer: Optional[MessageWriteBehind] = None
+_writer_lock = threading.Lock()
+
+
+def batched_enabled() -> bool:
+    """是否启用批量写入模式"""
+    return config.CHAT_MESSAGE_DURABILITY == 'batched'
+
+
+def get_writer() -> MessageWriteBehind:
+    """获取当前进程的批量写入队列"""
+    global _writer
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                _writer = MessageWriteBehind()
+                atexit.register(_writer.drain)
+    return _writer
+
+
+def start_message_writer():
+    """
+    启动时重放暂存的消息（数据库连接池就绪回调）
+
+    批量模式下同时启动后台写入线程；已切换为同步模式时仅在存在暂存文件时启动，写完即空闲
+    """
+    if batched_enabled() or os.path.exists(config.CHAT_WRITE_SPOOL_FILE):
+        get_writer()._ensure_started()
@@ -0,0 +1,195 @@
+"""
+工单聊天在线状态与输入提示
+
+内存登记表记录每个工单房间内的连接：
+- room -> {sid: 成员信息}、sid -> {room}，加入/离开/心跳/断开均为 O(1)
+- 同一用户多个标签页只算一个查看者，查看者列表按用户名去重
+- 心跳超时的连接由后台清理任务移除，单房间成员数有上限，内存占用有界
+- 输入提示服务端节流：同一连接在节流窗口内只广播一次"正在输入"，
+  超过超时时间没有新的输入事件时自动广播"停止输入"
+
+登记表只记录本进程的连接，多 worker 部署时查看者列表为当前 worker 上的连接
+"""
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+import config
+
+
+class PresenceRegistry:
+    """房间在线成员登记表"""
+
+    def __init__(self, max_room_members: Optional[int] = None, heartbeat_timeout: Optional[float] = None,
+                 typing_throttle: Optional[float] = None, typing_timeout: Optional[float] = None):
+        self.max_room_members = max_room_members or config.PRESENCE_MAX_ROOM_MEMBERS
+        self.heartbeat_timeout = heartbeat_timeout or config.PRESENCE_HEARTBEAT_TIMEOUT
+        self.typing_throttle = typing_throttle or config.TYPING_THROTTLE
+        self.typing_timeout = typing_timeout or config.TYPING_TIMEOUT
+        self._rooms: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        # room -> {username: 连接数}，用于 O(1) 判断查看者列表是否变化
+        self._room_users: Dict[str, Dict[str, int]] = {}
+        self._sid_rooms: Dict[str, set] = {}
+        self._last_seen: Dict[str, float] = {}
+        # (sid, room) -> [上次广播时间, 过期时间]
+        self._typing: Dict[Tuple[str, str], List[float]] = {}
+        self._lock = threading.Lock()
+
+    def join(self, room: str, sid: str, username: str, display_name: str, role: str) -> Tuple[bool, bool]:
+        """
+        登记连接加入房间
+
+        Returns:
+            (accepted, changed): 是否登记成功（房间已满时为 False）；查看者列表是否变化
+        """
+        now = time.monotonic()
+        with self._lock:
+            members = self._rooms.setdefault(room, {})
+            if sid in members:
+                self._last_seen[sid] = now
+                return True, False
+            if len(members) >= self.max_room_members:
+                if not members:
+                    del self._rooms[room]
+                return False, False
+            users = self._room_users.setdefault(room, {})
+            users[username] = users.get(username, 0) + 1
+            changed = users[username] == 1
+            members[sid] = {'username': username, 'display_name': display_name, 'role': role}
+            self._sid_rooms.setdefault(sid, set()).add(room)
+            self._last_seen[sid] = now
+        return True, changed
+
+    def leave(self, room: str, sid: str) -> Tuple[Optional[Dict[str, Any]], bool]:
+        """
+        登记连接离开房间
+
+        Returns:
+            (member, changed): 离开的成员信息；查看者列表是否变化（该用户已无其他连接在房间内）
+        """
+        with self._lock:
+            return self._leave_locked(room, sid)
+
+    def _leave_locked(self, room: str, sid: str) -> Tuple[Optional[Dict[str, Any]], bool]:
+        members = self._rooms.get(room)
+        member = members.pop(sid, None) if members is not None else None
+        changed = False
+        if member is not None:
+            users = self._room_users[room]
+            users[member['username']] -= 1
+            if users[member['username']] == 0:
+                del users[member['username']]
+                changed = True
+        if members is not None and not members:
+            del self._rooms[room]
+            self._room_users.pop(room, None)
+        rooms = self._sid_rooms.get(sid)
+        if rooms is not None:
+            rooms.discard(room)
+            if not rooms:
+                del self._sid_rooms[sid]
+                self._last_seen.pop(sid, None)
+        self._typing.pop((sid, room), None)
+        return member, changed
+
+    def remove_sid(self, sid: str) -> List[Tuple[str, Dict[str, Any], bool]]:
+        """
+        连接断开时移除其所在的所有房间
+
+        Returns:
+            [(room, member, changed), ...]
+        """
+        with self._lock:
+            removed = []
+            for room in list(self._sid_rooms.get(sid, ())):
+                member, changed = self._leave_locked(room, sid)
+                if member:
+                    removed.append((room, member, changed))
+            self._last_seen.pop(sid, None)
+            return removed
+
+    def touch(self, sid: str) -> bool:
+        """记录心跳，返回连接是否仍在登记表中"""
+        with self._lock:
+            if sid not in self._sid_rooms:
+                return False
+            self._last_seen[sid] = time.monotonic()
+            return True
+
+    def viewers(self, room: str) -> List[Dict[str, Any]]:
+        """房间内的查看者（按用户名去重）"""
+        with self._lock:
+            users = {}
+            for member in self._rooms.get(room, {}).values():
+                entry = users.get(member['username'])
+                if entry is None:
+                    users[member['username']] = dict(member, connections=1)
+                else:
+                    entry['connections'] += 1
+            return list(users.values())
+
+    def member(self, room: str, sid: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            return self._rooms.get(room, {}).get(sid)
+
+    def typing(self, room: str, sid: str) -> bool:
+        """
+        记录输入事件
+
+        Returns:
+            是否需要广播"正在输入"（节流窗口内的重复事件只延长过期时间）
+        """
+        now = time.monotonic()
+        key = (sid, room)
+        with self._lock:
+            if sid not in self._rooms.get(room, {}):
+                return False
+            state = self._typing.get(key)
+            if state is not None and now - state[0] < self.typing_throttle:
+                state[1] = now + self.typing_timeout
+                return False
+            self._typing[key] = [now, now + self.typing_timeout]
+            return True
+
+    def stop_typing(self, room: str, sid: str) -> bool:
+        """结束输入，返回是否需要广播"停止输入"（之前广播过正在输入）"""
+        with self._lock:
+            return self._typing.pop((sid, room), None) is not None
+
+    def sweep(self) -> Tuple[List[Tuple[str, Dict[str, Any]]], List[Tuple[str, str, Dict[str, Any], bool]]]:
+        """
+        清理过期状态
+
+        Returns:
+            (typing_expired, stale): 输入超时的 [(room, member)]；心跳超时移除的 [(sid, room, member, changed)]
+        """
+        now = time.monotonic()
+        typing_expired = []
+        stale = []
+        with self._lock:
+            for (sid, room), state in list(self._typing.items()):
+                if state[1] <= now:
+                    del self._typing[(sid, room)]
+                    member = self._rooms.get(room, {}).get(sid)
+                    if member:
+                        typing_expired.append((room, member))
+
+            deadline = now - self.heartbeat_timeout
+            for sid, last_seen in list(self._last_seen.items()):
+                if last_seen < deadline:
+                    for room in list(self._sid_rooms.get(sid, ())):
+                        member, changed = self._leave_locked(room, sid)
+                        if member:
+                            stale.append((sid, room, member, changed))
+                    self._last_seen.pop(sid, None)
+        return typing_expired, stale
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                'rooms': len(self._rooms),
+                'connections': len(self._sid_rooms),
+                'typing': len(self._typing)
+            }
+
+
+presence = PresenceRegistry()
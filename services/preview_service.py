@@ -0,0 +1,165 @@
+"""
+工单图片附件预览生成
+图片附件登记后提交到后台线程池，复用 scripts/optimize_images.ImageOptimizer 生成：
+- webp: 最大宽度 1200 的 WebP 预览
+- sm / md / lg: 320x240、640x480、1024x768 以内的 WebP 响应式尺寸（小于原图时才生成）
+
+预览文件存放在原文件旁（存储键为 <原存储键>-<名称>.webp），尺寸信息记录在 attachments.variants 中，
+附件列表返回缩略图地址，页面不再加载原图
+
+eventlet/gevent 下线程池中的线程被替换为协程，CPU 密集的图片处理转交驱动自带的原生线程池执行，
+不阻塞事件循环
+"""
+import json
+import os
+import shutil
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, Optional
+import config
+from common.database_context import db_connection
+from common.file_storage import get_storage
+from common.logger import logger
+from services.attachment_service import AttachmentService, LEGACY_STORAGE
+
+
+PREVIEW_MAX_WIDTH = 1200
+PREVIEW_SIZES = [
+    (320, 240, 'sm'),
+    (640, 480, 'md'),
+    (1024, 768, 'lg'),
+]
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=config.IMAGE_PREVIEW_WORKERS,
+                                               thread_name_prefix='image-preview')
+    return _executor
+
+
+def _run_blocking(func, *args):
+    """在原生线程中执行 CPU 密集任务"""
+    try:
+        from eventlet import patcher, tpool
+        if patcher.is_monkey_patched('thread'):
+            return tpool.execute(func, *args)
+    except ImportError:
+        pass
+    try:
+        import gevent.monkey
+        if gevent.monkey.is_module_patched('threading'):
+            import gevent
+            return gevent.get_hub().threadpool.apply(func, args)
+    except ImportError:
+        pass
+    return func(*args)
+
+
+class ImagePreviewService:
+    """图片预览生成服务类"""
+
+    @staticmethod
+    def variant_key(stored_path: str, name: str) -> str:
+        return f'{stored_path}-{name}.webp'
+
+    @staticmethod
+    def schedule(attachment_id: int, mime_type: Optional[str]) -> bool:
+        """
+        提交预览生成任务（附件登记事务提交后调用）
+
+        Returns:
+            bool: 是否提交
+        """
+        if not AttachmentService.needs_preview(mime_type):
+            return False
+        _get_executor().submit(ImagePreviewService._process, attachment_id)
+        return True
+
+    @staticmethod
+    def _process(attachment_id: int):
+        try:
+            _run_blocking(ImagePreviewService.generate, attachment_id)
+        except Exception as e:
+            logger.error(f"附件 {attachment_id} 预览生成失败：{e}")
+            ImagePreviewService.mark_status(attachment_id, 'failed', None)
+
+    @staticmethod
+    def mark_status(attachment_id: int, status: str, variants: Optional[Dict[str, Any]]):
+        try:
+            with db_connection('case') as conn:
+                cursor = conn.cursor()
+                cursor.execute(
+                    "UPDATE attachments SET preview_status = %s, variants = %s WHERE id = %s",
+                    (status, json.dumps(variants) if variants is not None else None, attachment_id)
+                )
+                conn.commit()
+        except Exception as e:
+            logger.error(f"更新附件 {attachment_id} 预览状态失败：{e}")
+
+    @staticmethod
+    def _store(attachment: Dict[str, Any], key: str, path: str):
+        """预览文件写入原文件所在的存储"""
+        if attachment['storage'] == LEGACY_STORAGE:
+            shutil.copyfile(path, AttachmentService.local_path(attachment, key))
+            return
+        with open(path, 'rb') as f:
+            get_storage(attachment['storage']).put(key, f)
+
+    @staticmethod
+    def generate(attachment_id: int) -> Dict[str, Any]:
+        """
+        同步生成附件的全部预览并登记
+
+        Returns:
+            dict: {名称: {key, width, height, size}}
+        """
+        from PIL import Image
+        from scripts.optimize_images import ImageOptimizer
+
+        attachment = AttachmentService.get_attachment(attachment_id)
+        if not attachment:
+            raise LookupError(f'附件 {attachment_id} 不存在')
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            source = AttachmentService.local_path(attachment)
+            if source is None:
+                # 对象存储中的原图先下载到临时目录
+                source = os.path.join(tmp_dir, attachment['sha256'] or 'source')
+                body = get_storage(attachment['storage']).open(attachment['stored_path'])
+                with open(source, 'wb') as f:
+                    shutil.copyfileobj(body, f)
+
+            output_dir = os.path.join(tmp_dir, 'previews')
+            optimizer = ImageOptimizer(tmp_dir, output_dir)
+            source_path = Path(source)
+            if not optimizer.optimize_single(source_path, config.IMAGE_QUALITY, PREVIEW_MAX_WIDTH):
+                raise RuntimeError('无法解码图片')
+            optimizer.create_responsive_images(source_path, PREVIEW_SIZES)
+
+            stem = source_path.stem
+            outputs = {'webp': os.path.join(output_dir, f'{stem}.webp')}
+            for _, _, suffix in PREVIEW_SIZES:
+                outputs[suffix] = os.path.join(output_dir, f'{stem}-{suffix}.webp')
+
+            variants = {}
+            for name, path in outputs.items():
+                if not os.path.exists(path):
+                    continue
+                with Image.open(path) as img:
+                    width, height = img.size
+                key = ImagePreviewService.variant_key(attachment['stored_path'], name)
+                ImagePreviewService._store(attachment, key, path)
+                variants[name] = {'key': key, 'width': width, 'height': height, 'size': os.path.getsize(path)}
+
+        ImagePreviewService.mark_status(attachment_id, 'ready', variants)
+        logger.info(f"附件 {attachment_id} 预览生成完成: {', '.join(variants)}")
+        return variants
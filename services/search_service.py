@@ -0,0 +1,348 @@
+"""
+工单全文检索服务类
+在 ticket_search_terms 表中维护倒排索引，检索工单标题、正文、解决方案和聊天消息：
+
+- 分词: 文本 NFKC 规范化并转小写；连续的中文切分为重叠二元组（"工单超时" -> 工单 / 单超 / 超时），
+  英文和数字按单词切分。MariaDB 的 FULLTEXT 没有 ngram 分词器，中文无法按词检索，因此在应用内分词
+- 索引: 每个 (词项, 工单) 一行，weight 为加权词频（标题 4、解决方案 2、正文和消息 1）；
+  创建工单、写入消息时在同一事务内增量更新
+- 检索: 所有查询词项都命中的工单按 Σ (1 + ln(weight)) × idf 排序；客户只能检索自己提交的工单；
+  已归档的工单索引保留，详情和摘要从归档表读取
+- 摘要: 在结果工单的标题、正文、解决方案和消息中定位关键词，返回附近的文本片段和高亮位置
+
+已有数据通过 scripts/build_search_index.py 建立索引
+"""
+import math
+import re
+import unicodedata
+from collections import Counter
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from common.database_context import db_connection
+from common.logger import logger
+from services.ticket_service import TICKET_LIST_COLUMNS, DATETIME_FORMAT
+
+
+FIELD_WEIGHTS = {
+    'title': 4,
+    'resolution': 2,
+    'content': 1,
+    'message': 1,
+}
+
+MAX_TERM_LENGTH = 32
+MAX_QUERY_TERMS = 16
+DEFAULT_SEARCH_LIMIT = 20
+MAX_SEARCH_LIMIT = 50
+MAX_SEARCH_OFFSET = 500
+
+SNIPPET_BEFORE = 30
+SNIPPET_LENGTH = 120
+
+# 中文（含扩展 A 区和兼容汉字）连续片段，或拉丁字母/数字组成的单词
+_TOKEN_RE = re.compile(r'[\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]+|[0-9a-z\u00c0-\u024f]+')
+
+# 附件系统消息（"附件上传: 文件名|url:下载地址"）中的下载地址不参与索引
+_ATTACHMENT_URL_RE = re.compile(r'\|url:\S*')
+
+
+def _normalize(text: str) -> str:
+    return unicodedata.normalize('NFKC', text or '').lower()
+
+
+def _like_pattern(keyword: str) -> str:
+    """构造 LIKE '%关键词%' 的参数，转义通配符（配合 ESCAPE '!' 使用，不受 NO_BACKSLASH_ESCAPES 影响）"""
+    escaped = keyword.replace('!', '!!').replace('%', '!%').replace('_', '!_')
+    return f'%{escaped}%'
+
+
+def _is_cjk(run: str) -> bool:
+    return not ('0' <= run[0] <= '9' or 'a' <= run[0] <= 'z' or '\u00c0' <= run[0] <= '\u024f')
+
+
+def tokenize(text: str) -> List[str]:
+    """切分词项（保留重复，用于统计词频）"""
+    terms = []
+    for run in _TOKEN_RE.findall(_normalize(text)):
+        if not _is_cjk(run):
+            terms.append(run[:MAX_TERM_LENGTH])
+        elif len(run) == 1:
+            terms.append(run)
+        else:
+            terms.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return terms
+
+
+class TicketSearchService:
+    """工单全文检索服务类"""
+
+    @staticmethod
+    def _upsert(cursor, weights: Dict[Tuple[str, str], int]):
+        if not weights:
+            return
+        # 按主键顺序写入，减少并发事务之间的死锁
+        cursor.executemany(
+            """
+            INSERT INTO ticket_search_terms (term, ticket_id, weight) VALUES (%s, %s, %s)
+            ON DUPLICATE KEY UPDATE weight = weight + VALUES(weight)
+            """,
+            [(term, ticket_id, weight) for (term, ticket_id), weight in sorted(weights.items())]
+        )
+
+    @staticmethod
+    def index_fields(cursor, ticket_id: str, fields: Dict[str, Optional[str]]):
+        """
+        在调用方事务内为工单增加索引
+
+        Args:
+            fields: {字段名: 文本}，字段名决定权重（title / content / resolution / message）
+        """
+        weights = Counter()
+        for field, text in fields.items():
+            for term in tokenize(text):
+                weights[(term, ticket_id)] += FIELD_WEIGHTS[field]
+        TicketSearchService._upsert(cursor, weights)
+
+    @staticmethod
+    def index_messages(cursor, messages: Iterable[Tuple[str, str]]):
+        """在调用方事务内为新消息增加索引，messages 为 [(ticket_id, content)]"""
+        weights = Counter()
+        for ticket_id, content in messages:
+            for term in tokenize(_ATTACHMENT_URL_RE.sub(' ', content or '')):
+                weights[(term, ticket_id)] += FIELD_WEIGHTS['message']
+        TicketSearchService._upsert(cursor, weights)
+
+    @staticmethod
+    def reindex_ticket(cursor, ticket_id: str) -> bool:
+        """
+        在调用方事务内重建单个工单的索引
+
+        Returns:
+            bool: 工单是否存在
+        """
+        cursor.execute("DELETE FROM ticket_search_terms WHERE ticket_id = %s", (ticket_id,))
+        cursor.execute("SELECT title, content, resolution FROM tickets WHERE ticket_id = %s", (ticket_id,))
+        ticket = cursor.fetchone()
+        messages_table = 'messages'
+        if not ticket:
+            cursor.execute("SELECT title, content, resolution FROM tickets_archive WHERE ticket_id = %s", (ticket_id,))
+            ticket = cursor.fetchone()
+            messages_table = 'messages_archive'
+        if not ticket:
+            return False
+        TicketSearchService.index_fields(cursor, ticket_id, ticket)
+        cursor.execute(f"SELECT content FROM {messages_table} WHERE ticket_id = %s", (ticket_id,))
+        TicketSearchService.index_messages(cursor, ((ticket_id, row['content']) for row in cursor.fetchall()))
+        return True
+
+    @staticmethod
+    def parse_query(query: str) -> List[Tuple[str, bool]]:
+        """
+        解析查询为 [(词项, 是否前缀匹配)]
+
+        单个汉字在索引中只作为二元组的一部分出现，按前缀匹配以其开头的二元组
+        """
+        seen = []
+        for term in tokenize(query):
+            if term not in seen:
+                seen.append(term)
+        parsed = []
+        for term in seen[:MAX_QUERY_TERMS]:
+            parsed.append((term, len(term) == 1 and _is_cjk(term)))
+        return parsed
+
+    @staticmethod
+    def _condition(term: str, prefix: bool) -> Tuple[str, str]:
+        if prefix:
+            return 's.term LIKE %s', f'{term}%'
+        return 's.term = %s', term
+
+    @staticmethod
+    def _snippet(text: Optional[str], keywords: List[str]) -> Optional[Dict[str, Any]]:
+        """定位最早出现的关键词，返回附近片段及片段内所有关键词的位置"""
+        if not text:
+            return None
+        normalized = _normalize(text)
+        # NFKC 可能改变长度（全角转半角长度不变，少数兼容字符除外），长度不一致时不做映射
+        if len(normalized) != len(text):
+            return None
+        hits = [pos for pos in (normalized.find(keyword) for keyword in keywords) if pos >= 0]
+        if not hits:
+            return None
+        start = max(0, min(hits) - SNIPPET_BEFORE)
+        end = min(len(text), start + SNIPPET_LENGTH)
+        window = normalized[start:end]
+        spans = []
+        for keyword in keywords:
+            pos = window.find(keyword)
+            while pos >= 0:
+                spans.append((pos, pos + len(keyword)))
+                pos = window.find(keyword, pos + len(keyword))
+        # 合并重叠的高亮区间（中文二元组相互重叠）
+        prefix = '…' if start > 0 else ''
+        highlights = []
+        for span_start, span_end in sorted(spans):
+            span_start, span_end = span_start + len(prefix), span_end + len(prefix)
+            if highlights and span_start <= highlights[-1][1]:
+                highlights[-1][1] = max(highlights[-1][1], span_end)
+            else:
+                highlights.append([span_start, span_end])
+        return {
+            'snippet': prefix + text[start:end] + ('…' if end < len(text) else ''),
+            'highlights': highlights
+        }
+
+    @staticmethod
+    def search(query: str, username: Optional[str], user_role: Optional[str],
+               limit: int = DEFAULT_SEARCH_LIMIT, offset: int = 0) -> Dict[str, Any]:
+        """
+        检索工单
+
+        Args:
+            query: 查询文本，多个词项之间为"且"
+            username / user_role: 当前用户，客户只能检索自己提交的工单
+            limit / offset: 分页
+
+        Returns:
+            dict: tickets（按相关度排序，含 score、matched_in、snippet、highlights）、has_more、limit、offset
+
+        Raises:
+            ValueError: 查询不合法
+        """
+        terms = TicketSearchService.parse_query(query)
+        if not terms:
+            raise ValueError('请输入搜索关键词')
+        limit = max(1, min(int(limit), MAX_SEARCH_LIMIT))
+        offset = max(0, min(int(offset), MAX_SEARCH_OFFSET))
+        empty = {'tickets': [], 'has_more': False, 'limit': limit, 'offset': offset}
+
+        if user_role == 'customer':
+            if not username:
+                return empty
+            owner = username
+        elif user_role in ('admin', 'user'):
+            owner = None
+        else:
+            return empty
+
+        conditions = [TicketSearchService._condition(term, prefix) for term, prefix in terms]
+
+        with db_connection('case') as conn:
+            cursor = conn.cursor()
+
+            # 工单总数取自统计计数表，避免 COUNT 全表
+            cursor.execute(
+                "SELECT COALESCE(SUM(ticket_count), 0) AS total FROM ticket_stat_counters WHERE dimension = 'priority'"
+            )
+            total = int((cursor.fetchone() or {}).get('total') or 0)
+
+            idfs = []
+            for sql, param in conditions:
+                cursor.execute(
+                    f"SELECT COUNT(DISTINCT s.ticket_id) AS df FROM ticket_search_terms s WHERE {sql}", (param,)
+                )
+                df = int((cursor.fetchone() or {}).get('df') or 0)
+                if df == 0:
+                    return empty
+                idfs.append(math.log(1 + max(total, df) / df))
+
+            case_score = ' '.join(f'WHEN {sql} THEN %s' for sql, _ in conditions)
+            case_group = ' '.join(f'WHEN {sql} THEN {i}' for i, (sql, _) in enumerate(conditions))
+            where = ' OR '.join(sql for sql, _ in conditions)
+            # 参数按占位符在 SQL 中出现的顺序: 评分 CASE、JOIN、WHERE、分组 CASE
+            params: List[Any] = []
+            for (_, param), idf in zip(conditions, idfs):
+                params.extend([param, idf])
+            join = ''
+            if owner is not None:
+                join = ('JOIN (SELECT ticket_id FROM tickets WHERE submit_user = %s '
+                        'UNION ALL SELECT ticket_id FROM tickets_archive WHERE submit_user = %s) t '
+                        'ON t.ticket_id = s.ticket_id')
+                params.extend([owner, owner])
+            params.extend(param for _, param in conditions)
+            params.extend(param for _, param in conditions)
+            params.extend([len(conditions), limit + 1, offset])
+
+            cursor.execute(
+                f"""
+                SELECT s.ticket_id, SUM((1 + LN(s.weight)) * CASE {case_score} ELSE 0 END) AS score
+                FROM ticket_search_terms s
+                {join}
+                WHERE ({where}) AND s.weight > 0
+                GROUP BY s.ticket_id
+                HAVING COUNT(DISTINCT CASE {case_group} END) = %s
+                ORDER BY score DESC, s.ticket_id DESC
+                LIMIT %s OFFSET %s
+                """,
+                params
+            )
+            ranked = cursor.fetchall()
+            has_more = len(ranked) > limit
+            ranked = ranked[:limit]
+            if not ranked:
+                return empty
+
+            ticket_ids = [row['ticket_id'] for row in ranked]
+            placeholders = ', '.join(['%s'] * len(ticket_ids))
+            columns = f"{', '.join(TICKET_LIST_COLUMNS)}, content, resolution"
+            cursor.execute(
+                f"SELECT {columns}, 0 AS archived FROM tickets WHERE ticket_id IN ({placeholders}) "
+                f"UNION ALL SELECT {columns}, 1 AS archived FROM tickets_archive WHERE ticket_id IN ({placeholders})",
+                ticket_ids + ticket_ids
+            )
+            tickets = {row['ticket_id']: row for row in cursor.fetchall()}
+
+            # 标题、正文、解决方案都没有命中关键词的工单，从消息中取摘要
+            # 整段查询词优先定位，其次是切分后的词项
+            keywords = list(dict.fromkeys(_TOKEN_RE.findall(_normalize(query)) + [term for term, _ in terms]))
+            snippets = {}
+            for ticket_id, ticket in tickets.items():
+                for field in ('title', 'content', 'resolution'):
+                    snippet = TicketSearchService._snippet(ticket.get(field), keywords)
+                    if snippet:
+                        snippets[ticket_id] = dict(snippet, matched_in=field)
+                        break
+            message_ids = [ticket_id for ticket_id in tickets if ticket_id not in snippets]
+            if message_ids:
+                id_placeholders = ', '.join(['%s'] * len(message_ids))
+                like = ' OR '.join(["content LIKE %s ESCAPE '!'"] * len(keywords))
+                like_params = message_ids + [_like_pattern(keyword) for keyword in keywords]
+                cursor.execute(
+                    f"""
+                    SELECT id, ticket_id, content FROM messages
+                    WHERE ticket_id IN ({id_placeholders}) AND ({like})
+                    UNION ALL
+                    SELECT id, ticket_id, content FROM messages_archive
+                    WHERE ticket_id IN ({id_placeholders}) AND ({like})
+                    ORDER BY id DESC
+                    """,
+                    like_params + like_params
+                )
+                for row in cursor.fetchall():
+                    if row['ticket_id'] in snippets:
+                        continue
+                    snippet = TicketSearchService._snippet(row['content'], keywords)
+                    if snippet:
+                        snippets[row['ticket_id']] = dict(snippet, matched_in='message')
+
+        results = []
+        for row in ranked:
+            ticket = tickets.get(row['ticket_id'])
+            if not ticket:
+                continue
+            ticket.pop('content', None)
+            ticket.pop('resolution', None)
+            if isinstance(ticket.get('create_time'), datetime):
+                ticket['create_time'] = ticket['create_time'].strftime(DATETIME_FORMAT)
+            snippet = snippets.get(row['ticket_id'], {})
+            ticket.update({
+                'archived': bool(ticket.get('archived')),
+                'score': round(float(row['score']), 4),
+                'matched_in': snippet.get('matched_in'),
+                'snippet': snippet.get('snippet'),
+                'highlights': snippet.get('highlights', [])
+            })
+            results.append(ticket)
+
+        logger.debug(f"工单检索 {query!r}: 词项 {[term for term, _ in terms]}，返回 {len(results)} 条")
+        return {'tickets': results, 'has_more': has_more, 'limit': limit, 'offset': offset}
@@ -0,0 +1,379 @@
+"""
+工单 SLA 服务类
+按优先级计算首次响应和解决期限，保存在 ticket_sla 表中，到期未达成时升级：
+
+- 创建工单时写入期限；状态离开 pending 或处理人员发送消息视为已响应，
+  completed / closed 视为已解决，重新打开时解决期限恢复计时
+- next_due 为最近一个未达成、未升级的期限，由 SQL 在每次更新时重新计算，按索引加载
+- 进程内调度线程用最小堆保存即将到期的定时器，在期限到达时唤醒，不轮询全部未关闭工单；
+  启动时及每隔 TICKET_SLA_RELOAD_INTERVAL 从表中加载一段时间内到期的定时器，重启后自动恢复
+- 到期时加锁重新确认条件后记录升级时间（多 worker 同时到期只升级一次），
+  通过 SocketIO 向处理人员推送 sla_breach 事件，升级邮件写入发件箱（services.mail_service）
+"""
+import heapq
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import config
+from common.database_context import db_connection
+from common.logger import logger
+
+
+DATETIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+SLA_KINDS = ('response', 'resolution')
+SLA_KIND_LABELS = {'response': '首次响应', 'resolution': '解决'}
+
+RESOLVED_STATUSES = ('completed', 'closed')
+
+# 不计入首次响应的消息发送者
+NON_RESPONSE_SENDERS = ('customer', 'system')
+
+# 最近一个未达成、未升级的期限（放在 SET 子句最后，使用本次更新后的值）
+NEXT_DUE_SQL = """next_due = NULLIF(LEAST(
+    IF(responded_at IS NULL AND response_escalated_at IS NULL, response_due, TIMESTAMP('9999-12-31')),
+    IF(resolved_at IS NULL AND resolution_escalated_at IS NULL, resolution_due, TIMESTAMP('9999-12-31'))
+), TIMESTAMP('9999-12-31'))"""
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def _parse_targets(value: str) -> Dict[str, int]:
+    """解析 'urgent:60,high:240' 格式的期限配置（分钟）"""
+    targets = {}
+    for item in (value or '').split(','):
+        if ':' not in item:
+            continue
+        priority, minutes = item.split(':', 1)
+        try:
+            targets[priority.strip()] = int(minutes)
+        except ValueError:
+            logger.warning(f"SLA 期限配置不合法: {item}")
+    return targets
+
+
+RESPONSE_TARGETS = _parse_targets(config.TICKET_SLA_RESPONSE_MINUTES)
+RESOLUTION_TARGETS = _parse_targets(config.TICKET_SLA_RESOLUTION_MINUTES)
+
+
+def _to_datetime(value) -> Optional[datetime]:
+    if value is None or isinstance(value, datetime):
+        return value
+    return datetime.strptime(str(value)[:19], DATETIME_FORMAT)
+
+
+def _format(value) -> Optional[str]:
+    return value.strftime(DATETIME_FORMAT) if isinstance(value, datetime) else value
+
+
+class TicketSlaService:
+    """工单 SLA 服务类"""
+
+    @staticmethod
+    def deadlines(priority: str, start) -> Tuple[datetime, datetime]:
+        """按优先级计算 (首次响应期限, 解决期限)，未配置的优先级使用 medium 的期限"""
+        start = _to_datetime(start)
+        response = RESPONSE_TARGETS.get(priority, RESPONSE_TARGETS.get('medium', 480))
+        resolution = RESOLUTION_TARGETS.get(priority, RESOLUTION_TARGETS.get('medium', 4320))
+        return start + timedelta(minutes=response), start + timedelta(minutes=resolution)
+
+    @staticmethod
+    def start(cursor, ticket_id: str, priority: str, create_time):
+        """在创建工单的事务内写入 SLA 期限并加入调度"""
+        response_due, resolution_due = TicketSlaService.deadlines(priority, create_time)
+        cursor.execute(
+            """
+            INSERT IGNORE INTO ticket_sla (ticket_id, priority, response_due, resolution_due, next_due)
+            VALUES (%s, %s, %s, %s, %s)
+            """,
+            (ticket_id, priority, response_due, resolution_due, min(response_due, resolution_due))
+        )
+        get_scheduler().schedule(ticket_id, min(response_due, resolution_due))
+
+    @staticmethod
+    def on_status_change(cursor, ticket_id: str, status: str, now):
+        TicketSlaService.on_status_changes(cursor, [ticket_id], status, now)
+
+    @staticmethod
+    def on_status_changes(cursor, ticket_ids: List[str], status: str, now):
+        """
+        在修改工单状态的事务内更新 SLA 状态（批量操作）
+
+        离开 pending 即视为已响应；completed / closed 记录解决时间，其他状态（重新打开）清除解决时间
+        """
+        if not ticket_ids:
+            return
+        responded = status != 'pending'
+        resolved = status in RESOLVED_STATUSES
+        placeholders = ', '.join(['%s'] * len(ticket_ids))
+        cursor.execute(
+            f"""
+            UPDATE ticket_sla SET
+                responded_at = IF(%s, COALESCE(responded_at, %s), responded_at),
+                resolved_at = IF(%s, COALESCE(resolved_at, %s), NULL),
+                {NEXT_DUE_SQL}
+            WHERE ticket_id IN ({placeholders})
+            """,
+            [responded, now, resolved, now] + list(ticket_ids)
+        )
+        if not resolved:
+            # 重新打开的工单解决期限恢复计时，可能早于已调度的定时器
+            cursor.execute(
+                f"SELECT ticket_id, next_due FROM ticket_sla WHERE ticket_id IN ({placeholders}) AND next_due IS NOT NULL",
+                list(ticket_ids)
+            )
+            scheduler = get_scheduler()
+            for row in cursor.fetchall():
+                scheduler.schedule(row['ticket_id'], row['next_due'])
+
+    @staticmethod
+    def on_message(cursor, ticket_id: str, sender: str, send_time):
+        """在写入消息的事务内记录首次响应（处理人员发送的第一条消息）"""
+        if sender in NON_RESPONSE_SENDERS:
+            return
+        cursor.execute(
+            f"""
+            UPDATE ticket_sla SET responded_at = %s, {NEXT_DUE_SQL}
+            WHERE ticket_id = %s AND responded_at IS NULL
+            """,
+            (send_time, ticket_id)
+        )
+
+    @staticmethod
+    def get(ticket_id: str) -> Optional[Dict[str, Any]]:
+        """查询工单 SLA 状态（时间已格式化，breached 表示各期限是否已超时）"""
+        with db_connection('case') as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                """
+                SELECT response_due, resolution_due, responded_at, resolved_at,
+                       response_escalated_at, resolution_escalated_at
+                FROM ticket_sla WHERE ticket_id = %s
+                """,
+                (ticket_id,)
+            )
+            row = cursor.fetchone()
+        if not row:
+            return None
+        now = datetime.now()
+        breached = {}
+        for kind, done in (('response', 'responded_at'), ('resolution', 'resolved_at')):
+            due = row[f'{kind}_due']
+            breached[kind] = (row[done] or now) > due
+        return dict({key: _format(value) for key, value in row.items()}, breached=breached)
+
+    @staticmethod
+    def process_due(ticket_id: str) -> Tuple[List[Dict[str, Any]], Optional[datetime]]:
+        """
+        处理到期的定时器：加锁确认期限仍未达成、未升级后记录升级时间
+
+        Returns:
+            (升级事件列表, 下一个期限)；条件已不满足（已响应、已升级、工单已删除）时事件为空
+        """
+        now = datetime.now().replace(microsecond=0)
+        events = []
+        with db_connection('case') as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                """
+                SELECT s.response_due, s.resolution_due, s.responded_at, s.resolved_at,
+                       s.response_escalated_at, s.resolution_escalated_at,
+                       t.title, t.priority, t.status, t.assignee, t.submit_user
+                FROM ticket_sla s JOIN tickets t ON t.ticket_id = s.ticket_id
+                WHERE s.ticket_id = %s FOR UPDATE
+                """,
+                (ticket_id,)
+            )
+            row = cursor.fetchone()
+            if not row:
+                conn.rollback()
+                return [], None
+
+            for kind, done in (('response', 'responded_at'), ('resolution', 'resolved_at')):
+                due = row[f'{kind}_due']
+                if row[done] is None and row[f'{kind}_escalated_at'] is None and due <= now:
+                    cursor.execute(
+                        f"UPDATE ticket_sla SET {kind}_escalated_at = %s WHERE ticket_id = %s",
+                        (now, ticket_id)
+                    )
+                    events.append({
+                        'ticket_id': ticket_id,
+                        'kind': kind,
+                        'due': _format(due),
+                        'title': row['title'],
+                        'priority': row['priority'],
+                        'status': row['status'],
+                        'assignee': row['assignee'],
+                        'submit_user': row['submit_user'],
+                    })
+            cursor.execute(f"UPDATE ticket_sla SET {NEXT_DUE_SQL} WHERE ticket_id = %s", (ticket_id,))
+            cursor.execute("SELECT next_due FROM ticket_sla WHERE ticket_id = %s", (ticket_id,))
+            next_due = (cursor.fetchone() or {}).get('next_due')
+            conn.commit()
+        return events, next_due
+
+    @staticmethod
+    def load_due(until: datetime) -> List[Dict[str, Any]]:
+        """按 next_due 索引加载在 until 之前到期的定时器（含已过期未处理的）"""
+        with db_connection('case') as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                "SELECT ticket_id, next_due FROM ticket_sla WHERE next_due < %s ORDER BY next_due",
+                (until,)
+            )
+            return cursor.fetchall()
+
+    @staticmethod
+    def escalate(event: Dict[str, Any]):
+        """推送升级事件并发送升级邮件"""
+        label = SLA_KIND_LABELS[event['kind']]
+        logger.warning(f"工单 {event['ticket_id']} {label}超时（期限 {event['due']}），已升级")
+        try:
+            from services.socketio_service import emit_sla_breach
+            emit_sla_breach(event)
+        except Exception as e:
+            logger.error(f"推送 SLA 升级事件失败：{e}")
+        try:
+            TicketSlaService._send_escalation_email(event)
+        except Exception as e:
+            logger.error(f"发送 SLA 升级邮件失败：{e}")
+
+    @staticmethod
+    def _escalation_recipients(event: Dict[str, Any]) -> List[str]:
+        from services.mail_service import MailService
+
+        recipients = [email.strip() for email in config.TICKET_SLA_ESCALATION_EMAILS.split(',') if email.strip()]
+        if event.get('assignee'):
+            email = MailService.user_email(event['assignee'])
+            if email:
+                recipients.append(email)
+        return recipients
+
+    @staticmethod
+    def _send_escalation_email(event: Dict[str, Any]):
+        """升级邮件写入发件箱，由后台发送线程发送"""
+        from services.mail_service import MailService
+
+        recipients = TicketSlaService._escalation_recipients(event)
+        if not recipients:
+            logger.debug(f"工单 {event['ticket_id']} SLA 升级邮件未发送：未配置收件人")
+            return
+
+        label = SLA_KIND_LABELS[event['kind']]
+        body = (f"工单 {event['ticket_id']}《{event['title']}》{label}已超过期限 {event['due']}。\n\n"
+                f"优先级: {event['priority']}\n状态: {event['status']}\n处理人: {event['assignee'] or '未分配'}\n\n"
+                f"{MailService.ticket_url(event['ticket_id'])}")
+        MailService.enqueue(recipients, f"[SLA 超时] {event['ticket_id']} {label}超时", body, category='sla')
+
+
+class SlaScheduler:
+    """
+    SLA 定时器调度（最小堆）
+
+    堆中只保存 TICKET_SLA_RELOAD_INTERVAL 两倍时间内到期的定时器，更远的由之后的加载补充；
+    同一工单只保留最近的一个期限，过期的堆项在弹出时丢弃
+    """
+
+    def __init__(self, reload_interval: int):
+        self.reload_interval = reload_interval
+        self._heap: List[Tuple[datetime, str]] = []
+        self._scheduled: Dict[str, datetime] = {}
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+
+    def _horizon(self) -> datetime:
+        return datetime.now() + timedelta(seconds=self.reload_interval * 2)
+
+    def schedule(self, ticket_id: str, due):
+        """加入或提前定时器（超出加载范围的由之后的加载补充）"""
+        due = _to_datetime(due)
+        if due is None or due > self._horizon():
+            return
+        with self._cond:
+            current = self._scheduled.get(ticket_id)
+            if current is not None and current <= due:
+                return
+            self._scheduled[ticket_id] = due
+            heapq.heappush(self._heap, (due, ticket_id))
+            if self._heap[0][1] == ticket_id:
+                self._cond.notify()
+
+    def _schedule_all(self, rows: Iterable[Dict[str, Any]]):
+        for row in rows:
+            self.schedule(row['ticket_id'], row['next_due'])
+
+    def _pop_due(self) -> List[str]:
+        """弹出已到期的工单（调用方持有锁）"""
+        now = datetime.now()
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            when, ticket_id = heapq.heappop(self._heap)
+            if self._scheduled.get(ticket_id) == when:
+                del self._scheduled[ticket_id]
+                due.append(ticket_id)
+        return due
+
+    def _run(self):
+        next_reload = 0.0
+        while True:
+            if time.monotonic() >= next_reload:
+                try:
+                    self._schedule_all(TicketSlaService.load_due(self._horizon()))
+                except Exception as e:
+                    logger.error(f"加载 SLA 定时器失败：{e}")
+                next_reload = time.monotonic() + self.reload_interval
+
+            with self._cond:
+                ticket_ids = self._pop_due()
+                if not ticket_ids:
+                    timeout = next_reload - time.monotonic()
+                    if self._heap:
+                        timeout = min(timeout, (self._heap[0][0] - datetime.now()).total_seconds())
+                    self._cond.wait(max(timeout, 0.05))
+                    continue
+
+            for ticket_id in ticket_ids:
+                try:
+                    events, next_due = TicketSlaService.process_due(ticket_id)
+                except Exception as e:
+                    logger.error(f"处理工单 {ticket_id} SLA 定时器失败：{e}")
+                    continue
+                for event in events:
+                    TicketSlaService.escalate(event)
+                self.schedule(ticket_id, next_due)
+
+    def start(self):
+        with self._cond:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name='ticket-sla', daemon=True)
+            self._thread.start()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                'timers': len(self._scheduled),
+                'next_due': _format(self._heap[0][0]) if self._heap else None,
+                'running': self._thread is not None
+            }
+
+
+def get_scheduler() -> SlaScheduler:
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                _scheduler = SlaScheduler(config.TICKET_SLA_RELOAD_INTERVAL)
+    return _scheduler
+
+
+def start_sla_scheduler():
+    """
+    启动 SLA 调度线程（工单库连接池就绪后调用），启动时从 ticket_sla 恢复未到期的定时器
+    TICKET_SLA_ENABLED 为 false 时不启动（期限仍会记录）
+    """
+    if not config.TICKET_SLA_ENABLED:
+        return
+    get_scheduler().start()
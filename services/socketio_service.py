@@ -1,60 +1,246 @@
 """
 SocketIO 事件服务 - 处理 WebSocket 事件
 工单系统实时通信
+
+房间划分:
+- ticket_<ticket_id>: 正在查看该工单的客户端（join 事件加入）
+- user_<username>: 该用户的所有连接（connect 时按会话自动加入）
+- staff: admin/user 角色的所有连接（connect 时自动加入）
+
+工单更新只发送到相关房间，不再向所有连接广播。
+工单房间的在线成员和输入状态由 services.presence_service 维护；
+工单房间内的消息、在线状态、输入提示和通知经 services.event_batcher 按时间窗口合并发送
 """
+import threading
 from flask import request, session
-from flask_socketio import emit, join_room, leave_room
-from datetime import datetime
+from flask_socketio import join_room, leave_room
 from common.database_context import db_connection
 from common.logger import logger
+from services.message_service import MessageService
+from common.socketio_bus import get_external_emitter
+from services.presence_service import presence
+from services.event_batcher import RoomEventBatcher
 
 # 全局 socketio 实例，用于从外部发送消息
 socketio_instance = None
+# 工单房间出站事件合并（SOCKETIO_BATCH_WINDOW_MS 为 0 时直接发送）
+event_batcher = None
+
+STAFF_ROLES = ('admin', 'user')
+STAFF_ROOM = 'staff'
+
+# 本进程的连接登记: sid -> (username, role)，username -> {sid}
+_sid_users = {}
+_user_sids = {}
+_registry_lock = threading.Lock()
+
+
+def user_room(username):
+    """用户房间名"""
+    return f'user_{username}'
+
+
+def ticket_room(ticket_id):
+    """工单房间名"""
+    return f'ticket_{ticket_id}'
+
+
+def _register_sid(sid, username, role):
+    with _registry_lock:
+        _sid_users[sid] = (username, role)
+        _user_sids.setdefault(username, set()).add(sid)
+
+
+def _unregister_sid(sid):
+    with _registry_lock:
+        entry = _sid_users.pop(sid, None)
+        if entry:
+            sids = _user_sids.get(entry[0])
+            if sids is not None:
+                sids.discard(sid)
+                if not sids:
+                    del _user_sids[entry[0]]
+    return entry
+
+
+def get_user_sids(username):
+    """获取用户在本进程的连接 sid 集合"""
+    with _registry_lock:
+        return set(_user_sids.get(username, ()))
+
+
+def get_connected_users():
+    """获取本进程在线用户 {username: 连接数}"""
+    with _registry_lock:
+        return {username: len(sids) for username, sids in _user_sids.items()}
+
+
+def _emit_to_room(event, data, room, skip_sid=None):
+    """发送事件到工单房间，启用合并时在时间窗口内与同房间的其他事件合并为一帧"""
+    if event_batcher is not None:
+        event_batcher.emit(event, data, room, skip_sid=skip_sid)
+    elif socketio_instance:
+        socketio_instance.emit(event, data, to=room, skip_sid=skip_sid)
+
+
+def get_batcher_stats():
+    """出站事件合并统计，未启用时返回 None"""
+    if event_batcher is None or not event_batcher.enabled:
+        return None
+    return event_batcher.get_stats()
+
+
+def _emit_presence(room):
+    """广播工单房间当前查看者"""
+    _emit_to_room('presence', {
+        'ticket_id': room[len('ticket_'):],
+        'viewers': presence.viewers(room)
+    }, room)
+
+
+def _emit_typing(room, member, typing, skip_sid=None):
+    _emit_to_room('typing', {
+        'ticket_id': room[len('ticket_'):],
+        'username': member['username'],
+        'display_name': member['display_name'],
+        'typing': typing
+    }, room, skip_sid=skip_sid)
+
+
+def _presence_sweeper(socketio):
+    """后台清理输入超时和心跳超时的连接"""
+    while True:
+        socketio.sleep(1)
+        try:
+            typing_expired, stale = presence.sweep()
+            for room, member in typing_expired:
+                _emit_typing(room, member, False)
+            for sid, room, member, changed in stale:
+                logger.info(f"{member['username']} 心跳超时，移出工单 {room[len('ticket_'):]} 查看者列表")
+                if changed:
+                    _emit_presence(room)
+        except Exception as e:
+            logger.error(f"在线状态清理失败：{e}")
+
+
+def can_access_ticket(ticket_id, username, role):
+    """客户只能加入自己提交的工单房间（含已归档的工单）"""
+    if role in STAFF_ROLES:
+        return True
+    if not username:
+        return False
+    with db_connection('case') as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT submit_user FROM tickets WHERE ticket_id = %s "
+            "UNION ALL SELECT submit_user FROM tickets_archive WHERE ticket_id = %s LIMIT 1",
+            (ticket_id, ticket_id)
+        )
+        ticket = cursor.fetchone()
+    return bool(ticket) and ticket.get('submit_user') == username
 
 
 def register_socketio_events(socketio):
     """注册SocketIO事件"""
-    global socketio_instance
+    global socketio_instance, event_batcher
     socketio_instance = socketio
-    """注册SocketIO事件"""
+    event_batcher = RoomEventBatcher(socketio)
+    socketio.start_background_task(_presence_sweeper, socketio)
 
     @socketio.on('connect')
     def handle_connect():
-        logger.info(f'客户端已连接：{request.sid}')
+        username = session.get('username')
+        role = session.get('role')
+        if username:
+            join_room(user_room(username))
+            if role in STAFF_ROLES:
+                join_room(STAFF_ROOM)
+            _register_sid(request.sid, username, role)
+        logger.info(f'客户端已连接：{request.sid} ({username or "未登录"})')
 
     @socketio.on('disconnect')
     def handle_disconnect():
+        # 房间成员由 SocketIO 在断开时自动清理，这里只清理本地登记
+        _unregister_sid(request.sid)
+        for room, member, changed in presence.remove_sid(request.sid):
+            if changed:
+                _emit_presence(room)
         logger.info(f'客户端已断开连接：{request.sid}')
 
+    @socketio.on('heartbeat')
+    def handle_heartbeat(data=None):
+        # 返回 False 时客户端应重新 join（如心跳超时已被移出查看者列表）
+        return {'success': presence.touch(request.sid)}
+
+    @socketio.on('typing')
+    def handle_typing(data):
+        ticket_id = (data or {}).get('ticket_id')
+        if not ticket_id:
+            return
+        room = ticket_room(ticket_id)
+        if presence.typing(room, request.sid):
+            _emit_typing(room, presence.member(room, request.sid), True, skip_sid=request.sid)
+
+    @socketio.on('typing_stop')
+    def handle_typing_stop(data):
+        ticket_id = (data or {}).get('ticket_id')
+        if not ticket_id:
+            return
+        room = ticket_room(ticket_id)
+        member = presence.member(room, request.sid)
+        if member and presence.stop_typing(room, request.sid):
+            _emit_typing(room, member, False, skip_sid=request.sid)
+
     @socketio.on('join')
     def handle_join(data):
         ticket_id = data.get('ticket_id')
-        username = data.get('username')
-        role = data.get('role')
+        # 身份以会话为准，不信任客户端上报的用户名和角色
+        username = session.get('username') or data.get('username')
+        role = session.get('role')
 
         if ticket_id:
-            room = f'ticket_{ticket_id}'
+            try:
+                allowed = can_access_ticket(ticket_id, session.get('username'), role)
+            except Exception as e:
+                logger.error(f"校验工单房间权限失败：{e}")
+                allowed = False
+            if not allowed:
+                logger.warning(f'{username} ({role}) 无权加入工单 {ticket_id} 聊天室')
+                return {'success': False, 'message': '无权访问此工单'}
+
+            room = ticket_room(ticket_id)
             join_room(room)
+            display_name = session.get('real_name') or username
+            accepted, changed = presence.join(room, request.sid, username, display_name, role)
+            if not accepted:
+                logger.warning(f'工单 {ticket_id} 查看者登记已满，{username} 不计入在线列表')
             logger.info(f'{username} ({role}) 加入了工单 {ticket_id} 聊天室')
 
-            emit('notification', {
-                'message': f'{username} 加入了聊天',
-                'role': role
-            }, room=room, skip_sid=request.sid)
+            # 同一用户多个标签页只通知一次
+            if changed:
+                _emit_to_room('notification', {
+                    'message': f'{display_name} 加入了聊天',
+                    'role': role
+                }, room, skip_sid=request.sid)
+                _emit_presence(room)
+            return {'success': True, 'viewers': presence.viewers(room)}
 
     @socketio.on('leave')
     def handle_leave(data):
         ticket_id = data.get('ticket_id')
-        username = data.get('username')
+        username = session.get('username') or data.get('username')
 
         if ticket_id:
-            room = f'ticket_{ticket_id}'
+            room = ticket_room(ticket_id)
             leave_room(room)
+            member, changed = presence.leave(room, request.sid)
             logger.info(f'{username} 离开了工单 {ticket_id} 聊天室')
 
-            emit('notification', {
-                'message': f'{username} 离开了聊天',
-            }, room=room, skip_sid=request.sid)
+            if changed:
+                _emit_to_room('notification', {
+                    'message': f"{member['display_name']} 离开了聊天",
+                }, room, skip_sid=request.sid)
+                _emit_presence(room)
 
     @socketio.on('send_message')
     def handle_send_message(data):
@@ -67,29 +253,28 @@ def register_socketio_events(socketio):
         if not all([ticket_id, sender, content]):
             return {'success': False, 'message': '消息参数不完整'}
 
+        # 写入消息会推进发送者游标、累加其他参与人未读数并广播到工单房间，必须先校验权限
         try:
-            with db_connection('case') as conn:
-                cursor = conn.cursor()
-                now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-                insert_sql = """
-                    INSERT INTO messages (ticket_id, sender, sender_name, content, send_time)
-                    VALUES (%s, %s, %s, %s, %s)
-                """
-                cursor.execute(insert_sql, (ticket_id, sender, sender_name, content, now))
-                conn.commit()
-                message_id = cursor.lastrowid
-
-            message_data = {
-                'id': message_id,
-                'ticket_id': ticket_id,
-                'sender': sender,
-                'sender_name': sender_name,
-                'content': content,
-                'send_time': now
-            }
-
-            room = f'ticket_{ticket_id}'
-            emit('new_message', message_data, room=room)
+            allowed = can_access_ticket(ticket_id, session.get('username'), sender)
+        except Exception as e:
+            logger.error(f"校验工单权限失败：{e}")
+            allowed = False
+        if not allowed:
+            logger.warning(f"{session.get('username')} ({sender}) 无权向工单 {ticket_id} 发送消息")
+            return {'success': False, 'message': '无权访问此工单'}
+
+        try:
+            message_data = MessageService.insert_message(ticket_id, sender, sender_name, content,
+                                                         username=session.get('username'))
+
+            room = ticket_room(ticket_id)
+            member = presence.member(room, request.sid)
+            if member and presence.stop_typing(room, request.sid):
+                _emit_typing(room, member, False, skip_sid=request.sid)
+
+            # 批量写入模式下 id 尚未分配，由写入线程提交后推送
+            if message_data['id'] is not None:
+                _emit_to_room('new_message', message_data, room)
 
             logger.info(f"工单 {ticket_id} 新消息: {sender_name}")
             return {'success': True, 'message': '消息发送成功'}
@@ -99,7 +284,11 @@ def register_socketio_events(socketio):
 
 
 def init_case_database():
-    """初始化工单系统数据库表"""
+    """
+    初始化工单系统数据库表
+
+    作为连接池就绪回调执行，失败时抛出异常，由连接池健康检查重试，建表完成前就绪探针返回 503
+    """
     try:
         with db_connection('case') as conn:
             cursor = conn.cursor()
@@ -139,16 +328,257 @@ def init_case_database():
                 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='工单聊天消息表'
             """
 
+            create_read_cursor_sql = """
+                CREATE TABLE IF NOT EXISTS ticket_read_cursors (
+                    username VARCHAR(50) NOT NULL COMMENT '用户名',
+                    ticket_id VARCHAR(32) NOT NULL COMMENT '工单ID',
+                    last_read_message_id INT NOT NULL DEFAULT 0 COMMENT '已读到的消息ID',
+                    unread_count INT NOT NULL DEFAULT 0 COMMENT '未读消息数',
+                    update_time DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP COMMENT '更新时间',
+                    PRIMARY KEY (username, ticket_id),
+                    INDEX idx_ticket_id (ticket_id)
+                ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='工单消息已读游标表'
+            """
+
             cursor.execute(create_ticket_sql)
             cursor.execute(create_message_sql)
+            cursor.execute(create_read_cursor_sql)
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS id_sequences (
+                    name VARCHAR(64) NOT NULL PRIMARY KEY COMMENT '序列名称',
+                    next_value BIGINT NOT NULL DEFAULT 1 COMMENT '下一个可分配的值'
+                ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='id 序列表'
+            """)
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS attachments (
+                    id INT AUTO_INCREMENT PRIMARY KEY COMMENT '附件ID',
+                    ticket_id VARCHAR(32) NOT NULL COMMENT '工单ID',
+                    filename VARCHAR(255) NOT NULL COMMENT '原始文件名',
+                    stored_path VARCHAR(512) NOT NULL COMMENT '存储路径/存储键',
+                    storage VARCHAR(16) NOT NULL DEFAULT 'static' COMMENT '存储后端: static（旧版 static 目录）/ local / s3',
+                    file_size BIGINT NOT NULL DEFAULT 0 COMMENT '文件大小（字节）',
+                    mime_type VARCHAR(100) DEFAULT NULL COMMENT 'MIME 类型',
+                    sha256 CHAR(64) DEFAULT NULL COMMENT '文件内容 SHA-256',
+                    uploaded_by VARCHAR(50) DEFAULT NULL COMMENT '上传人用户名',
+                    upload_time DATETIME NOT NULL COMMENT '上传时间',
+                    preview_status VARCHAR(16) DEFAULT NULL COMMENT '图片预览生成状态: pending / ready / failed，非图片为空',
+                    variants TEXT DEFAULT NULL COMMENT '图片缩略图/WebP 预览（JSON）',
+                    INDEX idx_ticket_id (ticket_id, id),
+                    INDEX idx_sha256 (sha256)
+                ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='工单附件表'
+            """)
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS ticket_stat_counters (
+                    dimension VARCHAR(16) NOT NULL COMMENT '统计维度: priority / assignee / product',
+                    dim_value VARCHAR(100) NOT NULL DEFAULT '' COMMENT '维度值（未分配为空字符串）',
+                    status VARCHAR(10) NOT NULL COMMENT '工单状态',
+                    ticket_count INT NOT NULL DEFAULT 0 COMMENT '工单数',
+                    PRIMARY KEY (dimension, dim_value, status)
+                ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='工单统计计数表'
+            """)
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS ticket_daily_stats (
+                    stat_date DATE NOT NULL PRIMARY KEY COMMENT '日期',
+                    created INT NOT NULL DEFAULT 0 COMMENT '新建工单数',
+                    closed INT NOT NULL DEFAULT 0 COMMENT '关闭工单数'
+                ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='工单每日统计表'
+            """)
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS ticket_search_terms (
+                    term VARCHAR(32) NOT NULL COMMENT '词项（中文二元组 / 小写英文单词、数字）',
+                    ticket_id VARCHAR(32) NOT NULL COMMENT '工单ID',
+                    weight INT NOT NULL DEFAULT 0 COMMENT '加权词频（标题 4、解决方案 2、正文和消息 1）',
+                    PRIMARY KEY (term, ticket_id),
+                    INDEX idx_ticket_id (ticket_id)
+                ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_bin COMMENT='工单检索倒排索引表'
+            """)
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS tickets_archive (
+                    id INT NOT NULL COMMENT '原工单自增ID(重启后自增值可能回退，不保证唯一)',
+                    ticket_id VARCHAR(32) NOT NULL PRIMARY KEY COMMENT '工单唯一标识ID',
+                    customer_name VARCHAR(100) NOT NULL COMMENT '客户名称',
+                    customer_contact_name VARCHAR(100) NOT NULL DEFAULT '' COMMENT '客户联系人姓名(当前登录用户)',
+                    customer_contact VARCHAR(50) NOT NULL COMMENT '客户联系方式',
+                    customer_email VARCHAR(100) NOT NULL COMMENT '客户邮箱',
+                    submit_user VARCHAR(100) NOT NULL DEFAULT '' COMMENT '提交工单的用户名(来自统一用户表)',
+                    product VARCHAR(50) NOT NULL COMMENT '涉及产品',
+                    issue_type VARCHAR(20) NOT NULL COMMENT '问题类型',
+                    priority VARCHAR(10) NOT NULL COMMENT '工单优先级',
+                    title VARCHAR(200) NOT NULL COMMENT '问题标题',
+                    content TEXT NOT NULL COMMENT '问题详情',
+                    resolution TEXT NULL COMMENT '解决方案',
+                    status VARCHAR(10) DEFAULT 'pending' COMMENT '工单状态',
+                    assignee VARCHAR(100) NULL COMMENT '处理人',
+                    create_time DATETIME NOT NULL COMMENT '创建时间',
+                    update_time DATETIME NOT NULL COMMENT '更新时间',
+                    archived_at DATETIME NOT NULL COMMENT '归档时间',
+                    INDEX idx_submit_user (submit_user),
+                    INDEX idx_archived_at (archived_at)
+                ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='归档工单表'
+            """)
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS messages_archive (
+                    id INT NOT NULL COMMENT '原消息ID',
+                    ticket_id VARCHAR(32) NOT NULL COMMENT '工单ID',
+                    sender VARCHAR(20) NOT NULL COMMENT '发送者',
+                    sender_name VARCHAR(100) NOT NULL COMMENT '发送者名称',
+                    content TEXT NOT NULL COMMENT '消息内容',
+                    send_time DATETIME NOT NULL COMMENT '发送时间',
+                    PRIMARY KEY (ticket_id, id)
+                ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='归档工单聊天消息表'
+            """)
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS ticket_sla (
+                    ticket_id VARCHAR(32) NOT NULL PRIMARY KEY COMMENT '工单ID',
+                    priority VARCHAR(10) NOT NULL COMMENT '计算期限时的优先级',
+                    response_due DATETIME NOT NULL COMMENT '首次响应期限',
+                    resolution_due DATETIME NOT NULL COMMENT '解决期限',
+                    responded_at DATETIME NULL COMMENT '首次响应时间',
+                    resolved_at DATETIME NULL COMMENT '解决时间（重新打开时清除）',
+                    response_escalated_at DATETIME NULL COMMENT '首次响应超时升级时间',
+                    resolution_escalated_at DATETIME NULL COMMENT '解决超时升级时间',
+                    next_due DATETIME NULL COMMENT '最近一个未达成、未升级的期限',
+                    INDEX idx_next_due (next_due)
+                ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='工单 SLA 期限表'
+            """)
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS mail_outbox (
+                    id BIGINT AUTO_INCREMENT PRIMARY KEY COMMENT '邮件ID',
+                    category VARCHAR(32) NOT NULL DEFAULT 'general' COMMENT '类别: ticket/sla/contact/general',
+                    recipient VARCHAR(255) NOT NULL COMMENT '收件人',
+                    subject VARCHAR(255) NOT NULL COMMENT '主题',
+                    body TEXT NOT NULL COMMENT '正文',
+                    digest_key VARCHAR(255) NULL COMMENT '摘要合并键（为空时单独发送）',
+                    status VARCHAR(16) NOT NULL DEFAULT 'pending' COMMENT '状态: pending/sent/failed',
+                    attempts INT NOT NULL DEFAULT 0 COMMENT '已尝试次数',
+                    next_attempt_at DATETIME NOT NULL COMMENT '下次发送时间',
+                    last_error VARCHAR(500) NULL COMMENT '最近一次失败原因',
+                    created_at DATETIME NOT NULL COMMENT '创建时间',
+                    sent_at DATETIME NULL COMMENT '发送时间',
+                    INDEX idx_status_next_attempt (status, next_attempt_at),
+                    INDEX idx_digest_key (digest_key, status)
+                ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='邮件发件箱表'
+            """)
             conn.commit()
             logger.info("工单系统数据库表初始化成功")
     except Exception as e:
         logger.error(f"工单系统数据库初始化失败：{e}")
+        raise
+
+
+def emit_new_message(message):
+    """推送新消息到工单房间（HTTP 接口发送的消息也需要实时推送）"""
+    global socketio_instance
+    room = ticket_room(message['ticket_id'])
+    if socketio_instance:
+        _emit_to_room('new_message', message, room)
+        return
 
+    emitter = get_external_emitter()
+    if emitter:
+        emitter.emit('new_message', message, namespace='/', room=room)
 
-def emit_ticket_update(ticket_id):
-    """发送工单更新事件到所有客户端"""
+
+def emit_upload_progress(username, progress):
+    """推送分片上传进度到上传人的所有连接"""
     global socketio_instance
+    room = user_room(username)
     if socketio_instance:
-        socketio_instance.emit('ticket_update', {'ticket_id': ticket_id})
+        socketio_instance.emit('upload_progress', progress, to=room)
+        return
+
+    emitter = get_external_emitter()
+    if emitter:
+        emitter.emit('upload_progress', progress, namespace='/', room=room)
+
+
+def _ticket_update_rooms(ticket_id, submit_user=None, assignee=None, extra_users=()):
+    """工单更新需要通知的房间：工单房间、处理人员、提交人"""
+    if submit_user is None and assignee is None:
+        try:
+            with db_connection('case') as conn:
+                cursor = conn.cursor()
+                cursor.execute("SELECT submit_user, assignee FROM tickets WHERE ticket_id = %s", (ticket_id,))
+                ticket = cursor.fetchone() or {}
+            submit_user = ticket.get('submit_user')
+            assignee = ticket.get('assignee')
+        except Exception as e:
+            logger.error(f"查询工单 {ticket_id} 相关用户失败：{e}")
+
+    rooms = [ticket_room(ticket_id), STAFF_ROOM]
+    for username in (submit_user, assignee, *extra_users):
+        if username and user_room(username) not in rooms:
+            rooms.append(user_room(username))
+    return rooms
+
+
+def emit_ticket_update(ticket_id, submit_user=None, assignee=None, extra_users=()):
+    """发送工单更新事件
+
+    只发送到工单房间、staff 房间、处理人和提交人的用户房间，同一连接在多个房间中只收到一次。
+    未传入 submit_user/assignee 时从数据库查询。
+
+    在 SocketIO 服务进程中通过 socketio 实例发送（配置消息总线时自动转发到其他 worker）；
+    在没有 SocketIO 实例的进程中（后台任务、脚本）通过只写的消息总线客户端发送
+
+    Args:
+        ticket_id: 工单ID
+        submit_user: 提交人用户名
+        assignee: 处理人用户名
+        extra_users: 其他需要通知的用户（如被替换的原处理人）
+    """
+    global socketio_instance
+    rooms = _ticket_update_rooms(ticket_id, submit_user, assignee, extra_users)
+    payload = {'ticket_id': ticket_id}
+
+    if socketio_instance:
+        socketio_instance.emit('ticket_update', payload, to=rooms)
+        return
+
+    emitter = get_external_emitter()
+    if emitter:
+        emitter.emit('ticket_update', payload, namespace='/', room=rooms)
+
+
+def emit_sla_breach(event):
+    """推送 SLA 超时升级事件到处理人员（staff 房间）
+
+    Args:
+        event: {'ticket_id', 'kind', 'due', 'title', 'priority', 'status', 'assignee', 'submit_user'}
+    """
+    global socketio_instance
+    if socketio_instance:
+        socketio_instance.emit('sla_breach', event, to=STAFF_ROOM)
+        return
+
+    emitter = get_external_emitter()
+    if emitter:
+        emitter.emit('sla_breach', event, namespace='/', room=STAFF_ROOM)
+
+
+def emit_tickets_update(updates):
+    """批量操作后合并发送工单更新事件
+
+    每个受影响的房间只发送一次，payload 为该房间相关的工单 {'ticket_ids': [...]}；
+    工单房间只涉及一个工单，同时带上 ticket_id 兼容单个更新的处理逻辑
+
+    Args:
+        updates: [{'ticket_id', 'submit_user', 'assignee', 'extra_users'}]
+    """
+    global socketio_instance
+    room_tickets = {}
+    for update in updates:
+        rooms = _ticket_update_rooms(update['ticket_id'], update.get('submit_user') or '',
+                                     update.get('assignee'), update.get('extra_users', ()))
+        for room in rooms:
+            room_tickets.setdefault(room, []).append(update['ticket_id'])
+
+    emitter = None if socketio_instance else get_external_emitter()
+    for room, ticket_ids in room_tickets.items():
+        payload = {'ticket_ids': ticket_ids}
+        if len(ticket_ids) == 1:
+            payload['ticket_id'] = ticket_ids[0]
+        if socketio_instance:
+            socketio_instance.emit('ticket_update', payload, to=room)
+        elif emitter:
+            emitter.emit('ticket_update', payload, namespace='/', room=room)
@@ -0,0 +1,299 @@
+"""
+工单统计服务类
+看板统计从计数表读取，不再扫描工单表：
+
+- ticket_stat_counters: 按 (维度, 维度值, 状态) 计数，维度为 priority / assignee / product；
+  状态合计由任一维度按状态求和得到。未分配的工单 assignee 维度值为空字符串
+- ticket_daily_stats: 每日新建、关闭工单数
+
+计数在修改工单的同一事务内更新（apply_change），与工单数据一起提交或回滚；
+读取量与维度值个数相关，与工单总数无关。
+后台定期与 tickets 表核对（reconcile），修正手工改库等造成的偏差
+"""
+import threading
+import time
+from collections import Counter
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+import config
+from common.database_context import db_connection
+from common.logger import logger
+from services.ticket_service import VALID_STATUSES
+
+
+DIMENSIONS = ('priority', 'assignee', 'product')
+
+# 修改工单前加锁读取的列（计数需要修改前的值）
+TICKET_STAT_COLUMNS = 'ticket_id, submit_user, assignee, status, priority, product'
+
+MAX_TREND_DAYS = 366
+
+_reconciler_thread: Optional[threading.Thread] = None
+_reconciler_lock = threading.Lock()
+
+
+def _dim_value(ticket: Dict[str, Any], dimension: str) -> str:
+    return ticket.get(dimension) or ''
+
+
+def _to_date(value) -> date:
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return datetime.strptime(str(value)[:10], '%Y-%m-%d').date()
+
+
+class TicketStatsService:
+    """工单统计服务类"""
+
+    @staticmethod
+    def lock_ticket(cursor, ticket_id: str) -> Optional[Dict[str, Any]]:
+        """
+        在调用方事务内加锁读取工单（SELECT ... FOR UPDATE）
+
+        并发修改同一工单时按顺序执行，保证计数按真实的修改前状态增减
+        """
+        cursor.execute(f"SELECT {TICKET_STAT_COLUMNS} FROM tickets WHERE ticket_id = %s FOR UPDATE", (ticket_id,))
+        return cursor.fetchone()
+
+    @staticmethod
+    def lock_tickets(cursor, ticket_ids: List[str]) -> List[Dict[str, Any]]:
+        """批量加锁读取工单（按 ticket_id 顺序加锁，减少并发批量操作之间的死锁）"""
+        if not ticket_ids:
+            return []
+        placeholders = ', '.join(['%s'] * len(ticket_ids))
+        cursor.execute(
+            f"SELECT {TICKET_STAT_COLUMNS} FROM tickets WHERE ticket_id IN ({placeholders}) "
+            f"ORDER BY ticket_id FOR UPDATE",
+            list(ticket_ids)
+        )
+        return cursor.fetchall()
+
+    @staticmethod
+    def apply_change(cursor, before: Optional[Dict[str, Any]], after: Optional[Dict[str, Any]], now=None):
+        """
+        在调用方事务内按工单修改前后的值更新计数
+
+        Args:
+            cursor: 修改工单所用事务的游标
+            before: 修改前的工单（新建时为 None），需包含 status 及各维度列
+            after: 修改后的工单（删除时为 None）
+            now: 修改时间（datetime 或 'YYYY-MM-DD HH:MM:SS'），决定计入哪一天
+        """
+        TicketStatsService.apply_changes(cursor, [(before, after)], now)
+
+    @staticmethod
+    def apply_changes(cursor, changes: List[Tuple[Optional[Dict[str, Any]], Optional[Dict[str, Any]]]], now=None):
+        """
+        在调用方事务内合并更新多个工单的计数（批量操作），changes 为 [(修改前, 修改后)]
+        """
+        deltas = Counter()
+        created = closed = 0
+        for before, after in changes:
+            for ticket, delta in ((before, -1), (after, 1)):
+                if ticket is None:
+                    continue
+                for dimension in DIMENSIONS:
+                    deltas[(dimension, _dim_value(ticket, dimension), ticket.get('status') or 'pending')] += delta
+            if before is None and after is not None:
+                created += 1
+            if (after is not None and after.get('status') == 'closed'
+                    and (before is None or before.get('status') != 'closed')):
+                closed += 1
+
+        # 按主键顺序更新，减少并发事务之间的死锁
+        rows = [(dimension, value, status, delta)
+                for (dimension, value, status), delta in sorted(deltas.items()) if delta]
+        if rows:
+            cursor.executemany(
+                """
+                INSERT INTO ticket_stat_counters (dimension, dim_value, status, ticket_count)
+                VALUES (%s, %s, %s, %s)
+                ON DUPLICATE KEY UPDATE ticket_count = ticket_count + VALUES(ticket_count)
+                """,
+                rows
+            )
+
+        if created or closed:
+            cursor.execute(
+                """
+                INSERT INTO ticket_daily_stats (stat_date, created, closed) VALUES (%s, %s, %s)
+                ON DUPLICATE KEY UPDATE created = created + VALUES(created), closed = closed + VALUES(closed)
+                """,
+                (_to_date(now or datetime.now()), created, closed)
+            )
+
+    @staticmethod
+    def get_stats(days: int = 30) -> Dict[str, Any]:
+        """
+        看板统计
+
+        Args:
+            days: 每日趋势的天数（含今天）
+
+        Returns:
+            dict: total, by_status, by_priority / by_assignee / by_product（按总数倒序的
+                [{value, total, by_status}]），trend（[{date, created, closed}]）
+        """
+        days = max(1, min(int(days), MAX_TREND_DAYS))
+        start = date.today() - timedelta(days=days - 1)
+
+        with db_connection('case') as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                "SELECT dimension, dim_value, status, ticket_count FROM ticket_stat_counters WHERE ticket_count <> 0"
+            )
+            counters = cursor.fetchall()
+            cursor.execute(
+                "SELECT stat_date, created, closed FROM ticket_daily_stats WHERE stat_date >= %s ORDER BY stat_date",
+                (start,)
+            )
+            daily = {_to_date(row['stat_date']): row for row in cursor.fetchall()}
+
+        groups: Dict[str, Dict[str, Dict[str, Any]]] = {dimension: {} for dimension in DIMENSIONS}
+        by_status = {status: 0 for status in VALID_STATUSES}
+        for row in counters:
+            group = groups.setdefault(row['dimension'], {})
+            item = group.setdefault(row['dim_value'], {'value': row['dim_value'], 'total': 0, 'by_status': {}})
+            item['total'] += row['ticket_count']
+            item['by_status'][row['status']] = item['by_status'].get(row['status'], 0) + row['ticket_count']
+            # 每个工单在每个维度各计一次，状态合计取其中一个维度
+            if row['dimension'] == DIMENSIONS[0]:
+                by_status[row['status']] = by_status.get(row['status'], 0) + row['ticket_count']
+
+        trend = []
+        for offset in range(days):
+            day = start + timedelta(days=offset)
+            row = daily.get(day)
+            trend.append({
+                'date': day.strftime('%Y-%m-%d'),
+                'created': row['created'] if row else 0,
+                'closed': row['closed'] if row else 0
+            })
+
+        result = {'total': sum(by_status.values()), 'by_status': by_status, 'trend': trend}
+        for dimension in DIMENSIONS:
+            result[f'by_{dimension}'] = sorted(groups[dimension].values(), key=lambda item: -item['total'])
+        return result
+
+    @staticmethod
+    def reconcile(dry_run: bool = False) -> Dict[str, Any]:
+        """
+        与 tickets 表（含 tickets_archive）核对并修正计数
+
+        在一个一致性快照（REPEATABLE READ）内读取计数表和工单表，不加锁：计数与工单在同一事务内提交，
+        快照中二者一致。偏差按差值（期望 - 快照值）逐行修正，每行一个短事务，
+        快照之后其他事务对计数的增减不受影响，也不会被覆盖。
+        每日关闭数按关闭事件累计，tickets 表没有关闭时间，只核对每日新建数
+
+        Returns:
+            dict: checked（核对的计数项数）、corrected（修正项数）、drift（偏差样例）
+        """
+        with db_connection('case') as conn:
+            cursor = conn.cursor()
+            cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ")
+            cursor.execute("START TRANSACTION WITH CONSISTENT SNAPSHOT")
+            cursor.execute("SELECT dimension, dim_value, status, ticket_count FROM ticket_stat_counters")
+            current = {(row['dimension'], row['dim_value'], row['status']): row['ticket_count']
+                       for row in cursor.fetchall()}
+            cursor.execute("SELECT stat_date, created FROM ticket_daily_stats")
+            current_daily = {_to_date(row['stat_date']): row['created'] for row in cursor.fetchall()}
+
+            # 归档的工单仍计入统计
+            expected = {}
+            for dimension in DIMENSIONS:
+                cursor.execute(
+                    f"""
+                    SELECT COALESCE({dimension}, '') AS dim_value, COALESCE(status, 'pending') AS status,
+                           COUNT(*) AS ticket_count
+                    FROM (
+                        SELECT {dimension}, status FROM tickets
+                        UNION ALL SELECT {dimension}, status FROM tickets_archive
+                    ) AS all_tickets GROUP BY 1, 2
+                    """
+                )
+                for row in cursor.fetchall():
+                    expected[(dimension, row['dim_value'], row['status'])] = row['ticket_count']
+            cursor.execute(
+                """
+                SELECT DATE(create_time) AS stat_date, COUNT(*) AS created
+                FROM (
+                    SELECT create_time FROM tickets UNION ALL SELECT create_time FROM tickets_archive
+                ) AS all_tickets GROUP BY 1
+                """
+            )
+            expected_daily = {_to_date(row['stat_date']): row['created'] for row in cursor.fetchall()}
+            conn.rollback()
+
+            drift = [(key, current.get(key, 0), expected.get(key, 0)) for key in sorted(set(current) | set(expected))
+                     if current.get(key, 0) != expected.get(key, 0)]
+            daily_drift = [(day, current_daily.get(day, 0), expected_daily.get(day, 0))
+                           for day in sorted(set(current_daily) | set(expected_daily))
+                           if current_daily.get(day, 0) != expected_daily.get(day, 0)]
+
+            if not dry_run:
+                for key, cur, exp in drift:
+                    cursor.execute(
+                        """
+                        INSERT INTO ticket_stat_counters (dimension, dim_value, status, ticket_count)
+                        VALUES (%s, %s, %s, %s)
+                        ON DUPLICATE KEY UPDATE ticket_count = ticket_count + %s
+                        """,
+                        (*key, exp - cur, exp - cur)
+                    )
+                    cursor.execute(
+                        """
+                        DELETE FROM ticket_stat_counters
+                        WHERE dimension = %s AND dim_value = %s AND status = %s AND ticket_count = 0
+                        """,
+                        key
+                    )
+                    conn.commit()
+                for day, cur, exp in daily_drift:
+                    cursor.execute(
+                        """
+                        INSERT INTO ticket_daily_stats (stat_date, created, closed) VALUES (%s, %s, 0)
+                        ON DUPLICATE KEY UPDATE created = created + %s
+                        """,
+                        (day, exp - cur, exp - cur)
+                    )
+                    conn.commit()
+
+        corrected = len(drift) + len(daily_drift)
+        if corrected:
+            logger.warning(f"工单统计计数偏差 {corrected} 项{'（未修正）' if dry_run else '，已修正'}: "
+                           f"{(drift + daily_drift)[:5]}")
+        return {
+            'checked': len(set(current) | set(expected)) + len(set(current_daily) | set(expected_daily)),
+            'corrected': 0 if dry_run else corrected,
+            'drift': [{'key': list(key) if isinstance(key, tuple) else key.strftime('%Y-%m-%d'),
+                       'current': cur, 'expected': exp}
+                      for key, cur, exp in (drift + daily_drift)[:20]]
+        }
+
+    @staticmethod
+    def _reconcile_loop(interval: int):
+        while True:
+            try:
+                TicketStatsService.reconcile()
+            except Exception as e:
+                logger.error(f"工单统计核对失败：{e}")
+            time.sleep(interval)
+
+    @staticmethod
+    def start_reconciler():
+        """
+        启动后台定期核对线程（工单库连接池就绪后调用，启动时先核对一次）
+        TICKET_STATS_RECONCILE_INTERVAL 为 0 时不启动，可改用 scripts/reconcile_ticket_stats.py 定时执行
+        """
+        global _reconciler_thread
+        interval = config.TICKET_STATS_RECONCILE_INTERVAL
+        if interval <= 0:
+            return
+        with _reconciler_lock:
+            if _reconciler_thread is not None:
+                return
+            _reconciler_thread = threading.Thread(target=TicketStatsService._reconcile_loop, args=(interval,),
+                                                  name='ticket-stats-reconcile', daemon=True)
+            _reconciler_thread.start()
@@ -0,0 +1,325 @@
+"""
+工单服务类
+统一管理工单查询相关的业务逻辑
+
+工单列表使用 (create_time, id) 键集分页：
+- 按 create_time DESC, id DESC 排序，游标记录上一页最后一条的 (create_time, id)
+- 下一页条件为 create_time < ? OR (create_time = ? AND id < ?)，翻页深度不影响性能
+- 各过滤条件组合对应 database/patches/v2.2_to_v2.3/001_ticket_list_indexes.sql 中的复合索引
+
+批量操作（bulk_update）在一个事务内加锁读取全部工单，用一条 UPDATE ... WHERE ticket_id IN (...) 修改，
+逐个返回处理结果
+"""
+import base64
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+from common.statement_cache import register_statement, fetch_all
+from common.database_context import db_connection
+from common.logger import logger
+
+
+VALID_STATUSES = ('pending', 'processing', 'completed', 'closed')
+STATUS_LABELS = {'pending': '待处理', 'processing': '处理中', 'completed': '已解决', 'closed': '已关闭'}
+VALID_PRIORITIES = ('low', 'medium', 'high', 'urgent')
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+# 列表视图返回的列
+TICKET_LIST_COLUMNS = (
+    'id', 'ticket_id', 'customer_name', 'customer_contact_name', 'customer_contact', 'customer_email',
+    'submit_user', 'product', 'issue_type', 'priority', 'title', 'status', 'assignee', 'create_time'
+)
+
+DATETIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# 批量操作: 动作 -> 修改的列
+BULK_ACTIONS = {
+    'status': 'status',
+    'assign': 'assignee',
+    'close': 'status',
+}
+MAX_BULK_TICKETS = 200
+
+
+class TicketService:
+    """工单服务类"""
+
+    @staticmethod
+    def encode_cursor(create_time: datetime, row_id: int) -> str:
+        """将 (create_time, id) 编码为不透明的分页游标"""
+        raw = f"{create_time.strftime(DATETIME_FORMAT)}|{row_id}"
+        return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+    @staticmethod
+    def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+        """
+        解码分页游标
+
+        Raises:
+            ValueError: 游标格式不合法
+        """
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            raw = base64.urlsafe_b64decode(padded.encode('ascii')).decode('utf-8')
+            time_str, row_id = raw.rsplit('|', 1)
+            return datetime.strptime(time_str, DATETIME_FORMAT), int(row_id)
+        except Exception:
+            raise ValueError('分页游标不合法')
+
+    @staticmethod
+    def _parse_date(value: str, field: str) -> datetime:
+        """解析日期参数，支持 YYYY-MM-DD 和 YYYY-MM-DD HH:MM:SS"""
+        for fmt in (DATETIME_FORMAT, '%Y-%m-%d'):
+            try:
+                return datetime.strptime(value, fmt)
+            except ValueError:
+                continue
+        raise ValueError(f'{field} 日期格式不合法，应为 YYYY-MM-DD')
+
+    @staticmethod
+    def _parse_choices(value: str, valid: Tuple[str, ...], field: str) -> List[str]:
+        """解析逗号分隔的枚举参数"""
+        choices = []
+        for item in value.split(','):
+            item = item.strip()
+            if not item:
+                continue
+            if item not in valid:
+                raise ValueError(f'{field} 值不合法: {item}')
+            if item not in choices:
+                choices.append(item)
+        return choices
+
+    @staticmethod
+    def parse_list_filters(args, user_role: str, username: str) -> Dict[str, Any]:
+        """
+        从请求参数解析工单列表过滤条件
+
+        Args:
+            args: request.args
+            user_role: 当前用户角色
+            username: 当前用户名
+
+        Returns:
+            过滤条件字典
+
+        Raises:
+            ValueError: 参数不合法
+        """
+        filters: Dict[str, Any] = {}
+
+        status = args.get('status', '').strip()
+        if status:
+            filters['status'] = TicketService._parse_choices(status, VALID_STATUSES, 'status')
+
+        priority = args.get('priority', '').strip()
+        if priority:
+            filters['priority'] = TicketService._parse_choices(priority, VALID_PRIORITIES, 'priority')
+
+        product = args.get('product', '').strip()
+        if product:
+            filters['product'] = product
+
+        date_from = args.get('date_from', '').strip()
+        if date_from:
+            filters['date_from'] = TicketService._parse_date(date_from, 'date_from')
+
+        date_to = args.get('date_to', '').strip()
+        if date_to:
+            parsed = TicketService._parse_date(date_to, 'date_to')
+            # 只给日期时包含当天全天
+            if len(date_to) == 10:
+                parsed += timedelta(days=1)
+            filters['date_to'] = parsed
+
+        # customer 角色: 只能看到自己创建的工单，忽略处理人相关条件
+        if user_role == 'customer':
+            filters['submit_user'] = username
+            return filters
+
+        assignee = args.get('assignee', '').strip()
+        my_only = args.get('my_only', 'false').lower() == 'true'
+        if my_only:
+            filters['assignee'] = username
+        elif assignee:
+            filters['assignee'] = assignee
+
+        return filters
+
+    @staticmethod
+    def build_list_query(filters: Dict[str, Any], cursor: Optional[Tuple[datetime, int]],
+                         limit: int) -> Tuple[str, str, tuple]:
+        """
+        组装工单列表查询
+
+        相同过滤条件组合生成相同的 SQL，按组合注册为预编译语句。
+
+        Returns:
+            (statement_name, sql, params)
+        """
+        conditions = []
+        params: List[Any] = []
+        shape = []
+
+        # 等值条件放在前面，与复合索引前缀一致
+        for field in ('submit_user', 'assignee', 'product'):
+            if field in filters:
+                conditions.append(f'{field} = %s')
+                params.append(filters[field])
+                shape.append(field)
+
+        for field in ('status', 'priority'):
+            values = filters.get(field)
+            if values:
+                if len(values) == 1:
+                    conditions.append(f'{field} = %s')
+                else:
+                    conditions.append(f"{field} IN ({', '.join(['%s'] * len(values))})")
+                params.extend(values)
+                shape.append(f'{field}{len(values)}')
+
+        if 'date_from' in filters:
+            conditions.append('create_time >= %s')
+            params.append(filters['date_from'])
+            shape.append('from')
+
+        if 'date_to' in filters:
+            conditions.append('create_time < %s')
+            params.append(filters['date_to'])
+            shape.append('to')
+
+        if cursor:
+            cursor_time, cursor_id = cursor
+            conditions.append('(create_time < %s OR (create_time = %s AND id < %s))')
+            params.extend([cursor_time, cursor_time, cursor_id])
+            shape.append('after')
+
+        sql = f"SELECT {', '.join(TICKET_LIST_COLUMNS)} FROM tickets"
+        if conditions:
+            sql += ' WHERE ' + ' AND '.join(conditions)
+        sql += ' ORDER BY create_time DESC, id DESC LIMIT %s'
+        params.append(limit + 1)
+
+        name = f"case.ticket_list[{','.join(shape)}]"
+        return name, sql, tuple(params)
+
+    @staticmethod
+    def list_tickets(filters: Dict[str, Any], cursor: Optional[str] = None,
+                     limit: int = DEFAULT_PAGE_SIZE) -> Dict[str, Any]:
+        """
+        查询工单列表（键集分页）
+
+        Args:
+            filters: parse_list_filters 返回的过滤条件
+            cursor: 上一页返回的 next_cursor
+            limit: 每页数量
+
+        Returns:
+            {'tickets': [...], 'next_cursor': str | None, 'has_more': bool, 'limit': int}
+        """
+        limit = max(1, min(int(limit or DEFAULT_PAGE_SIZE), MAX_PAGE_SIZE))
+        decoded = TicketService.decode_cursor(cursor) if cursor else None
+
+        name, sql, params = TicketService.build_list_query(filters, decoded, limit)
+        register_statement(name, 'case', sql)
+        rows = fetch_all(name, params)
+
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        next_cursor = None
+        if has_more and rows:
+            last = rows[-1]
+            next_cursor = TicketService.encode_cursor(last['create_time'], last['id'])
+
+        for row in rows:
+            row['create_time'] = row['create_time'].strftime(DATETIME_FORMAT)
+
+        logger.info(f"工单列表查询 {name}: {len(rows)} 条, has_more={has_more}")
+        return {
+            'tickets': rows,
+            'next_cursor': next_cursor,
+            'has_more': has_more,
+            'limit': limit
+        }
+
+    @staticmethod
+    def bulk_update(ticket_ids: List[str], action: str, value: Optional[str] = None) -> Dict[str, Any]:
+        """
+        批量修改工单状态或处理人
+
+        Args:
+            ticket_ids: 工单ID列表
+            action: status（修改状态）/ assign（分配处理人）/ close（关闭）
+            value: status 时为新状态，assign 时为处理人用户名
+
+        Returns:
+            dict: results（[{ticket_id, result}]，result 为 updated / unchanged / not_found）、
+                updated（已修改的工单，修改前后的 submit_user、assignee，用于发送通知）
+
+        Raises:
+            ValueError: 参数不合法
+        """
+        from services.stats_service import TicketStatsService
+        from services.sla_service import TicketSlaService
+        from services.mail_service import MailService
+
+        if not isinstance(ticket_ids, list) or not ticket_ids:
+            raise ValueError('请选择工单')
+        ticket_ids = list(dict.fromkeys(str(ticket_id).strip() for ticket_id in ticket_ids if ticket_id))
+        if len(ticket_ids) > MAX_BULK_TICKETS:
+            raise ValueError(f'单次最多处理 {MAX_BULK_TICKETS} 个工单')
+        if action not in BULK_ACTIONS:
+            raise ValueError('操作类型不合法')
+        if action == 'close':
+            value = 'closed'
+        value = (value or '').strip()
+        if action == 'status' and value not in VALID_STATUSES:
+            raise ValueError('工单状态值不合法')
+        if action == 'assign' and not value:
+            raise ValueError('请选择处理人')
+        column = BULK_ACTIONS[action]
+
+        now = datetime.now().strftime(DATETIME_FORMAT)
+        with db_connection('case') as conn:
+            cursor = conn.cursor()
+            tickets = {ticket['ticket_id']: ticket for ticket in TicketStatsService.lock_tickets(cursor, ticket_ids)}
+            changed = [tickets[ticket_id] for ticket_id in ticket_ids
+                       if ticket_id in tickets and tickets[ticket_id].get(column) != value]
+            if changed:
+                placeholders = ', '.join(['%s'] * len(changed))
+                cursor.execute(
+                    f"UPDATE tickets SET {column} = %s, update_time = %s WHERE ticket_id IN ({placeholders})",
+                    [value, now] + [ticket['ticket_id'] for ticket in changed]
+                )
+                TicketStatsService.apply_changes(cursor, [(ticket, dict(ticket, **{column: value}))
+                                                          for ticket in changed], now)
+                ids = [ticket['ticket_id'] for ticket in changed]
+                if column == 'status':
+                    TicketSlaService.on_status_changes(cursor, ids, value, now)
+                    MailService.notify_status_changed(cursor, ids, value)
+                else:
+                    MailService.notify_assigned(cursor, ids, value)
+            conn.commit()
+
+        changed_ids = {ticket['ticket_id'] for ticket in changed}
+        results = []
+        for ticket_id in ticket_ids:
+            if ticket_id not in tickets:
+                result = 'not_found'
+            elif ticket_id in changed_ids:
+                result = 'updated'
+            else:
+                result = 'unchanged'
+            results.append({'ticket_id': ticket_id, 'result': result})
+
+        logger.info(f"批量{action} -> {value}: 共 {len(ticket_ids)} 个，修改 {len(changed)} 个")
+        return {
+            'results': results,
+            'updated': [{
+                'ticket_id': ticket['ticket_id'],
+                'submit_user': ticket.get('submit_user') or '',
+                'assignee': value if column == 'assignee' else ticket.get('assignee'),
+                'extra_users': (ticket.get('assignee'),) if column == 'assignee' else ()
+            } for ticket in changed]
+        }
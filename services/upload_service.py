@@ -0,0 +1,285 @@
+"""
+工单附件分片上传（可断点续传）
+
+协议:
+1. init: 声明文件名、大小（可选整体 SHA-256），返回 upload_id 和分片大小
+2. chunk: 按序号 PUT 分片原始字节，请求体直接流式写入磁盘，不在内存中缓冲整个文件；
+   可带 X-Chunk-Sha256 校验单个分片，同一分片可重复上传（覆盖）
+3. status: 查询已收到的分片，断线后只补传缺失的分片
+4. complete: 按序合并分片写入附件存储，合并时计算整体 SHA-256 与 init 声明的值比对
+
+上传会话保存在 UPLOAD_SESSION_DIR/<upload_id>/ 下（meta.json + 分片文件），
+同一台机器的多个 worker 共享，进程重启后仍可续传；超过 UPLOAD_SESSION_TTL 未完成的会话自动清理
+"""
+import hashlib
+import json
+import math
+import os
+import re
+import shutil
+import time
+import uuid
+from typing import Any, BinaryIO, Dict, List, Optional
+import config
+from common.logger import logger
+from services.attachment_service import AttachmentService
+
+
+CHUNK_READ_SIZE = 64 * 1024
+
+_UPLOAD_ID_RE = re.compile(r'^[0-9a-f]{32}$')
+_SHA256_RE = re.compile(r'^[0-9a-f]{64}$')
+
+META_FILE = 'meta.json'
+COMPLETING_SUFFIX = '.completing'
+
+
+class _ChunkReader:
+    """按顺序读取多个分片文件的只读数据流"""
+
+    def __init__(self, paths: List[str]):
+        self._paths = list(paths)
+        self._current: Optional[BinaryIO] = None
+
+    def read(self, size: int = -1) -> bytes:
+        while True:
+            if self._current is None:
+                if not self._paths:
+                    return b''
+                self._current = open(self._paths.pop(0), 'rb')
+            data = self._current.read(size)
+            if data:
+                return data
+            self._current.close()
+            self._current = None
+
+    def close(self):
+        if self._current is not None:
+            self._current.close()
+            self._current = None
+
+
+class ChunkedUploadService:
+    """分片上传服务类"""
+
+    @staticmethod
+    def _session_dir(upload_id: str) -> str:
+        if not _UPLOAD_ID_RE.match(upload_id or ''):
+            raise LookupError('上传会话不存在')
+        return os.path.join(config.UPLOAD_SESSION_DIR, upload_id)
+
+    @staticmethod
+    def _chunk_path(session_dir: str, index: int) -> str:
+        return os.path.join(session_dir, f'chunk_{index:06d}')
+
+    @staticmethod
+    def _load(upload_id: str, username: str) -> Dict[str, Any]:
+        """读取上传会话，只有发起人可以操作"""
+        session_dir = ChunkedUploadService._session_dir(upload_id)
+        try:
+            with open(os.path.join(session_dir, META_FILE), encoding='utf-8') as f:
+                meta = json.load(f)
+        except FileNotFoundError:
+            raise LookupError('上传会话不存在或已完成')
+        if meta['username'] != username:
+            raise PermissionError('无权操作此上传')
+        return meta
+
+    @staticmethod
+    def _expected_chunk_size(meta: Dict[str, Any], index: int) -> int:
+        if index == meta['total_chunks'] - 1:
+            return meta['size'] - meta['chunk_size'] * index
+        return meta['chunk_size']
+
+    @staticmethod
+    def _received_chunks(session_dir: str, meta: Dict[str, Any]) -> List[int]:
+        received = []
+        for index in range(meta['total_chunks']):
+            path = ChunkedUploadService._chunk_path(session_dir, index)
+            try:
+                if os.path.getsize(path) == ChunkedUploadService._expected_chunk_size(meta, index):
+                    received.append(index)
+            except OSError:
+                continue
+        return received
+
+    @staticmethod
+    def _status(meta: Dict[str, Any], received: List[int]) -> Dict[str, Any]:
+        received_bytes = sum(ChunkedUploadService._expected_chunk_size(meta, i) for i in received)
+        return {
+            'upload_id': meta['upload_id'],
+            'ticket_id': meta['ticket_id'],
+            'filename': meta['filename'],
+            'size': meta['size'],
+            'chunk_size': meta['chunk_size'],
+            'total_chunks': meta['total_chunks'],
+            'received_chunks': received,
+            'received_bytes': received_bytes,
+            'percent': round(received_bytes * 100 / meta['size'], 1) if meta['size'] else 100.0
+        }
+
+    @staticmethod
+    def init_upload(ticket_id: str, filename: str, size: Any, username: str,
+                    sha256: Optional[str] = None, mime_type: Optional[str] = None) -> Dict[str, Any]:
+        """
+        创建上传会话
+
+        Raises:
+            ValueError: 参数不合法
+        """
+        if not filename or not AttachmentService.allowed_file(filename):
+            raise ValueError('不支持的文件类型')
+        try:
+            size = int(size)
+        except (TypeError, ValueError):
+            raise ValueError('文件大小不合法')
+        if size <= 0:
+            raise ValueError('文件大小不合法')
+        if size > config.UPLOAD_MAX_FILE_SIZE:
+            raise ValueError(f'文件大小超过 {config.UPLOAD_MAX_FILE_SIZE // (1024 * 1024)}MB 限制')
+        if sha256:
+            sha256 = sha256.lower()
+            if not _SHA256_RE.match(sha256):
+                raise ValueError('sha256 格式不正确')
+
+        ChunkedUploadService.cleanup_expired()
+
+        chunk_size = config.UPLOAD_CHUNK_SIZE
+        upload_id = uuid.uuid4().hex
+        meta = {
+            'upload_id': upload_id,
+            'ticket_id': ticket_id,
+            'filename': filename,
+            'size': size,
+            'sha256': sha256 or None,
+            'mime_type': mime_type or None,
+            'chunk_size': chunk_size,
+            'total_chunks': math.ceil(size / chunk_size),
+            'username': username,
+            'created_at': time.time()
+        }
+        session_dir = ChunkedUploadService._session_dir(upload_id)
+        os.makedirs(session_dir)
+        with open(os.path.join(session_dir, META_FILE), 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False)
+        logger.info(f"工单 {ticket_id} 创建分片上传 {upload_id}: {filename} ({size} 字节, {meta['total_chunks']} 片)")
+        return ChunkedUploadService._status(meta, [])
+
+    @staticmethod
+    def get_status(upload_id: str, username: str) -> Dict[str, Any]:
+        meta = ChunkedUploadService._load(upload_id, username)
+        session_dir = ChunkedUploadService._session_dir(upload_id)
+        return ChunkedUploadService._status(meta, ChunkedUploadService._received_chunks(session_dir, meta))
+
+    @staticmethod
+    def write_chunk(upload_id: str, index: int, stream: BinaryIO, username: str,
+                    checksum: Optional[str] = None) -> Dict[str, Any]:
+        """
+        写入一个分片（流式写入临时文件，校验后原子替换）
+
+        Raises:
+            LookupError: 会话不存在
+            PermissionError: 不是会话发起人
+            ValueError: 分片序号、大小或校验和不正确
+        """
+        meta = ChunkedUploadService._load(upload_id, username)
+        if not 0 <= index < meta['total_chunks']:
+            raise ValueError('分片序号不正确')
+        expected = ChunkedUploadService._expected_chunk_size(meta, index)
+
+        session_dir = ChunkedUploadService._session_dir(upload_id)
+        chunk_path = ChunkedUploadService._chunk_path(session_dir, index)
+        tmp_path = f'{chunk_path}.{uuid.uuid4().hex[:8]}.part'
+        sha256 = hashlib.sha256()
+        written = 0
+        try:
+            with open(tmp_path, 'wb') as f:
+                while True:
+                    data = stream.read(CHUNK_READ_SIZE)
+                    if not data:
+                        break
+                    written += len(data)
+                    if written > expected:
+                        raise ValueError('分片大小不正确')
+                    sha256.update(data)
+                    f.write(data)
+            if written != expected:
+                raise ValueError(f'分片大小不正确（期望 {expected} 字节，收到 {written} 字节）')
+            if checksum and sha256.hexdigest() != checksum.lower():
+                raise ValueError('分片校验失败')
+            os.replace(tmp_path, chunk_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+        return ChunkedUploadService._status(meta, ChunkedUploadService._received_chunks(session_dir, meta))
+
+    @staticmethod
+    def complete(upload_id: str, username: str) -> Dict[str, Any]:
+        """
+        合并分片写入附件存储
+
+        Returns:
+            dict: 上传会话信息（ticket_id、filename）和 AttachmentService.save_stream 的返回值（info）
+
+        Raises:
+            LookupError / PermissionError / ValueError
+        """
+        meta = ChunkedUploadService._load(upload_id, username)
+        session_dir = ChunkedUploadService._session_dir(upload_id)
+        received = ChunkedUploadService._received_chunks(session_dir, meta)
+        if len(received) != meta['total_chunks']:
+            missing = sorted(set(range(meta['total_chunks'])) - set(received))
+            raise ValueError(f'还有 {len(missing)} 个分片未上传: {missing[:20]}')
+
+        # 重命名会话目录作为合并锁，重复提交 complete 时只有一个请求能合并
+        completing_dir = session_dir + COMPLETING_SUFFIX
+        try:
+            os.rename(session_dir, completing_dir)
+        except OSError:
+            raise LookupError('上传会话不存在或正在合并')
+
+        try:
+            reader = _ChunkReader([ChunkedUploadService._chunk_path(completing_dir, i)
+                                   for i in range(meta['total_chunks'])])
+            try:
+                info = AttachmentService.save_stream(reader, meta['filename'], meta['mime_type'])
+            finally:
+                reader.close()
+
+            if info['file_size'] != meta['size'] or (meta['sha256'] and info['sha256'] != meta['sha256']):
+                if not info['deduplicated']:
+                    from common.file_storage import get_storage
+                    get_storage(info['storage']).delete(info['stored_path'])
+                # 校验失败时丢弃会话，客户端需要重新上传
+                raise ValueError('文件校验失败，请重新上传')
+        finally:
+            shutil.rmtree(completing_dir, ignore_errors=True)
+
+        logger.info(f"分片上传 {upload_id} 合并完成: {meta['filename']} sha256={info['sha256']}")
+        return {'ticket_id': meta['ticket_id'], 'filename': meta['filename'], 'info': info}
+
+    @staticmethod
+    def abort(upload_id: str, username: str):
+        ChunkedUploadService._load(upload_id, username)
+        shutil.rmtree(ChunkedUploadService._session_dir(upload_id), ignore_errors=True)
+
+    @staticmethod
+    def cleanup_expired() -> int:
+        """清理超时未完成的上传会话，返回清理数量"""
+        root = config.UPLOAD_SESSION_DIR
+        if not os.path.isdir(root):
+            return 0
+        deadline = time.time() - config.UPLOAD_SESSION_TTL
+        removed = 0
+        with os.scandir(root) as entries:
+            for entry in entries:
+                try:
+                    if entry.is_dir() and entry.stat().st_mtime < deadline:
+                        shutil.rmtree(entry.path, ignore_errors=True)
+                        removed += 1
+                except OSError:
+                    continue
+        if removed:
+            logger.info(f"清理过期分片上传会话 {removed} 个")
+        return removed